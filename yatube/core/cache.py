@@ -0,0 +1,201 @@
+import threading
+from collections import Counter, defaultdict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.locmem import LocMemCache
+
+_MISSING = object()
+_stats = defaultdict(Counter)
+_stats_lock = threading.Lock()
+
+
+def cache_stats():
+    """Счётчики попаданий и промахов по алиасам кешей в этом процессе."""
+    with _stats_lock:
+        return {alias: dict(counter) for alias, counter in _stats.items()}
+
+
+def reset_cache_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+class InstrumentedCache(BaseCache):
+    """Прокси к кешу из LOCATION, считающий попадания и промахи.
+
+    Ключи и версии передаются целевому кешу как есть, поэтому
+    KEY_PREFIX и VERSION задаются в настройках целевого алиаса.
+    OPTIONS['ALIAS'] — имя, под которым копится статистика.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._target_alias = location
+        self.alias = params.get('OPTIONS', {}).get('ALIAS', location)
+
+    @property
+    def target(self):
+        return caches[self._target_alias]
+
+    def _count(self, event, amount=1):
+        if amount:
+            with _stats_lock:
+                _stats[self.alias][event] += amount
+
+    def get(self, key, default=None, version=None):
+        value = self.target.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            self._count('misses')
+            return default
+        self._count('hits')
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = self.target.get_many(keys, version=version)
+        self._count('hits', len(found))
+        self._count('misses', len(keys) - len(found))
+        return found
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.target.add(key, value, timeout, version=version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.target.set(key, value, timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.target.set_many(data, timeout, version=version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.target.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        return self.target.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        self.target.delete_many(keys, version=version)
+
+    def has_key(self, key, version=None):
+        return self.target.has_key(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        return self.target.incr(key, delta, version=version)
+
+    def decr(self, key, delta=1, version=None):
+        return self.target.decr(key, delta, version=version)
+
+    def clear(self):
+        self.target.clear()
+
+    def close(self, **kwargs):
+        self.target.close(**kwargs)
+
+
+class TieredCache(InstrumentedCache):
+    """Небольшой LRU в памяти процесса перед общим кешем из LOCATION.
+
+    Записи локального уровня живут LOCAL_TIMEOUT секунд: другие процессы
+    не могут их сбросить. Ключи с префиксами из LOCAL_BYPASS_PREFIXES
+    (например, версии лент) всегда читаются из общего кеша.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(location, params)
+        options = params.get('OPTIONS', {})
+        self.local_timeout = options.get('LOCAL_TIMEOUT', 5)
+        self.bypass_prefixes = tuple(options.get('LOCAL_BYPASS_PREFIXES', ()))
+        self.local = LocMemCache(
+            f'tiered-{self.alias}',
+            {
+                'TIMEOUT': self.local_timeout,
+                'OPTIONS': {
+                    'MAX_ENTRIES': options.get('LOCAL_MAX_ENTRIES', 1000),
+                },
+            },
+        )
+
+    def _cached_locally(self, key):
+        return not key.startswith(self.bypass_prefixes)
+
+    def _local_timeout(self, timeout):
+        if timeout is DEFAULT_TIMEOUT or timeout is None:
+            return self.local_timeout
+        return min(timeout, self.local_timeout)
+
+    def get(self, key, default=None, version=None):
+        if not self._cached_locally(key):
+            return super().get(key, default, version=version)
+        value = self.local.get(key, _MISSING, version=version)
+        if value is not _MISSING:
+            self._count('local_hits')
+            self._count('hits')
+            return value
+        value = super().get(key, _MISSING, version=version)
+        if value is _MISSING:
+            return default
+        self.local.set(key, value, self.local_timeout, version=version)
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        local_keys = [key for key in keys if self._cached_locally(key)]
+        found = self.local.get_many(local_keys, version=version)
+        self._count('local_hits', len(found))
+        self._count('hits', len(found))
+        rest = [key for key in keys if key not in found]
+        shared = super().get_many(rest, version=version)
+        for key, value in shared.items():
+            if self._cached_locally(key):
+                self.local.set(key, value, self.local_timeout, version=version)
+        found.update(shared)
+        return found
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = super().add(key, value, timeout, version=version)
+        if added and self._cached_locally(key):
+            self.local.set(
+                key, value, self._local_timeout(timeout), version=version
+            )
+        return added
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        super().set(key, value, timeout, version=version)
+        if self._cached_locally(key):
+            self.local.set(
+                key, value, self._local_timeout(timeout), version=version
+            )
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = super().set_many(data, timeout, version=version)
+        for key, value in data.items():
+            if key not in failed and self._cached_locally(key):
+                self.local.set(
+                    key, value, self._local_timeout(timeout), version=version
+                )
+        return failed
+
+    def delete(self, key, version=None):
+        self.local.delete(key, version=version)
+        return super().delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self.local.delete_many(keys, version=version)
+        super().delete_many(keys, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self.local.delete(key, version=version)
+        return super().incr(key, delta, version=version)
+
+    def decr(self, key, delta=1, version=None):
+        self.local.delete(key, version=version)
+        return super().decr(key, delta, version=version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self.local.delete(key, version=version)
+        return super().touch(key, timeout, version=version)
+
+    def clear(self):
+        self.local.clear()
+        super().clear()
@@ -0,0 +1,221 @@
+"""Отдача статики и медиа без отдельного веб-сервера или CDN.
+
+serve_file отвечает на условные запросы (If-None-Match,
+If-Modified-Since) и на Range с одним диапазоном. ETag строгий: у имени
+с хешем содержимого это сам хеш из имени, у остальных — mtime и размер,
+так что файл ради ETag не читается. Файлы с хешем в имени кешируются
+браузером на год. Если перед приложением
+стоит nginx или Apache, FILE_OFFLOAD отдаёт им саму передачу файла
+через X-Accel-Redirect или X-Sendfile.
+"""
+import mimetypes
+import os
+import posixpath
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+CHUNK_SIZE = 64 * 1024
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+# Имя с хешем содержимого не меняет смысла никогда: статика после
+# collectstatic (name.0123456789ab.css), медиа из хранилища по хешу
+# и миниатюры sorl
+IMMUTABLE_NAME = re.compile(
+    r'(\.(?P<short>[0-9a-f]{12})\.[^/.]+(\.map)?'
+    r'|/(?P<long>[0-9a-f]{64}|[0-9a-f]{32}))'
+    r'(\.[^/]+)?$'
+)
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+# Порядок — предпочтение сервера, если клиент принимает оба
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+OFFLOAD_HEADERS = {
+    'nginx': 'X-Accel-Redirect',
+    'apache': 'X-Sendfile',
+}
+
+
+def file_etag(name, stat, encoding=None):
+    """Строгий ETag: хеш из имени файла, а без него — mtime и размер.
+
+    У сжатой копии своя метка: её байты другие.
+    """
+    match = IMMUTABLE_NAME.search('/' + name)
+    if match is not None:
+        tag = match.group('short') or match.group('long')
+    else:
+        tag = f'{stat.st_mtime_ns:x}-{stat.st_size:x}'
+    if encoding:
+        tag = f'{tag}-{encoding}'
+    return quote_etag(tag)
+
+
+def cache_control(name, max_age):
+    if IMMUTABLE_NAME.search('/' + name):
+        return f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    return f'public, max-age={max_age}'
+
+
+def parse_range(header, size):
+    """(начало, конец) одного диапазона, None — отдать целиком.
+
+    Несколько диапазонов сразу не поддерживаются: такой запрос
+    получает весь файл, как разрешает RFC 7233. Невыполнимый диапазон
+    даёт ValueError.
+    """
+    match = RANGE.match(header.replace(' ', ''))
+    if match is None:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # bytes=-500 — последние 500 байт
+        length = int(end)
+        if length == 0 or size == 0:
+            # У пустого файла нет ни одного байта для ответа 206
+            raise ValueError('пустой диапазон')
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError('диапазон за концом файла')
+    return start, end
+
+
+def _read(path, start, length):
+    with open(path, 'rb') as source:
+        source.seek(start)
+        while length > 0:
+            chunk = source.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+
+
+def accepted_encodings(header):
+    """Кодировки из Accept-Encoding, которые клиент принимает.
+
+    Кодировка с q=0 явно запрещена. «*» разрешает всё, что не названо.
+    """
+    weights = {}
+    for item in header.split(','):
+        coding, *params = item.split(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        weight = 1.0
+        for param in params:
+            key, _, value = param.strip().partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding] = weight
+    return {
+        encoding for encoding, _ in ENCODINGS
+        if weights.get(encoding, weights.get('*', 0)) > 0
+    }
+
+
+def _pick_encoding(request, path):
+    accepted = accepted_encodings(
+        request.META.get('HTTP_ACCEPT_ENCODING', '')
+    )
+    for encoding, extension in ENCODINGS:
+        if encoding in accepted and os.path.isfile(path + extension):
+            return encoding, path + extension
+    return None, path
+
+
+def serve_file(request, root, name, max_age, offload_prefix=None,
+               precompressed=False):
+    """Ответ с файлом name из каталога root.
+
+    max_age — время кеширования для имён без хеша. offload_prefix —
+    внутренний адрес каталога для X-Accel-Redirect. precompressed —
+    искать рядом .br и .gz копии.
+    """
+    name = posixpath.normpath(name).lstrip('/')
+    try:
+        path = safe_join(root, name)
+    except SuspiciousFileOperation:
+        raise Http404('Файл вне каталога')
+    if not os.path.isfile(path):
+        raise Http404('Нет такого файла')
+
+    content_type = (
+        mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    )
+    encoding = None
+    if precompressed:
+        encoding, path = _pick_encoding(request, path)
+    stat = os.stat(path)
+    etag = file_etag(name, stat, encoding)
+    last_modified = int(stat.st_mtime)
+
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        response = _file_response(
+            request, path, name, stat, etag, offload_prefix, encoding
+        )
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = cache_control(name, max_age)
+    if response.status_code not in (304, 416):
+        response['Content-Type'] = content_type
+    if encoding:
+        response['Content-Encoding'] = encoding
+    if precompressed:
+        response['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def _file_response(request, path, name, stat, etag, offload_prefix,
+                   encoding):
+    offload = OFFLOAD_HEADERS.get(settings.FILE_OFFLOAD)
+    if offload is not None:
+        response = HttpResponse()
+        if settings.FILE_OFFLOAD == 'nginx':
+            suffix = path[-3:] if encoding else ''
+            response[offload] = (
+                offload_prefix.rstrip('/') + '/' + name + suffix
+            )
+        else:
+            response[offload] = path
+        # Диапазоны и передачу файла берёт на себя веб-сервер
+        return response
+
+    size = stat.st_size
+    byte_range = None
+    header = request.META.get('HTTP_RANGE')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if header and (not if_range or if_range == etag):
+        try:
+            byte_range = parse_range(header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    if byte_range is None:
+        response = StreamingHttpResponse(_read(path, 0, size))
+        response['Content-Length'] = str(size)
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(
+            _read(path, start, length), status=206
+        )
+        response['Content-Length'] = str(length)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Accept-Ranges'] = 'bytes'
+    return response
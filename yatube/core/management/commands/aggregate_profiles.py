@@ -0,0 +1,92 @@
+import io
+import os
+import pstats
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.profiling import read_folded, self_samples, view_directory
+
+
+class Command(BaseCommand):
+    help = (
+        'Сводит профили запросов из PROFILING_DIR по представлениям: '
+        'складывает collapsed stacks в один файл для флеймграфа '
+        'и печатает самые дорогие функции.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dir', default=None,
+            help='Каталог с профилями; по умолчанию PROFILING_DIR.'
+        )
+        parser.add_argument(
+            '--view', action='append', default=[],
+            help='Только это представление, например posts:index. '
+                 'Можно указать несколько раз.'
+        )
+        parser.add_argument(
+            '--output',
+            help='Каталог для сводных <view>.folded; по умолчанию '
+                 'сводка только печатается.'
+        )
+        parser.add_argument(
+            '--top', type=int, default=15,
+            help='Сколько функций показать для каждого представления.'
+        )
+
+    def handle(self, *args, **options):
+        root = options['dir'] or settings.PROFILING_DIR
+        if not os.path.isdir(root):
+            raise CommandError(f'Нет каталога с профилями {root}')
+        views = sorted(
+            name for name in os.listdir(root)
+            if os.path.isdir(os.path.join(root, name))
+        )
+        if options['view']:
+            wanted = {view_directory(view) for view in options['view']}
+            views = [view for view in views if view in wanted]
+        if options['output']:
+            os.makedirs(options['output'], exist_ok=True)
+        for view in views:
+            directory = os.path.join(root, view)
+            files = sorted(os.listdir(directory))
+            folded = [name for name in files if name.endswith('.folded')]
+            dumps = [name for name in files if name.endswith('.prof')]
+            if folded:
+                self._report_folded(
+                    view, [os.path.join(directory, name) for name in folded],
+                    options,
+                )
+            if dumps:
+                self._report_cprofile(
+                    view, [os.path.join(directory, name) for name in dumps],
+                    options['top'],
+                )
+
+    def _report_folded(self, view, paths, options):
+        stacks = Counter()
+        for path in paths:
+            stacks.update(read_folded(path))
+        total = sum(stacks.values())
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'{view}: профилей {len(paths)}, снимков стека {total}'
+        ))
+        for label, count in self_samples(stacks).most_common(options['top']):
+            self.stdout.write(f'{count / total:7.1%} {count:7d}  {label}')
+        if options['output']:
+            path = os.path.join(options['output'], f'{view}.folded')
+            with open(path, 'w', encoding='utf-8') as output:
+                for stack, count in stacks.most_common():
+                    output.write(f'{stack} {count}\n')
+            self.stdout.write(f'Флеймграф: {path}')
+
+    def _report_cprofile(self, view, paths, top):
+        out = io.StringIO()
+        stats = pstats.Stats(*paths, stream=out)
+        stats.sort_stats('cumulative').print_stats(top)
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'{view}: профилей cProfile {len(paths)}'
+        ))
+        self.stdout.write(out.getvalue())
@@ -0,0 +1,210 @@
+import hashlib
+import logging
+import os
+import random
+import re
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+
+from core import profiling, template_timing
+
+logger = logging.getLogger('yatube.queries')
+profiling_logger = logging.getLogger('yatube.profiling')
+
+PLACEHOLDER_LIST = re.compile(r'\(\s*%s(\s*,\s*%s)*\s*\)')
+WHITESPACE = re.compile(r'\s+')
+
+
+def add_server_timing(request, response, metrics):
+    """Дописывает метрики в Server-Timing, если зрителю их можно видеть.
+
+    Имена шаблонов и число запросов выдают устройство сайта, поэтому
+    без SERVER_TIMING_PUBLIC заголовок получают только сотрудники.
+    """
+    user = getattr(request, 'user', None)
+    if not settings.SERVER_TIMING_PUBLIC and not (
+        user is not None and user.is_staff
+    ):
+        return
+    if response.has_header('Server-Timing'):
+        metrics = f"{response['Server-Timing']}, {metrics}"
+    response['Server-Timing'] = metrics
+
+
+def fingerprint(sql):
+    """Отпечаток SQL: одинаковый для запросов с разными параметрами."""
+    normalized = PLACEHOLDER_LIST.sub('(%s, ...)', WHITESPACE.sub(' ', sql))
+    return hashlib.md5(normalized.encode()).hexdigest()[:12]
+
+
+class QueryStats:
+    """Запросы к базе, выполненные за время обработки одного запроса."""
+
+    def __init__(self):
+        self.view_name = None
+        self.durations = []
+        self.fingerprints = Counter()
+        self.samples = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.durations.append(time.perf_counter() - started)
+            key = fingerprint(sql)
+            self.fingerprints[key] += 1
+            self.samples.setdefault(key, sql)
+
+    @property
+    def count(self):
+        return len(self.durations)
+
+    @property
+    def total_ms(self):
+        return sum(self.durations) * 1000
+
+    @property
+    def duplicates(self):
+        return {
+            key: count
+            for key, count in self.fingerprints.items()
+            if count > 1
+        }
+
+    def server_timing(self):
+        return (
+            f'db;dur={self.total_ms:.2f};'
+            f'desc="{self.count} queries, '
+            f'{len(self.duplicates)} duplicated"'
+        )
+
+    def as_log_extra(self):
+        return {
+            'view': self.view_name,
+            'queries': self.count,
+            'db_time_ms': round(self.total_ms, 2),
+            'duplicates': {
+                key: {'count': count, 'sql': self.samples[key]}
+                for key, count in self.duplicates.items()
+            },
+        }
+
+
+class QueryStatsMiddleware:
+    """Считает SQL-запросы каждого представления.
+
+    Итог попадает в заголовок Server-Timing (см. add_server_timing),
+    в лог yatube.queries и в атрибут response.query_stats, который
+    проверяют тесты. Включается настройкой QUERY_STATS.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.QUERY_STATS:
+            return self.get_response(request)
+        stats = QueryStats()
+        with connection.execute_wrapper(stats):
+            response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        stats.view_name = match.view_name if match else None
+        response.query_stats = stats
+        add_server_timing(request, response, stats.server_timing())
+
+        logger.info(
+            '%s: %d queries, %.2f ms, %d duplicated',
+            stats.view_name,
+            stats.count,
+            stats.total_ms,
+            len(stats.duplicates),
+            extra=stats.as_log_extra(),
+        )
+        return response
+
+
+class TemplateTimingMiddleware:
+    """Пишет в Server-Timing время рендера шаблонов запроса.
+
+    Метрика tpl — суммарное время, а tpl-<шаблон> — собственное время
+    TEMPLATE_TIMING_TOP самых медленных шаблонов. Работает вместе
+    с загрузчиком core.template_timing.Loader и только при включённой
+    настройке TEMPLATE_TIMING.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.TEMPLATE_TIMING:
+            return self.get_response(request)
+        template_timing.start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            stats = template_timing.finish_request()
+        if stats.templates:
+            add_server_timing(
+                request,
+                response,
+                stats.server_timing(settings.TEMPLATE_TIMING_TOP),
+            )
+        return response
+
+
+class ProfilingMiddleware:
+    """Профилирует выбранные запросы и сохраняет профиль на диск.
+
+    Профилируется запрос сотрудника с заголовком X-Profile и случайная
+    доля PROFILING_SAMPLE_RATE всех запросов. Профили лежат
+    в PROFILING_DIR по каталогу на представление, не больше
+    PROFILING_MAX_FILES в каждом; путь к файлу
+    возвращается сотруднику в заголовке X-Profile-Path. Сводку строит
+    manage.py aggregate_profiles.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def _wanted(self, request):
+        if random.random() < settings.PROFILING_SAMPLE_RATE:
+            return True
+        user = getattr(request, 'user', None)
+        return bool(
+            request.META.get('HTTP_X_PROFILE')
+            and user is not None and user.is_staff
+        )
+
+    def __call__(self, request):
+        if not self._wanted(request):
+            return self.get_response(request)
+        mode = request.META.get('HTTP_X_PROFILE')
+        if mode not in profiling.MODES:
+            mode = settings.PROFILING_MODE
+        profiler = profiling.PROFILERS[mode](settings.PROFILING_INTERVAL)
+        try:
+            profiler.start()
+        except ValueError:
+            # cProfile уже запущен в этом процессе другим инструментом
+            return self.get_response(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.stop()
+        match = getattr(request, 'resolver_match', None)
+        path = profiling.profile_path(
+            settings.PROFILING_DIR, match.view_name if match else None, mode
+        )
+        profiler.dump(path)
+        profiling.prune_profiles(
+            os.path.dirname(path), settings.PROFILING_MAX_FILES
+        )
+        profiling_logger.info('%s profiled to %s', request.path, path)
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_staff:
+            response['X-Profile-Path'] = path
+        return response
@@ -0,0 +1,25 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FileClaim',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False, verbose_name='Имя файла')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Число сохранений')),
+            ],
+            options={
+                'verbose_name': 'Заявка на файл',
+                'verbose_name_plural': 'Заявки на файлы',
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.db import models
+
+
+class FileClaim(models.Model):
+    """Сохранения файла ContentAddressedStorage, ещё не закреплённые записью.
+
+    Хранилище заводит заявку, прежде чем проверить, есть ли уже такой
+    файл, а снимает её вызывающий код в транзакции, где сохранена
+    ссылающаяся на файл запись. Пока заявка есть, файл не удаляется.
+    Строка служит и блокировкой: сохранение и удаление одного файла
+    выполняются по очереди.
+    """
+
+    name = models.CharField('Имя файла', max_length=255, primary_key=True)
+    count = models.PositiveIntegerField('Число сохранений', default=0)
+
+    class Meta:
+        verbose_name = 'Заявка на файл'
+        verbose_name_plural = 'Заявки на файлы'
+
+    def __str__(self):
+        return f'{self.name} ({self.count})'
@@ -0,0 +1,136 @@
+"""Профилирование отдельных запросов.
+
+StackSampler раз в несколько миллисекунд снимает стек потока, который
+обрабатывает запрос, и считает одинаковые стеки. Результат сохраняется
+в формате collapsed stacks («a;b;c 12» на строку), который понимают
+flamegraph.pl, speedscope и inferno. Для режима cprofile сохраняется
+обычный дамп pstats. В каталоге представления остаются только
+последние профили, см. prune_profiles.
+"""
+import cProfile
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+SAMPLE = 'sample'
+CPROFILE = 'cprofile'
+MODES = (SAMPLE, CPROFILE)
+EXTENSIONS = {SAMPLE: '.folded', CPROFILE: '.prof'}
+
+
+def frame_label(code):
+    """Имя кадра: функция и два последних компонента пути к файлу."""
+    path = code.co_filename.replace('\\', '/').split('/')
+    location = '/'.join(path[-2:])
+    label = f'{code.co_name} ({location}:{code.co_firstlineno})'
+    # «;» разделяет кадры в формате collapsed stacks
+    return label.replace(';', ':')
+
+
+def collapse(frame):
+    """Стек от корня к вершине одной строкой через «;»."""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class StackSampler:
+    """Снимает стек заданного потока из отдельного потока-наблюдателя."""
+
+    def __init__(self, interval, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name='profiling-sampler', daemon=True
+        )
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def dump(self, path):
+        with open(path, 'w', encoding='utf-8') as output:
+            for stack, count in self.stacks.most_common():
+                output.write(f'{stack} {count}\n')
+
+
+class CProfiler:
+    """Обёртка над cProfile с тем же интерфейсом, что у StackSampler."""
+
+    def __init__(self, interval=None):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def dump(self, path):
+        self.profile.dump_stats(path)
+
+
+PROFILERS = {SAMPLE: StackSampler, CPROFILE: CProfiler}
+
+
+def view_directory(view_name):
+    """Каталог профилей представления: posts:index -> posts.index."""
+    return (view_name or 'unresolved').replace(':', '.').replace('/', '_')
+
+
+def profile_path(root, view_name, mode):
+    directory = os.path.join(root, view_directory(view_name))
+    os.makedirs(directory, exist_ok=True)
+    name = f'{time.strftime("%Y%m%d-%H%M%S")}-{uuid.uuid4().hex[:8]}'
+    return os.path.join(directory, name + EXTENSIONS[mode])
+
+
+def prune_profiles(directory, keep):
+    """Удаляет из каталога всё, кроме keep самых свежих профилей."""
+    profiles = [
+        entry for entry in os.scandir(directory)
+        if entry.is_file() and entry.name.endswith(
+            tuple(EXTENSIONS.values())
+        )
+    ]
+    profiles.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+    for entry in profiles[keep:]:
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            # Тот же профиль удалил параллельный запрос
+            pass
+
+
+def read_folded(path):
+    stacks = Counter()
+    with open(path, encoding='utf-8') as source:
+        for line in source:
+            stack, _, count = line.rstrip('\n').rpartition(' ')
+            if stack and count.isdigit():
+                stacks[stack] += int(count)
+    return stacks
+
+
+def self_samples(stacks):
+    """Сколько раз каждая функция была на вершине стека."""
+    leaves = Counter()
+    for stack, count in stacks.items():
+        leaves[stack.rpartition(';')[2]] += count
+    return leaves
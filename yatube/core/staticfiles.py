@@ -0,0 +1,70 @@
+"""Статика для продакшена: имена с хешем и заранее сжатые копии.
+
+collectstatic кладёт рядом с каждым текстовым файлом file.css.gz и,
+если установлен пакет brotli, file.css.br. core.files отдаёт их
+клиентам, которые такое сжатие принимают, не тратя CPU на каждый ответ.
+"""
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = (
+    '.css', '.js', '.map', '.svg', '.txt', '.html', '.json', '.xml', '.ico',
+)
+# Маленькие файлы сжатие почти не уменьшает, а копия всё равно занимает
+# место и лишний stat при каждой отдаче
+MIN_COMPRESS_SIZE = 256
+# Сжатая копия нужна, только если она заметно меньше оригинала
+MIN_COMPRESS_RATIO = 0.95
+
+
+def _compressors():
+    yield '.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0)
+    if brotli is not None:
+        yield '.br', brotli.compress
+
+
+def compress_file(path):
+    """Пишет рядом с path сжатые копии, возвращает их расширения."""
+    if not path.endswith(COMPRESSIBLE_EXTENSIONS):
+        return []
+    with open(path, 'rb') as source:
+        data = source.read()
+    if len(data) < MIN_COMPRESS_SIZE:
+        return []
+    written = []
+    for extension, compress in _compressors():
+        compressed = compress(data)
+        if len(compressed) > len(data) * MIN_COMPRESS_RATIO:
+            continue
+        tmp_path = f'{path}{extension}.tmp'
+        with open(tmp_path, 'wb') as output:
+            output.write(compressed)
+        os.replace(tmp_path, path + extension)
+        written.append(extension)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage, который ещё и сжимает файлы."""
+
+    def post_process(self, *args, **kwargs):
+        if kwargs.get('dry_run'):
+            yield from super().post_process(*args, **kwargs)
+            return
+        compressed = set()
+        for name, hashed_name, processed in super().post_process(
+            *args, **kwargs
+        ):
+            if processed and not isinstance(processed, Exception):
+                for stored_name in (name, hashed_name):
+                    if stored_name and stored_name not in compressed:
+                        compress_file(self.path(stored_name))
+                        compressed.add(stored_name)
+            yield name, hashed_name, processed
@@ -0,0 +1,156 @@
+"""Файловое хранилище с именами по содержимому.
+
+Файл сохраняется под SHA-256 своих байтов, разложенным по подкаталогам:
+posts/3f/a2/3fa2….jpg. Одинаковые загрузки ложатся в один файл, а в
+каталоге никогда не бывает больше 256 подкаталогов, сколько бы файлов
+ни было в хранилище. Файл без ссылок удаляет вызывающий код внутри
+locked_file; сохранение, которое ещё не закреплено записью в базе,
+оставляет заявку FileClaim, и такой файл не удаляется.
+
+Заявку стоит заводить и снимать в транзакции записи, которая ссылается
+на файл: тогда откат записи откатит и заявку, а до коммита UPDATE
+держит строку заявки и параллельный locked_file ждёт.
+"""
+import hashlib
+import os
+import posixpath
+import tempfile
+from contextlib import contextmanager
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from core.models import FileClaim
+
+HASH_CHUNK_SIZE = 64 * 1024
+# Два уровня по два символа хеша: 65 536 конечных каталогов
+SHARD_LEVELS = 2
+SHARD_WIDTH = 2
+
+
+def content_hash(content):
+    """SHA-256 содержимого; готовый хеш берётся из content.content_hash."""
+    digest = getattr(content, 'content_hash', None)
+    if digest:
+        return digest
+    sha = hashlib.sha256()
+    for chunk in content.chunks(HASH_CHUNK_SIZE):
+        sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _claim(name, delta):
+    """Меняет число заявок на name и возвращает новое.
+
+    UPDATE блокирует строку до конца транзакции, так что сохранение и
+    удаление одного и того же файла выполняются по очереди.
+    """
+    FileClaim.objects.get_or_create(name=name)
+    FileClaim.objects.filter(name=name).update(
+        count=Greatest(F('count') + delta, 0)
+    )
+    return FileClaim.objects.values_list('count', flat=True).get(name=name)
+
+
+def _drop_empty_claim(name):
+    FileClaim.objects.filter(name=name, count=0).delete()
+
+
+def claim_file(name):
+    """Заводит заявку на файл до его записи; снимает её settle_file."""
+    with transaction.atomic():
+        _claim(name, 1)
+
+
+def settle_file(name):
+    """Снимает заявку, когда запись со ссылкой на файл уже сохранена.
+
+    Вызывается в той же транзакции, что и сохранение записи.
+    """
+    with transaction.atomic():
+        _claim(name, -1)
+        _drop_empty_claim(name)
+
+
+@contextmanager
+def locked_file(name):
+    """Блок, в котором на файл не может появиться новая ссылка.
+
+    Блок получает число незакрытых заявок: если их нет и записи на файл
+    не ссылаются, внутри блока его можно удалить.
+    """
+    with transaction.atomic():
+        yield _claim(name, 0)
+        _drop_empty_claim(name)
+
+
+def hashed_name(name, digest):
+    """posts/photo.JPG -> posts/3f/a2/3fa2….jpg"""
+    directory = posixpath.dirname(name.replace('\\', '/'))
+    extension = os.path.splitext(name)[1].lower()
+    shards = [
+        digest[level * SHARD_WIDTH:(level + 1) * SHARD_WIDTH]
+        for level in range(SHARD_LEVELS)
+    ]
+    return posixpath.join(directory, *shards, digest + extension)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage, который называет файлы хешем содержимого.
+
+    Если файл с таким содержимым уже есть, запись пропускается, но
+    заявка на него всё равно заводится. Новый файл пишется во временный рядом и
+    атомарно переименовывается, так что две одновременные загрузки одного
+    и того же не мешают друг другу.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Имя всё равно заменит хеш, а совпадение имён — это дубликат,
+        # а не конфликт
+        return name
+
+    def _save(self, name, content):
+        name = hashed_name(name, content_hash(content))
+        with transaction.atomic():
+            # Заявка появляется до проверки существования: найденный здесь
+            # файл уже не удалит параллельный locked_file. Снимает её
+            # settle_file в транзакции записи со ссылкой на файл
+            claim_file(name)
+            self.write(name, content)
+        return name
+
+    def write(self, name, content):
+        """Пишет content под готовым именем, если такого файла ещё нет.
+
+        На файл уже должна быть заявка claim_file, иначе его может удалить
+        параллельное освобождение.
+        """
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            return
+        directory = os.path.dirname(full_path)
+        if self.directory_permissions_mode is not None:
+            old_umask = os.umask(0)
+            try:
+                os.makedirs(
+                    directory, self.directory_permissions_mode, exist_ok=True
+                )
+            finally:
+                os.umask(old_umask)
+        else:
+            os.makedirs(directory, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as output:
+                for chunk in content.chunks():
+                    output.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(tmp_path, self.file_permissions_mode)
+            os.replace(tmp_path, full_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
@@ -0,0 +1,205 @@
+"""Время рендера шаблонов: по каждому шаблону и каждому вложению.
+
+Загрузчик Loader отдаёт шаблоны класса TimedTemplate, который замеряет
+свой рендер. Для шаблона считаются вызовы, полное время и собственное
+время без вложенных шаблонов, а для каждого вложения — то же по пути
+рендера, например «posts/index.html > base.html > includes/header.html».
+Блоки наследника рендерятся внутри базового шаблона, поэтому
+{% include %} из блока оказывается в пути после base.html.
+Итоги копятся в памяти процесса и отдаются /admin/template-stats/,
+а итоги одного запроса TemplateTimingMiddleware пишет в Server-Timing.
+Замеры включает настройка TEMPLATE_TIMING. Каждый поток копит итоги
+в своём RenderStats без блокировок, сводка складывает их при запросе.
+"""
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.template import Template
+from django.template.loaders import base, cached
+
+# Блокировка нужна только для списка итогов потоков, не для рендера
+_lock = threading.Lock()
+_local = threading.local()
+_thread_totals = []
+_generation = 0
+
+METRIC_NAME = re.compile(r'[^A-Za-z0-9_-]+')
+
+
+class TimingRecord:
+    """Вызовы и время рендеров; self_time — без вложенных шаблонов."""
+
+    __slots__ = ('calls', 'total', 'self_time')
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.self_time = 0.0
+
+    def add(self, total, self_time=0.0):
+        self.calls += 1
+        self.total += total
+        self.self_time += self_time
+
+    def merge(self, other):
+        self.calls += other.calls
+        self.total += other.total
+        self.self_time += other.self_time
+
+    def as_dict(self):
+        return {
+            'calls': self.calls,
+            'total_ms': round(self.total * 1000, 3),
+            'self_ms': round(self.self_time * 1000, 3),
+        }
+
+
+class RenderStats:
+    """Замеры одного запроса или всего процесса."""
+
+    def __init__(self):
+        self.templates = {}
+        self.includes = {}
+
+    def record(self, path, elapsed, self_time):
+        self.templates.setdefault(path[-1], TimingRecord()).add(
+            elapsed, self_time
+        )
+        if len(path) > 1:
+            self.includes.setdefault(
+                ' > '.join(path), TimingRecord()
+            ).add(elapsed, self_time)
+
+    def merge(self, other):
+        # list() снимает копию словаря, который поток-владелец
+        # может в это время дополнять
+        for mine, theirs in (
+            (self.templates, other.templates),
+            (self.includes, other.includes),
+        ):
+            for name, record in list(theirs.items()):
+                mine.setdefault(name, TimingRecord()).merge(record)
+
+    @property
+    def total(self):
+        """Время рендера без двойного счёта вложенных шаблонов."""
+        return sum(record.self_time for record in self.templates.values())
+
+    def server_timing(self, limit):
+        renders = sum(record.calls for record in self.templates.values())
+        metrics = [
+            f'tpl;dur={self.total * 1000:.2f};'
+            f'desc="{renders} template renders"'
+        ]
+        slowest = sorted(
+            self.templates.items(),
+            key=lambda item: item[1].self_time, reverse=True,
+        )[:limit]
+        for name, record in slowest:
+            metrics.append(
+                f'tpl-{METRIC_NAME.sub("-", name)};'
+                f'dur={record.self_time * 1000:.2f};'
+                f'desc="{name} x{record.calls}"'
+            )
+        return ', '.join(metrics)
+
+    def as_dict(self):
+        return {
+            'templates': {
+                name: record.as_dict()
+                for name, record in sorted(self.templates.items())
+            },
+            'includes': {
+                path: record.as_dict()
+                for path, record in sorted(self.includes.items())
+            },
+        }
+
+
+def _thread_stats():
+    """Итоги текущего потока; после сброса поток заводит новые."""
+    stats = getattr(_local, 'totals', None)
+    if stats is None or _local.generation != _generation:
+        stats = _local.totals = RenderStats()
+        with _lock:
+            _local.generation = _generation
+            _thread_totals.append(stats)
+    return stats
+
+
+class TimedTemplate(Template):
+    def _render(self, context):
+        if not settings.TEMPLATE_TIMING:
+            return super()._render(context)
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        # [имя, время вложенных рендеров]
+        frame = [self.name or '<string>', 0.0]
+        stack.append(frame)
+        started = time.perf_counter()
+        try:
+            return super()._render(context)
+        finally:
+            elapsed = time.perf_counter() - started
+            path = tuple(name for name, _ in stack)
+            stack.pop()
+            if stack:
+                stack[-1][1] += elapsed
+            self_time = elapsed - frame[1]
+            request_stats = getattr(_local, 'request_stats', None)
+            if request_stats is not None:
+                request_stats.record(path, elapsed, self_time)
+            _thread_stats().record(path, elapsed, self_time)
+
+
+def _timed(template):
+    # Шаблон уже разобран загрузчиком, замена класса только подменяет
+    # _render и не требует повторной компиляции
+    if type(template) is Template:
+        template.__class__ = TimedTemplate
+    return template
+
+
+class Loader(cached.Loader):
+    """Кеширующий загрузчик, который отдаёт TimedTemplate.
+
+    При debug шаблоны, как и без кеширующего загрузчика, читаются
+    с диска при каждом обращении.
+    """
+
+    def get_template(self, template_name, skip=None):
+        if self.engine.debug:
+            template = base.Loader.get_template(self, template_name, skip)
+        else:
+            template = super().get_template(template_name, skip)
+        return _timed(template)
+
+
+def start_request():
+    _local.request_stats = RenderStats()
+    _local.stack = []
+
+
+def finish_request():
+    stats = getattr(_local, 'request_stats', None)
+    _local.request_stats = None
+    return stats
+
+
+def template_stats():
+    with _lock:
+        threads = list(_thread_totals)
+    totals = RenderStats()
+    for stats in threads:
+        totals.merge(stats)
+    return totals.as_dict()
+
+
+def reset_template_stats():
+    global _generation
+    with _lock:
+        _generation += 1
+        _thread_totals.clear()
@@ -0,0 +1,44 @@
+from django.test import override_settings
+
+
+class QueryBudgetMixin:
+    """Бюджеты SQL-запросов для представлений в тестах.
+
+    query_budgets сопоставляет имя представления (например, 'posts:index')
+    с максимальным числом запросов. Требует QueryStatsMiddleware
+    и включает его настройку QUERY_STATS на время теста.
+    """
+
+    query_budgets = {}
+
+    @classmethod
+    def setUpClass(cls):
+        cls._query_stats = override_settings(QUERY_STATS=True)
+        cls._query_stats.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls._query_stats.disable()
+
+    def assertQueryBudget(self, response, budget=None):
+        stats = getattr(response, 'query_stats', None)
+        self.assertIsNotNone(
+            stats, 'QueryStatsMiddleware не подключён в MIDDLEWARE'
+        )
+        if budget is None:
+            budget = self.query_budgets.get(stats.view_name)
+        self.assertIsNotNone(
+            budget, f'Для {stats.view_name} не задан бюджет запросов'
+        )
+        duplicated = '\n'.join(
+            f'{count}x {stats.samples[key]}'
+            for key, count in stats.duplicates.items()
+        )
+        self.assertLessEqual(
+            stats.count,
+            budget,
+            f'{stats.view_name}: {stats.count} запросов при бюджете '
+            f'{budget}\n{duplicated}'
+        )
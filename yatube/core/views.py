@@ -1,5 +1,12 @@
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
 from django.shortcuts import render
 
+from core.cache import cache_stats as collect_cache_stats
+from core.files import serve_file
+from core.template_timing import template_stats as collect_template_stats
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -11,3 +18,40 @@ def csrf_failure(request, reason=''):
 
 def server_fault(request):
     return render(request, 'core/500.html')
+
+
+@staff_member_required
+def cache_stats(request):
+    stats = collect_cache_stats()
+    for counters in stats.values():
+        lookups = counters.get('hits', 0) + counters.get('misses', 0)
+        counters['hit_rate'] = (
+            round(counters.get('hits', 0) / lookups, 3) if lookups else None
+        )
+    return JsonResponse(stats)
+
+
+@staff_member_required
+def template_stats(request):
+    return JsonResponse(collect_template_stats())
+
+
+def serve_static(request, path):
+    return serve_file(
+        request,
+        settings.STATIC_ROOT,
+        path,
+        max_age=settings.STATIC_MAX_AGE,
+        offload_prefix=settings.FILE_OFFLOAD_STATIC_PREFIX,
+        precompressed=True,
+    )
+
+
+def serve_media(request, path):
+    return serve_file(
+        request,
+        settings.MEDIA_ROOT,
+        path,
+        max_age=settings.MEDIA_MAX_AGE,
+        offload_prefix=settings.FILE_OFFLOAD_MEDIA_PREFIX,
+    )
@@ -1,5 +1,7 @@
 from django.contrib import admin
+from django.db.models.expressions import RawSQL
 
+from . import search
 from .models import Comment, Group, Post
 
 
@@ -10,6 +12,17 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Ищем по обратному индексу вместо LIKE '%...%' по всей таблице
+        if not search_term.strip() or not search.supported():
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        subquery = search.matching_ids_sql(search_term)
+        if subquery is None:
+            return queryset.none(), False
+        return queryset.filter(pk__in=RawSQL(*subquery)), False
+
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group)
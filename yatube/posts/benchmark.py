@@ -0,0 +1,265 @@
+"""Нагрузочный прогон лент: синтетические данные, замеры и сравнение.
+
+seed_dataset заводит пользователей, группы, подписки и посты
+с картинками и комментариями, run_benchmark гоняет адреса posts:
+несколькими потоками через тестовый клиент Django, а summarize
+считает перцентили задержки, запросы к базе и пропускную способность.
+"""
+import json
+import math
+import os
+import queue
+import random
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+from faker import Faker
+from mixer.backend.django import mixer
+from PIL import Image
+
+from .models import Follow, Group, Post, User
+
+USER_PREFIX = 'bench_user_'
+GROUP_PREFIX = 'bench-group-'
+IMAGE_COUNT = 5
+PERCENTILES = (50, 95, 99)
+
+
+def seed_dataset(users=50, groups=5, posts=1000, comments_per_post=2,
+                 follows_per_user=10, image_share=0.2, seed=0):
+    """Заводит синтетический набор данных через import_posts.
+
+    Подписки создаются до постов, чтобы импорт разложил посты по лентам.
+    """
+    fake = Faker('ru_RU')
+    fake.seed_instance(seed)
+    rng = random.Random(seed)
+
+    authors = mixer.cycle(users).blend(
+        User, username=mixer.sequence(USER_PREFIX + '{0}')
+    )
+    group_slugs = [
+        group.slug for group in mixer.cycle(groups).blend(
+            Group, slug=mixer.sequence(GROUP_PREFIX + '{0}')
+        )
+    ] if groups else []
+    Follow.objects.bulk_create(
+        [
+            Follow(user=user, author=author)
+            for user in authors
+            for author in rng.sample(
+                [other for other in authors if other != user],
+                min(follows_per_user, len(authors) - 1),
+            )
+        ],
+        ignore_conflicts=True,
+    )
+
+    with tempfile.TemporaryDirectory() as source_dir:
+        images = []
+        for index in range(IMAGE_COUNT):
+            name = f'bench_{index}.png'
+            Image.new(
+                'RGB', (960, 540), color=rng.choice(('red', 'green', 'blue'))
+            ).save(os.path.join(source_dir, name))
+            images.append(name)
+        path = os.path.join(source_dir, 'posts.jsonl')
+        with open(path, 'w', encoding='utf-8') as dump:
+            for _ in range(posts):
+                row = {
+                    'author': rng.choice(authors).username,
+                    'text': fake.text(max_nb_chars=400),
+                    'group': (
+                        rng.choice(group_slugs + [None])
+                        if group_slugs else None
+                    ),
+                    'pub_date': fake.date_time_between(
+                        start_date='-2y'
+                    ).isoformat(),
+                    'comments': [
+                        {
+                            'author': rng.choice(authors).username,
+                            'text': fake.sentence(),
+                        }
+                        for _ in range(comments_per_post)
+                    ],
+                }
+                if rng.random() < image_share:
+                    row['image'] = rng.choice(images)
+                dump.write(json.dumps(row, ensure_ascii=False) + '\n')
+        call_command('import_posts', path, stdout=StringIO())
+    cache.clear()
+
+
+def benchmark_targets():
+    """Ключи для подстановки в адреса: случайные группа, автор и пост."""
+    return {
+        'groups': list(Group.objects.values_list('slug', flat=True)),
+        'authors': list(
+            User.objects
+            .filter(posts__isnull=False)
+            .distinct()
+            .values_list('username', flat=True)
+        ),
+        'posts': list(Post.objects.values_list('pk', flat=True)),
+        'readers': list(
+            User.objects
+            .filter(follower__isnull=False)
+            .distinct()
+            .values_list('pk', flat=True)
+        ),
+    }
+
+
+def _scenarios(targets, rng):
+    """Читающие адреса posts:, по одному на каждый шаблон URL."""
+    group = rng.choice(targets['groups'])
+    author = rng.choice(targets['authors'])
+    post_id = rng.choice(targets['posts'])
+    return {
+        'posts:index': reverse('posts:index'),
+        'posts:index?page': (
+            reverse('posts:index') + f'?page={rng.randint(2, 50)}'
+        ),
+        'posts:index?cursor': reverse('posts:index') + '?cursor=',
+        'posts:group_list': reverse('posts:group_list', args=[group]),
+        'posts:profile': reverse('posts:profile', args=[author]),
+        'posts:post_detail': reverse('posts:post_detail', args=[post_id]),
+        'posts:follow_index': reverse('posts:follow_index'),
+        'posts:search': reverse('posts:search') + '?q=' + rng.choice(
+            ('дом', 'время', 'человек', 'работа', 'жизнь')
+        ),
+        'posts:post_create': reverse('posts:post_create'),
+    }
+
+
+def _login(reader_id):
+    client = Client()
+    client.force_login(User.objects.get(pk=reader_id))
+    return client
+
+
+def run_benchmark(requests=500, concurrency=8, cold_cache=False, seed=0):
+    """Гоняет сценарии в concurrency потоков.
+
+    Возвращает замеры (сценарий, секунды, запросов к базе, код ответа)
+    и общее время прогона. Клиенты логинятся заранее в текущем потоке,
+    чтобы запись сессий не попадала в замеры и не спорила за базу.
+    При concurrency=1 всё выполняется в текущем потоке.
+    """
+    targets = benchmark_targets()
+    if not targets['posts'] or not targets['readers']:
+        raise ValueError('Нет данных: сначала заполните базу seed_dataset')
+    rng = random.Random(seed)
+    names = sorted(_scenarios(targets, rng))
+    clients = queue.SimpleQueue()
+    for _ in range(max(concurrency, 1)):
+        clients.put(_login(rng.choice(targets['readers'])))
+    local = threading.local()
+
+    def one_request(number):
+        if not hasattr(local, 'client'):
+            local.client = clients.get()
+        name = names[number % len(names)]
+        url = _scenarios(targets, random.Random(seed + number))[name]
+        if cold_cache:
+            cache.clear()
+        started = time.perf_counter()
+        response = local.client.get(url)
+        elapsed = time.perf_counter() - started
+        stats = getattr(response, 'query_stats', None)
+        return name, elapsed, stats.count if stats else 0, response.status_code
+
+    started = time.perf_counter()
+    if concurrency <= 1:
+        samples = [one_request(number) for number in range(requests)]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            samples = list(pool.map(one_request, range(requests)))
+            # У каждого потока пула своё соединение с базой
+            list(pool.map(
+                lambda _: connections.close_all(), range(concurrency)
+            ))
+    return samples, time.perf_counter() - started
+
+
+def percentile(values, percent):
+    """Перцентиль методом ближайшего ранга по отсортированному списку."""
+    if not values:
+        return 0.0
+    rank = max(math.ceil(percent / 100 * len(values)), 1)
+    return values[rank - 1]
+
+
+def _summary(samples, elapsed):
+    latencies = sorted(elapsed_ms for _, elapsed_ms, _, _ in samples)
+    summary = {
+        f'p{percent}_ms': round(percentile(latencies, percent), 2)
+        for percent in PERCENTILES
+    }
+    summary.update({
+        'requests': len(samples),
+        'errors': sum(1 for *_, status in samples if status >= 500),
+        'queries': round(
+            sum(queries for _, _, queries, _ in samples) / len(samples), 2
+        ),
+        'max_queries': max(queries for _, _, queries, _ in samples),
+        'rps': round(len(samples) / elapsed, 1) if elapsed else 0.0,
+    })
+    return summary
+
+
+def summarize(samples, elapsed):
+    """Сводка по каждому сценарию и по прогону целиком.
+
+    Пропускная способность сценария считается от общего времени прогона,
+    так что их сумма равна общей.
+    """
+    samples = [
+        (name, seconds * 1000, queries, status)
+        for name, seconds, queries, status in samples
+    ]
+    by_scenario = defaultdict(list)
+    for sample in samples:
+        by_scenario[sample[0]].append(sample)
+    return {
+        'total': _summary(samples, elapsed) if samples else {},
+        'scenarios': {
+            name: _summary(scenario_samples, elapsed)
+            for name, scenario_samples in sorted(by_scenario.items())
+        },
+    }
+
+
+def compare_with_baseline(report, baseline, tolerance=0.2):
+    """Список регрессий относительно сохранённого отчёта.
+
+    Регрессия — рост p95 больше чем на tolerance или рост наибольшего
+    числа запросов к базе на ответ. Среднее число запросов зависит от
+    того, как потоки наполнили кеш, поэтому не сравнивается. Новые
+    сценарии пропускаются.
+    """
+    regressions = []
+    for name, current in report['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            continue
+        if current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append(
+                f'{name}: p95 {previous["p95_ms"]} -> {current["p95_ms"]} мс'
+            )
+        if current['max_queries'] > previous['max_queries']:
+            regressions.append(
+                f'{name}: запросов {previous["max_queries"]} -> '
+                f'{current["max_queries"]}'
+            )
+    return regressions
@@ -0,0 +1,38 @@
+"""Условные GET-запросы к лентам и странице поста.
+
+ETag страницы собирается до рендеринга из того, от чего страница
+зависит: версии ленты из feed_cache, параметров страницы и зрителя.
+Версия ленты меняется при новом посте или комментарии, а ещё при
+правке и удалении, которых не видно по самой поздней дате публикации.
+Совпавший If-None-Match получает 304, и шаблон не рендерится.
+
+ETag слабый: токен CSRF в форме маскируется заново при каждом
+рендеринге, и байты двух одинаковых страниц не совпадают.
+"""
+import hashlib
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response
+
+
+def page_etag(request, *parts):
+    """ETag страницы для этого зрителя и этих параметров запроса."""
+    viewer = request.user.pk if request.user.is_authenticated else 'anon'
+    parts = (
+        settings.PAGE_ETAG_VERSION, viewer, request.GET.urlencode()
+    ) + parts
+    digest = hashlib.md5(';'.join(map(str, parts)).encode()).hexdigest()
+    return f'W/"{digest}"'
+
+
+def not_modified(request, etag):
+    """Ответ 304, если у клиента уже есть эта версия, иначе None."""
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        response['ETag'] = etag
+    return response
+
+
+def with_etag(response, etag):
+    response['ETag'] = etag
+    return response
@@ -0,0 +1,121 @@
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from .models import Post, PostCounter
+
+COUNTER_CACHE_TIMEOUT = 60 * 60
+COUNTER_CACHE_KEY = 'post_count:{scope}:{object_id}'
+
+
+def _cache_key(scope, object_id):
+    return COUNTER_CACHE_KEY.format(scope=scope, object_id=object_id)
+
+
+def _scopes(author_id, group_id):
+    scopes = [
+        (PostCounter.SCOPE_ALL, 0),
+        (PostCounter.SCOPE_AUTHOR, author_id),
+    ]
+    if group_id is not None:
+        scopes.append((PostCounter.SCOPE_GROUP, group_id))
+    return scopes
+
+
+def get_post_count(scope, object_id=0, queryset=None):
+    """Количество постов из денормализованной таблицы, через кеш.
+
+    Если счётчик ещё не заведён, считает посты в queryset, а без него
+    возвращает None.
+    """
+    key = _cache_key(scope, object_id)
+    count = cache.get(key)
+    if count is None:
+        count = (
+            PostCounter.objects
+            .filter(scope=scope, object_id=object_id)
+            .values_list('count', flat=True)
+            .first()
+        )
+        if count is None:
+            return queryset.count() if queryset is not None else None
+        cache.set(key, count, COUNTER_CACHE_TIMEOUT)
+    return count
+
+
+def _forget(keys):
+    cache.delete_many(keys)
+    # Параллельный запрос мог прочитать старое число до коммита
+    # и положить его в кеш: сбрасываем ещё раз после коммита
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def _add(scope, object_id, delta):
+    return PostCounter.objects.filter(
+        scope=scope, object_id=object_id
+    ).update(count=Greatest(F('count') + delta, 0))
+
+
+def change_post_count(scope, object_id, delta):
+    if not _add(scope, object_id, delta):
+        # Первый пост автора могут сохранить два запроса сразу:
+        # строку заводит тот, кто успел, а прибавляют оба
+        PostCounter.objects.bulk_create(
+            [PostCounter(scope=scope, object_id=object_id)],
+            ignore_conflicts=True,
+        )
+        _add(scope, object_id, delta)
+    _forget([_cache_key(scope, object_id)])
+
+
+def post_added(author_id, group_id):
+    for scope, object_id in _scopes(author_id, group_id):
+        change_post_count(scope, object_id, 1)
+
+
+def posts_added(posts):
+    """Учитывает пачку постов, вставленных в обход сигналов."""
+    deltas = Counter()
+    for post in posts:
+        deltas.update(_scopes(post.author_id, post.group_id))
+    for (scope, object_id), delta in deltas.items():
+        change_post_count(scope, object_id, delta)
+
+
+def post_removed(author_id, group_id):
+    for scope, object_id in _scopes(author_id, group_id):
+        change_post_count(scope, object_id, -1)
+
+
+def recount_posts():
+    """Пересчитывает все счётчики заново, например после bulk_create."""
+    counters = [
+        PostCounter(
+            scope=PostCounter.SCOPE_ALL,
+            object_id=0,
+            count=Post.objects.count(),
+        )
+    ]
+    for scope, field in (
+        (PostCounter.SCOPE_AUTHOR, 'author'),
+        (PostCounter.SCOPE_GROUP, 'group'),
+    ):
+        rows = (
+            Post.objects
+            .filter(**{f'{field}__isnull': False})
+            .values(field)
+            .annotate(total=Count('pk'))
+            .order_by()
+        )
+        counters.extend(
+            PostCounter(scope=scope, object_id=row[field], count=row['total'])
+            for row in rows
+        )
+    PostCounter.objects.all().delete()
+    PostCounter.objects.bulk_create(counters)
+    _forget(
+        [_cache_key(counter.scope, counter.object_id) for counter in counters]
+    )
@@ -0,0 +1,96 @@
+"""Потоковая выгрузка постов с комментариями.
+
+Посты читаются пачками по ключу id, без OFFSET, а в памяти одновременно
+лежит только одна пачка. Формат строк совпадает с тем, что принимает
+manage.py import_posts.
+"""
+import csv
+import io
+import json
+
+from .models import Comment, Post
+
+DEFAULT_BATCH_SIZE = 1000
+FORMATS = ('jsonl', 'csv')
+CSV_FIELDS = ('id', 'author', 'group', 'pub_date', 'image', 'text',
+              'comments')
+CONTENT_TYPES = {
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+def _comments_by_post(post_ids, chunk_size):
+    comments = {}
+    rows = (
+        Comment.objects
+        .filter(post_id__in=post_ids)
+        .select_related('author')
+        .order_by('post_id', 'pk')
+        .iterator(chunk_size=chunk_size)
+    )
+    for comment in rows:
+        comments.setdefault(comment.post_id, []).append({
+            'author': comment.author.username,
+            'text': comment.text,
+            'created': comment.created.isoformat(),
+        })
+    return comments
+
+
+def export_rows(queryset=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Словари постов по возрастанию id: автор, группа и комментарии."""
+    if queryset is None:
+        queryset = Post.objects.all()
+    queryset = queryset.select_related('author', 'group').order_by('pk')
+    last_pk = 0
+    while True:
+        posts = list(
+            queryset.filter(pk__gt=last_pk)[:batch_size]
+            .iterator(chunk_size=batch_size)
+        )
+        if not posts:
+            return
+        comments = _comments_by_post(
+            [post.pk for post in posts], batch_size
+        )
+        for post in posts:
+            yield {
+                'id': post.pk,
+                'author': post.author.username,
+                'group': post.group.slug if post.group else None,
+                'pub_date': post.pub_date.isoformat(),
+                'image': post.image.name or None,
+                'text': post.text,
+                'comments': comments.get(post.pk, []),
+            }
+        last_pk = posts[-1].pk
+
+
+def jsonl_lines(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+def csv_lines(rows):
+    """Строки CSV; комментарии лежат в колонке comments как JSON."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_FIELDS)
+    writer.writeheader()
+    for row in rows:
+        row = dict(row, comments=json.dumps(
+            row['comments'], ensure_ascii=False
+        ))
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Заголовок без строк тоже должен попасть в выгрузку
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+LINE_WRITERS = {
+    'jsonl': jsonl_lines,
+    'csv': csv_lines,
+}
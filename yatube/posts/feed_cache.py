@@ -0,0 +1,133 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+
+from . import graph
+
+FEED_VERSION_KEY = 'feed_version:{feed}'
+GLOBAL = 'global'
+GROUP = 'group'
+AUTHOR = 'author'
+FOLLOWER = 'follower'
+POST = 'post'
+# Имена авторов и названия групп видны в любой ленте, поэтому их версия
+# входит в ключ каждой ленты
+NAMES = 'names'
+
+
+def _feed_name(kind, object_id=None):
+    if object_id is None:
+        return kind
+    return f'{kind}:{object_id}'
+
+
+def _version_key(feed):
+    return FEED_VERSION_KEY.format(feed=feed)
+
+
+def _new_version():
+    # Начальная версия берётся из часов, а не с единицы: если ключ версии
+    # вытеснят из кеша, старые фрагменты не совпадут с новой версией
+    return time.time_ns()
+
+
+def feed_version(kind, object_id=None):
+    key = _version_key(_feed_name(kind, object_id))
+    version = cache.get(key)
+    if version is None:
+        version = _new_version()
+        cache.add(key, version, None)
+        version = cache.get(key, version)
+    return version
+
+
+def _feed_versions(feeds):
+    """Версии нескольких лент одним обращением к кешу.
+
+    feeds — пары (вид, id); недостающие версии заводятся по одной.
+    """
+    keys = {feed: _version_key(_feed_name(*feed)) for feed in feeds}
+    found = cache.get_many(keys.values())
+    return {
+        feed: found[key] if key in found else feed_version(*feed)
+        for feed, key in keys.items()
+    }
+
+
+def bump_feed(kind, object_id=None):
+    """Инвалидирует все закешированные страницы ленты."""
+    key = _version_key(_feed_name(kind, object_id))
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), None)
+
+
+def bump_post_feeds(post, previous_group_id=None):
+    """Сбрасывает все ленты, в которых показывается пост."""
+    bump_feed(GLOBAL)
+    bump_feed(AUTHOR, post.author_id)
+    bump_feed(POST, post.pk)
+    for group_id in {post.group_id, previous_group_id} - {None}:
+        bump_feed(GROUP, group_id)
+
+
+def bump_post_page_feeds(post):
+    """Сбрасывает страницу поста и ленты его автора и группы.
+
+    Для правок, которые не стоят сброса главной: например, готовых
+    миниатюр. Главная покажет их после следующего сброса.
+    """
+    bump_feed(AUTHOR, post.author_id)
+    bump_feed(POST, post.pk)
+    if post.group_id is not None:
+        bump_feed(GROUP, post.group_id)
+
+
+def bump_many_post_feeds(posts):
+    """Как bump_post_feeds для пачки постов: каждая лента — один раз."""
+    feeds = set()
+    for post in posts:
+        feeds.update({(AUTHOR, post.author_id), (POST, post.pk)})
+        if post.group_id is not None:
+            feeds.add((GROUP, post.group_id))
+    if feeds:
+        feeds.add((GLOBAL, None))
+    for kind, object_id in feeds:
+        bump_feed(kind, object_id)
+
+
+def bump_names():
+    """Сбрасывает все ленты после смены имени автора или группы."""
+    bump_feed(NAMES)
+
+
+def feed_key(kind, object_id=None):
+    """Ключ для {% cache %}: имя ленты, её версия и версия имён."""
+    versions = _feed_versions([(kind, object_id), (NAMES, None)])
+    return (
+        f'{_feed_name(kind, object_id)}:{versions[kind, object_id]}:'
+        f'{versions[NAMES, None]}'
+    )
+
+
+def follow_feed_key(user):
+    """Ключ ленты подписок собирается из версий всех авторов подписки.
+
+    Новый пост меняет версию только своего автора, поэтому запись
+    не раскладывается по подписчикам: ключ меняется при чтении.
+    Версия самого подписчика сбрасывается при подписке и отписке.
+    """
+    author_ids = graph.following(user.pk)
+    versions = _feed_versions(
+        [(FOLLOWER, user.pk), (NAMES, None)]
+        + [(AUTHOR, author_id) for author_id in author_ids]
+    )
+    parts = [
+        str(versions[FOLLOWER, user.pk]), str(versions[NAMES, None])
+    ]
+    for author_id in author_ids:
+        parts.append(f'{author_id}:{versions[AUTHOR, author_id]}')
+    digest = hashlib.md5(';'.join(parts).encode()).hexdigest()
+    return f'{_feed_name(FOLLOWER, user.pk)}:{digest}'
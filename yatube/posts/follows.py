@@ -0,0 +1,56 @@
+"""Подписки и отписки пачкой.
+
+Подписка — один INSERT через bulk_create, который не шлёт сигналов
+Follow, поэтому раскладка по лентам и сброс кешей делаются здесь явно.
+Отписка — обычный delete(): его сигналы post_delete сбрасывают граф,
+ленту подписок и таймлайн сами, как при удалении из админки.
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from . import feed_cache, graph, timeline
+from .models import Follow
+
+User = get_user_model()
+
+
+def follow_authors(user, authors):
+    """Подписывает user на авторов, возвращает имена новых подписок.
+
+    authors — id или подзапрос с id авторов. Повторная подписка и
+    подписка на себя молча пропускаются, а гонка двух одинаковых
+    запросов гасится ignore_conflicts вместо IntegrityError.
+    """
+    new_authors = list(
+        User.objects
+        .filter(pk__in=authors)
+        .exclude(pk=user.pk)
+        .annotate(followed=Exists(
+            Follow.objects.filter(user=user, author=OuterRef('pk'))
+        ))
+        .filter(followed=False)
+        .values_list('pk', 'username')
+    )
+    if not new_authors:
+        return []
+    with transaction.atomic():
+        Follow.objects.bulk_create(
+            [Follow(user=user, author_id=pk) for pk, _ in new_authors],
+            ignore_conflicts=True,
+        )
+        for author_id, _ in new_authors:
+            graph.follow_changed(user.pk, author_id)
+            timeline.author_followed(user.pk, author_id)
+    feed_cache.bump_feed(feed_cache.FOLLOWER, user.pk)
+    return [username for _, username in new_authors]
+
+
+def unfollow_authors(user, authors):
+    """Отписывает user от авторов, возвращает имена снятых подписок."""
+    follows = Follow.objects.filter(user=user, author__in=authors)
+    removed = list(follows.values_list('author__username', flat=True))
+    if not removed:
+        return []
+    deleted, _ = follows.delete()
+    return removed if deleted else []
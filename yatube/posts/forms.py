@@ -1,9 +1,40 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
 from django.forms import ModelForm
+from django.template.defaultfilters import filesizeformat
 
 from .models import Comment, Post
+from .uploads import normalize_image
 
 
 class PostForm(ModelForm):
+    """Пост; новая картинка проверяется и пересохраняется при загрузке."""
+
+    def __init__(self, *args, upload_too_large=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Файл сверх лимита обработчик загрузки до формы не донёс,
+        # см. posts.uploads.upload_too_large
+        self.image_too_large = upload_too_large
+        image = self.files.get('image') if self.files else None
+        if image is not None and image.size > settings.UPLOAD_MAX_BYTES:
+            # Файл от другого обработчика загрузок: размер проверяем сами
+            self.image_too_large = True
+            self.files = self.files.copy()
+            del self.files['image']
+
+    def clean_image(self):
+        if self.image_too_large:
+            raise ValidationError(
+                'Файл больше '
+                f'{filesizeformat(settings.UPLOAD_MAX_BYTES)}',
+                code='file_too_large',
+            )
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            image = normalize_image(image)
+        return image
+
     class Meta:
         model = Post
         fields = ('text', 'group', 'image')
@@ -0,0 +1,151 @@
+"""Граф подписок с кешированными списками смежности.
+
+Для каждого пользователя в кеше лежат отсортированные массивы id:
+на кого он подписан и кто подписан на него. Массив array('I') занимает
+четыре байта на подписку, а проверка «подписан ли A на B» — это
+двоичный поиск. Записи сбрасывает follow_changed при любой подписке
+или отписке.
+
+Список длиннее FOLLOW_GRAPH_CACHE_MAX_IDS режется на куски: запись
+по основному ключу тогда хранит метку и число кусков.
+"""
+from array import array
+from bisect import bisect_left
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Follow
+
+FOLLOWING = 'following'
+FOLLOWERS = 'followers'
+GRAPH_KEY = 'graph:{direction}:{user_id}'
+CHUNK_KEY = GRAPH_KEY + ':{token}:{index}'
+GRAPH_CACHE_TIMEOUT = 60 * 60 * 24
+
+_COLUMNS = {
+    # направление: (поле-владелец, поле-сосед)
+    FOLLOWING: ('user_id', 'author_id'),
+    FOLLOWERS: ('author_id', 'user_id'),
+}
+
+
+def _key(direction, user_id):
+    return GRAPH_KEY.format(direction=direction, user_id=user_id)
+
+
+def _chunk_keys(direction, user_id, token, count):
+    return [
+        CHUNK_KEY.format(
+            direction=direction, user_id=user_id, token=token, index=index
+        )
+        for index in range(count)
+    ]
+
+
+def _store(direction, user_id, ids):
+    ids = array('I', sorted(ids))
+    size = settings.FOLLOW_GRAPH_CACHE_MAX_IDS
+    if len(ids) <= size:
+        cache.set(_key(direction, user_id), ids, GRAPH_CACHE_TIMEOUT)
+        return ids
+    # Новая метка на каждую запись: куски старой версии списка
+    # не смешаются с новыми, а просто истекут
+    token = uuid4().hex[:8]
+    keys = _chunk_keys(
+        direction, user_id, token, (len(ids) + size - 1) // size
+    )
+    cache.set_many(
+        {
+            key: ids[index * size:(index + 1) * size]
+            for index, key in enumerate(keys)
+        },
+        GRAPH_CACHE_TIMEOUT,
+    )
+    cache.set(
+        _key(direction, user_id), (token, len(keys)), GRAPH_CACHE_TIMEOUT
+    )
+    return ids
+
+
+def _cached(direction, user_id):
+    value = cache.get(_key(direction, user_id))
+    if not isinstance(value, tuple):
+        return value
+    keys = _chunk_keys(direction, user_id, *value)
+    chunks = cache.get_many(keys)
+    if len(chunks) < len(keys):
+        return None
+    ids = array('I')
+    for key in keys:
+        ids.extend(chunks[key])
+    return ids
+
+
+def _load_many(direction, user_ids):
+    owner, neighbour = _COLUMNS[direction]
+    lists = {user_id: [] for user_id in user_ids}
+    rows = (
+        Follow.objects
+        .filter(**{f'{owner}__in': user_ids})
+        .values_list(owner, neighbour)
+    )
+    for user_id, neighbour_id in rows:
+        lists[user_id].append(neighbour_id)
+    return {
+        user_id: _store(direction, user_id, ids)
+        for user_id, ids in lists.items()
+    }
+
+
+def _adjacency(direction, user_id):
+    ids = _cached(direction, user_id)
+    if ids is None:
+        ids = _load_many(direction, [user_id])[user_id]
+    return ids
+
+
+def following(user_id):
+    """Отсортированный массив id авторов, на которых подписан user_id."""
+    return _adjacency(FOLLOWING, user_id)
+
+
+def followers(user_id):
+    """Отсортированный массив id подписчиков user_id."""
+    return _adjacency(FOLLOWERS, user_id)
+
+
+def following_count(user_id):
+    return len(following(user_id))
+
+
+def followers_count(user_id):
+    return len(followers(user_id))
+
+
+def _contains(ids, value):
+    index = bisect_left(ids, value)
+    return index < len(ids) and ids[index] == value
+
+
+def is_following(user_id, author_id):
+    return _contains(following(user_id), author_id)
+
+
+def mutual(user_id):
+    """Id пользователей, с которыми user_id подписан друг на друга."""
+    followed = following(user_id)
+    return array('I', (
+        follower for follower in followers(user_id)
+        if _contains(followed, follower)
+    ))
+
+
+def follow_changed(user_id, author_id):
+    keys = [_key(FOLLOWING, user_id), _key(FOLLOWERS, author_id)]
+    cache.delete_many(keys)
+    # Параллельный запрос мог успеть прочитать из базы старый список
+    # и положить его в кеш до коммита: сбрасываем ещё раз после коммита
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,130 @@
+"""Варианты миниатюр по ширинам и форматам для srcset и <picture>.
+
+Для каждой геометрии из THUMBNAIL_GEOMETRIES sorl создаёт копии
+ширин IMAGE_VARIANT_WIDTHS в формате миниатюры по умолчанию и в каждом
+формате из IMAGE_VARIANT_FORMATS, который умеет сохранять Pillow.
+AVIF появляется, если установлен pillow-avif-plugin. У каждого варианта
+записывается размер в байтах и экономия относительно основной миниатюры.
+Ширина самой геометрии в формате по умолчанию — это и есть основная
+миниатюра, поэтому такой вариант не создаётся.
+"""
+from django.conf import settings
+from PIL import Image
+from sorl.thumbnail import get_thumbnail
+from sorl.thumbnail.base import EXTENSIONS
+
+try:
+    import pillow_avif  # noqa: F401 — регистрирует AVIF в Pillow
+except ImportError:
+    pass
+
+# sorl берёт расширение файла миниатюры из своей таблицы, где
+# современных форматов нет
+EXTENSIONS.setdefault('WEBP', 'webp')
+EXTENSIONS.setdefault('AVIF', 'avif')
+
+MIME_TYPES = {
+    'jpg': 'image/jpeg',
+    'png': 'image/png',
+    'gif': 'image/gif',
+    'webp': 'image/webp',
+    'avif': 'image/avif',
+}
+
+
+def supported_formats():
+    """Форматы из IMAGE_VARIANT_FORMATS, которые можно сохранить."""
+    Image.init()
+    return tuple(
+        image_format
+        for image_format in settings.IMAGE_VARIANT_FORMATS
+        if image_format in Image.SAVE and image_format in EXTENSIONS
+    )
+
+
+def _size(geometry):
+    return tuple(map(int, geometry.split('x')))
+
+
+def _scaled(geometry, width):
+    base_width, base_height = _size(geometry)
+    return f'{width}x{round(width * base_height / base_width)}'
+
+
+def variant_specs(geometry, options):
+    """Пары (геометрия, опции sorl) всех вариантов одной геометрии.
+
+    Варианты не растягиваются: у маленькой картинки широкие варианты
+    совпадут по размеру и в srcset попадут один раз.
+    """
+    base_width = _size(geometry)[0]
+    for image_format in (None,) + supported_formats():
+        for width in settings.IMAGE_VARIANT_WIDTHS:
+            if image_format is None and width == base_width:
+                continue
+            variant_options = dict(options, upscale=False)
+            if image_format is not None:
+                variant_options['format'] = image_format
+            yield _scaled(geometry, width), variant_options
+
+
+def _mime_type(thumbnail):
+    return MIME_TYPES.get(thumbnail.name.rpartition('.')[2].lower())
+
+
+def _srcset(variants):
+    widths = {}
+    for variant in variants:
+        widths.setdefault(variant['width'], variant['url'])
+    return ', '.join(
+        f'{url} {width}w' for width, url in sorted(widths.items())
+    )
+
+
+def render_variants(image, geometry, options, base):
+    """srcset, источники для <picture> и сведения о вариантах.
+
+    base — основная миниатюра геометрии: её размер в байтах служит
+    точкой отсчёта для экономии, а формат — запасным для <img>.
+    """
+    base_bytes = base.storage.size(base.name)
+    base_type = _mime_type(base)
+    variants = [{
+        'type': base_type,
+        'width': base.width,
+        'height': base.height,
+        'url': base.url,
+        'bytes': base_bytes,
+        'saving': 0.0,
+    }]
+    for variant_geometry, variant_options in variant_specs(geometry, options):
+        thumbnail = get_thumbnail(image, variant_geometry, **variant_options)
+        size = thumbnail.storage.size(thumbnail.name)
+        variants.append({
+            'type': _mime_type(thumbnail),
+            'width': thumbnail.width,
+            'height': thumbnail.height,
+            'url': thumbnail.url,
+            'bytes': size,
+            'saving': round(1 - size / base_bytes, 3) if base_bytes else 0.0,
+        })
+
+    sources = []
+    for mime_type in dict.fromkeys(
+        variant['type'] for variant in variants[1:]
+    ):
+        if mime_type == base_type:
+            continue
+        sources.append({
+            'type': mime_type,
+            'srcset': _srcset(
+                variant for variant in variants if variant['type'] == mime_type
+            ),
+        })
+    return {
+        'srcset': _srcset(
+            variant for variant in variants if variant['type'] == base_type
+        ),
+        'sources': sources,
+        'variants': variants[1:],
+    }
@@ -0,0 +1,38 @@
+"""Общие файлы картинок постов.
+
+Хранилище кладёт одинаковые картинки в один файл, поэтому файл нельзя
+удалять вместе с постом: на него могут ссылаться другие посты. Ссылки
+ищутся по индексу post_image_idx, а загрузки, пост которых ещё не
+закоммичен, видны по заявкам хранилища (core.models.FileClaim).
+"""
+import logging
+
+from django.core.exceptions import SuspiciousFileOperation
+from sorl.thumbnail import delete
+
+from core.storage import locked_file
+
+from .models import Post
+from .thumbnails import source_file
+
+logger = logging.getLogger(__name__)
+
+
+def release_image(name):
+    """Удаляет файл и его миниатюры, если на него не ссылается ни один пост.
+
+    Вызывается после коммита удаления или замены картинки.
+    """
+    if not name:
+        return False
+    with locked_file(name) as claims:
+        if claims or Post.objects.filter(image=name).exists():
+            return False
+        try:
+            delete(source_file(name))
+        except (OSError, SuspiciousFileOperation):
+            # Пост уже удалён или сохранён, а осиротевший файл не повод
+            # превращать это в ошибку
+            logger.exception('Не удалось удалить картинку %s', name)
+            return False
+    return True
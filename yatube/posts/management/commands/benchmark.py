@@ -0,0 +1,143 @@
+import json
+import tempfile
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from posts.benchmark import (PERCENTILES, compare_with_baseline,
+                             run_benchmark, seed_dataset, summarize)
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный прогон адресов posts: на синтетических данных. '
+        'Данные заводятся во временной тестовой базе, рабочая база '
+        'не затрагивается. Печатает p50/p95/p99, запросы к базе на ответ '
+        'и пропускную способность; с --baseline сравнивает с прошлым '
+        'отчётом и завершается ошибкой при регрессии.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--groups', type=int, default=5)
+        parser.add_argument('--posts', type=int, default=1000)
+        parser.add_argument('--comments-per-post', type=int, default=2)
+        parser.add_argument('--follows-per-user', type=int, default=10)
+        parser.add_argument(
+            '--image-share', type=float, default=0.2,
+            help='Доля постов с картинкой.'
+        )
+        parser.add_argument(
+            '--requests', type=int, default=500,
+            help='Сколько запросов сделать всего.'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=8,
+            help='Число параллельных клиентов.'
+        )
+        parser.add_argument(
+            '--cache', choices=('warm', 'cold'), default='warm',
+            help='cold — чистить кеш перед каждым запросом.'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--baseline', help='Отчёт прошлого прогона для сравнения.'
+        )
+        parser.add_argument(
+            '--save-baseline', help='Куда сохранить отчёт этого прогона.'
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Допустимый рост p95 относительно --baseline.'
+        )
+        parser.add_argument(
+            '--json', action='store_true',
+            help='Вывести отчёт в JSON вместо таблицы.'
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError(
+                '--requests и --concurrency должны быть положительными'
+            )
+        baseline = self._load_baseline(options['baseline'])
+
+        # Картинки синтетических постов тоже не должны попасть в MEDIA_ROOT,
+        # а число запросов к базе считается при любом QUERY_STATS
+        media_root = tempfile.TemporaryDirectory()
+        media = override_settings(
+            MEDIA_ROOT=media_root.name, QUERY_STATS=True
+        )
+        media.enable()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            cache.clear()
+            seed_dataset(
+                users=options['users'],
+                groups=options['groups'],
+                posts=options['posts'],
+                comments_per_post=options['comments_per_post'],
+                follows_per_user=options['follows_per_user'],
+                image_share=options['image_share'],
+                seed=options['seed'],
+            )
+            samples, elapsed = run_benchmark(
+                requests=options['requests'],
+                concurrency=options['concurrency'],
+                cold_cache=options['cache'] == 'cold',
+                seed=options['seed'],
+            )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            cache.clear()
+            media.disable()
+            media_root.cleanup()
+
+        report = summarize(samples, elapsed)
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2, ensure_ascii=False))
+        else:
+            self._print_table(report)
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w') as output:
+                json.dump(report, output, indent=2, ensure_ascii=False)
+        if baseline is not None:
+            regressions = compare_with_baseline(
+                report, baseline, options['tolerance']
+            )
+            if regressions:
+                raise CommandError(
+                    'Регрессия относительно базового прогона:\n'
+                    + '\n'.join(regressions)
+                )
+            self.stderr.write(self.style.SUCCESS('Регрессий нет'))
+
+    def _load_baseline(self, path):
+        if not path:
+            return None
+        try:
+            with open(path) as baseline:
+                return json.load(baseline)
+        except (OSError, ValueError) as error:
+            raise CommandError(f'Не прочитать {path}: {error}')
+
+    def _print_table(self, report):
+        columns = [f'p{percent}_ms' for percent in PERCENTILES] + [
+            'queries', 'max_queries', 'rps', 'requests', 'errors'
+        ]
+        rows = list(report['scenarios'].items())
+        rows.append(('всего', report['total']))
+        width = max(len(name) for name, _ in rows)
+        self.stdout.write(
+            'сценарий'.ljust(width)
+            + ''.join(column.rjust(12) for column in columns)
+        )
+        for name, summary in rows:
+            self.stdout.write(
+                name.ljust(width)
+                + ''.join(str(summary[column]).rjust(12) for column in columns)
+            )
@@ -0,0 +1,105 @@
+import re
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from posts.models import Post
+from posts.paginators import DEFAULT_ORDERING, CursorPaginator
+from posts.timeline import (
+    TIMELINE_ORDERING, heavy_posts_since, timeline_queryset,
+)
+from posts.views import POSTS_ON_PAGE, post_comments, profile_authors
+
+User = get_user_model()
+
+# Значения подставляются только в план запроса, поэтому объекты
+# в базе существовать не обязаны
+SAMPLE_ID = 1
+SAMPLE_DATE = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+SQLITE_BAD_PLAN = (
+    re.compile(r'\bSCAN (TABLE )?\w+$'),
+    re.compile(r'TEMP B-TREE'),
+)
+POSTGRESQL_BAD_PLAN = (
+    re.compile(r'\bSeq Scan\b'),
+    re.compile(r'^(->\s*)?Sort\b'),
+)
+
+
+def _cursor_page(queryset, ordering=DEFAULT_ORDERING):
+    paginator = CursorPaginator(queryset, POSTS_ON_PAGE, ordering)
+    return paginator.forward_queryset(SAMPLE_DATE, SAMPLE_ID)
+
+
+def feed_querysets():
+    """Запросы, которые выполняют представления posts/views.py.
+
+    Запросы собираются теми же функциями, что и в представлениях.
+    Для ленты подписок проверяется и выборка, которой в неё
+    докладываются посты тяжёлых авторов.
+    """
+    user = User(pk=SAMPLE_ID)
+    posts = Post.objects.select_related('author', 'group')
+    by_group = posts.filter(group_id=SAMPLE_ID)
+    by_author = posts.filter(author_id=SAMPLE_ID)
+    feed = timeline_queryset(user).select_related('author', 'group')
+    heavy_posts = heavy_posts_since([SAMPLE_ID, SAMPLE_ID + 1], SAMPLE_DATE)
+    return {
+        'index': posts[:POSTS_ON_PAGE],
+        'index (cursor)': _cursor_page(posts),
+        'group_posts': by_group[:POSTS_ON_PAGE],
+        'group_posts (cursor)': _cursor_page(by_group),
+        'profile': by_author[:POSTS_ON_PAGE],
+        'profile (cursor)': _cursor_page(by_author),
+        'profile author': profile_authors(user).filter(username='sample'),
+        'post_detail comments': (
+            post_comments(Post(pk=SAMPLE_ID))
+            .filter(pk__gt=SAMPLE_ID)[:settings.COMMENTS_ON_PAGE + 1]
+        ),
+        'follow_index': feed[:POSTS_ON_PAGE],
+        'follow_index (cursor)': _cursor_page(feed, TIMELINE_ORDERING),
+        'follow_index heavy authors pull': heavy_posts,
+    }
+
+
+def bad_plan_lines(plan, vendor):
+    patterns = {
+        'sqlite': SQLITE_BAD_PLAN,
+        'postgresql': POSTGRESQL_BAD_PLAN,
+    }.get(vendor)
+    if patterns is None:
+        raise CommandError(f'EXPLAIN для {vendor} не поддерживается')
+    return [
+        line.strip()
+        for line in plan.splitlines()
+        if any(pattern.search(line.strip()) for pattern in patterns)
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет EXPLAIN для запросов лент и падает, если какой-то из них '
+        'читает таблицу целиком или сортирует во временном B-дереве.'
+    )
+
+    def handle(self, *args, **options):
+        failed = []
+        for name, queryset in feed_querysets().items():
+            plan = queryset.explain()
+            bad_lines = bad_plan_lines(plan, connection.vendor)
+            status = 'FAIL' if bad_lines else 'OK'
+            self.stdout.write(f'{status} {name}')
+            if options['verbosity'] > 1 or bad_lines:
+                for line in plan.splitlines():
+                    self.stdout.write(f'    {line}')
+            if bad_lines:
+                failed.append(name)
+        if failed:
+            raise CommandError(
+                'Запросы без подходящего индекса: ' + ', '.join(failed)
+            )
+        self.stdout.write(self.style.SUCCESS('Все ленты читаются по индексу'))
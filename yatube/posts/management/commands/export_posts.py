@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.exporting import (DEFAULT_BATCH_SIZE, FORMATS, LINE_WRITERS,
+                             export_rows)
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает посты с авторами, группами и комментариями в JSON Lines '
+        'или CSV. Память не растёт с размером базы: посты читаются пачками.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format', choices=FORMATS, default='jsonl',
+            help='Формат выгрузки.'
+        )
+        parser.add_argument(
+            '--output', default='-',
+            help='Файл для выгрузки; «-» — stdout.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help='Сколько постов читать из базы за раз.'
+        )
+        parser.add_argument('--author', help='Только посты этого автора.')
+        parser.add_argument('--group', help='Только посты группы с этим slug.')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.all()
+        if options['author']:
+            posts = posts.filter(author__username=options['author'])
+        if options['group']:
+            posts = posts.filter(group__slug=options['group'])
+
+        self.exported = 0
+        started = time.monotonic()
+        lines = LINE_WRITERS[options['format']](
+            self._counted(export_rows(posts, options['batch_size']))
+        )
+        if options['output'] == '-':
+            for line in lines:
+                self.stdout.write(line, ending='')
+        else:
+            with open(
+                options['output'], 'w', newline='', encoding='utf-8'
+            ) as output:
+                output.writelines(lines)
+        self.stderr.write(self.style.SUCCESS(
+            f'Выгружено постов: {self.exported} '
+            f'за {time.monotonic() - started:.1f} с'
+        ))
+
+    def _counted(self, rows):
+        for row in rows:
+            self.exported += 1
+            yield row
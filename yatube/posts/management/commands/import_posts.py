@@ -0,0 +1,426 @@
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.storage import claim_file, content_hash, hashed_name, settle_file
+from posts import counters, feed_cache, search, timeline
+from posts.models import Comment, Group, Post
+
+User = get_user_model()
+
+DEFAULT_BATCH_SIZE = 1000
+FORMATS = ('jsonl', 'csv')
+IMAGE_UPLOAD_TO = Post._meta.get_field('image').upload_to
+# Ошибки одной картинки: пост импортируется без неё, пачка продолжается.
+# ValueError — например, нулевой байт в пути, SuspiciousFileOperation —
+# имя, которое хранилище отказалось принять
+IMAGE_ERRORS = (OSError, ValueError, SuspiciousFileOperation)
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_rows(stream, file_format):
+    """Построчно читает вход, не загружая файл в память целиком."""
+    if file_format == 'csv':
+        yield from enumerate(csv.DictReader(stream), start=2)
+        return
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            row = RowError(f'битый JSON: {error}')
+        yield line_number, row
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def parse_date(value):
+    if not value:
+        return None
+    date = parse_datetime(value)
+    if date is None:
+        raise RowError(f'не разобрать дату {value!r}')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+def assign_pks(model, objects):
+    """Выдаёт id заранее, если база не возвращает их из bulk_create.
+
+    Без RETURNING id новых строк неизвестны, а они нужны комментариям,
+    лентам и индексу. Импорт — обслуживающая операция, параллельных
+    вставок во время него не ожидается.
+    """
+    if connection.features.can_return_ids_from_bulk_insert:
+        return
+    next_pk = (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+    for offset, obj in enumerate(objects):
+        obj.pk = next_pk + offset
+
+
+def restore_dates(model, objects, field):
+    """Возвращает даты из файла, перезаписанные auto_now_add при вставке."""
+    dated = [obj for obj in objects if obj.imported_date is not None]
+    for obj in dated:
+        setattr(obj, field, obj.imported_date)
+    if dated:
+        model.objects.bulk_update(dated, [field])
+
+
+def image_name(path):
+    """Имя картинки в хранилище — хеш её содержимого."""
+    with open(path, 'rb') as source:
+        digest = content_hash(File(source))
+    return hashed_name(IMAGE_UPLOAD_TO + os.path.basename(path), digest)
+
+
+def copy_image(path, name):
+    with open(path, 'rb') as source:
+        default_storage.write(name, File(source))
+    return name
+
+
+class Command(BaseCommand):
+    help = (
+        'Импортирует посты с комментариями из JSON Lines или CSV пачками '
+        'через bulk_create. Поля строки: author, text, group, pub_date, '
+        'image и comments — список объектов с author, text и created '
+        '(в CSV — JSON-строкой).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл с постами; «-» — читать из stdin.'
+        )
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='Формат входа; по умолчанию — по расширению файла.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help='Сколько постов вставлять за одну транзакцию.'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Число потоков для копирования картинок.'
+        )
+        parser.add_argument(
+            '--images-dir',
+            help='Каталог, от которого считаются пути картинок; '
+                 'по умолчанию — каталог входного файла.'
+        )
+        parser.add_argument(
+            '--create-missing', action='store_true',
+            help='Заводить неизвестных авторов и группы вместо пропуска строк.'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or (
+            'csv' if path.lower().endswith('.csv') else 'jsonl'
+        )
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным')
+        self.images_dir = options['images_dir'] or (
+            os.path.dirname(os.path.abspath(path)) if path != '-'
+            else os.getcwd()
+        )
+        self.create_missing = options['create_missing']
+        self.authors = {}
+        self.groups = {}
+        self.touched_authors = set()
+        self.touched_groups = set()
+        imported = comments = failed = 0
+        started = time.monotonic()
+
+        if path == '-':
+            stream = sys.stdin
+        else:
+            try:
+                stream = open(path, newline='', encoding='utf-8')
+            except OSError as error:
+                raise CommandError(f'Не открыть {path}: {error}')
+        try:
+            with ThreadPoolExecutor(
+                max_workers=max(options['workers'], 1),
+                thread_name_prefix='import-images',
+            ) as pool:
+                rows = read_rows(stream, file_format)
+                for batch in batched(rows, options['batch_size']):
+                    posts, batch_comments, errors = self._import_batch(
+                        batch, pool
+                    )
+                    imported += posts
+                    comments += batch_comments
+                    failed += errors
+                    elapsed = time.monotonic() - started
+                    self.stdout.write(
+                        f'строка {batch[-1][0]}: постов {imported}, '
+                        f'комментариев {comments}, ошибок {failed}, '
+                        f'{imported / elapsed if elapsed else 0:.0f} постов/с'
+                    )
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        self._bump_feeds()
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: постов {imported}, комментариев {comments}, '
+            f'ошибок {failed} за {elapsed:.1f} с '
+            f'({imported / elapsed if elapsed else 0:.0f} постов/с). '
+            'Миниатюры создаст manage.py warm_thumbnails.'
+        ))
+
+    def _import_batch(self, batch, pool):
+        parsed = []
+        errors = 0
+        self._resolve(
+            authors={
+                name
+                for _, row in batch if isinstance(row, dict)
+                for name in self._row_authors(row)
+                if isinstance(name, str) and name
+            },
+            groups={
+                row.get('group') for _, row in batch
+                if isinstance(row, dict) and isinstance(row.get('group'), str)
+            },
+        )
+        for line_number, row in batch:
+            try:
+                parsed.append((line_number, self._parse(row)))
+            except RowError as error:
+                errors += 1
+                self.stderr.write(f'Строка {line_number}: {error}')
+
+        # Заявки на картинки заводятся и снимаются в одной транзакции
+        # с постами: откат пачки откатывает и их
+        with transaction.atomic():
+            images, image_errors = self._copy_images(parsed, pool)
+            errors += image_errors
+            posts = []
+            comments = []
+            for line_number, item in parsed:
+                post = item['post']
+                if line_number in images:
+                    post.image = images[line_number]
+                posts.append(post)
+                comments.append(item['comments'])
+
+            if posts:
+                self._write(posts, comments)
+        return len(posts), sum(map(len, comments)), errors
+
+    def _copy_images(self, parsed, pool):
+        """Копирует картинки пачки в хранилище в потоках пула.
+
+        Потоки не ходят в базу: сначала они считают хеши, затем основной
+        поток заводит заявки на имена, и только потом потоки пишут файлы.
+        Заявки держатся открытой транзакцией пачки до записи постов.
+        """
+        errors = 0
+        names = {}
+        hashing = {
+            line_number: pool.submit(image_name, item['image'])
+            for line_number, item in parsed if item['image']
+        }
+        for line_number, future in hashing.items():
+            try:
+                names[line_number] = future.result()
+            except IMAGE_ERRORS as error:
+                errors += 1
+                self._image_error(line_number, error)
+        for name in names.values():
+            claim_file(name)
+        paths = {line_number: item['image'] for line_number, item in parsed}
+        copying = {
+            line_number: pool.submit(copy_image, paths[line_number], name)
+            for line_number, name in names.items()
+        }
+        images = {}
+        for line_number, future in copying.items():
+            try:
+                images[line_number] = future.result()
+            except IMAGE_ERRORS as error:
+                errors += 1
+                settle_file(names[line_number])
+                self._image_error(line_number, error)
+        return images, errors
+
+    def _image_error(self, line_number, error):
+        self.stderr.write(
+            f'Строка {line_number}: картинка не скопирована: {error}'
+        )
+
+    def _row_authors(self, row):
+        yield row.get('author')
+        comments = row.get('comments')
+        if isinstance(comments, list):
+            for comment in comments:
+                if isinstance(comment, dict):
+                    yield comment.get('author')
+
+    def _resolve(self, authors, groups):
+        """Дополняет карты имя -> id одним запросом на пачку."""
+        authors = authors - set(self.authors)
+        groups = groups - {''} - set(self.groups)
+        if authors:
+            self.authors.update(
+                User.objects
+                .filter(username__in=authors)
+                .values_list('username', 'pk')
+            )
+        if groups:
+            self.groups.update(
+                Group.objects.filter(slug__in=groups).values_list('slug', 'pk')
+            )
+        if not self.create_missing:
+            return
+        missing_authors = authors - set(self.authors)
+        missing_groups = groups - set(self.groups)
+        if missing_authors:
+            users = [User(username=name) for name in missing_authors]
+            for user in users:
+                user.set_unusable_password()
+            User.objects.bulk_create(users, ignore_conflicts=True)
+            self.authors.update(
+                User.objects
+                .filter(username__in=missing_authors)
+                .values_list('username', 'pk')
+            )
+        if missing_groups:
+            Group.objects.bulk_create(
+                [
+                    Group(slug=slug, title=slug, description='')
+                    for slug in missing_groups
+                ],
+                ignore_conflicts=True,
+            )
+            self.groups.update(
+                Group.objects
+                .filter(slug__in=missing_groups)
+                .values_list('slug', 'pk')
+            )
+
+    def _author_id(self, username):
+        if not isinstance(username, str) or not username:
+            raise RowError('не указан автор')
+        if username not in self.authors:
+            raise RowError(f'нет пользователя {username!r}')
+        return self.authors[username]
+
+    def _parse(self, row):
+        if isinstance(row, RowError):
+            raise row
+        if not isinstance(row, dict):
+            raise RowError('ожидается объект')
+        text = row.get('text')
+        if not text:
+            raise RowError('пустой текст')
+        group_id = None
+        if row.get('group'):
+            if not isinstance(row['group'], str):
+                raise RowError('group должен быть строкой')
+            if row['group'] not in self.groups:
+                raise RowError(f'нет группы {row["group"]!r}')
+            group_id = self.groups[row['group']]
+        post = Post(
+            text=text,
+            author_id=self._author_id(row.get('author')),
+            group_id=group_id,
+        )
+        post.imported_date = parse_date(row.get('pub_date'))
+        comments = self._parse_comments(row.get('comments') or [])
+        image = row.get('image')
+        if image:
+            if not isinstance(image, str):
+                raise RowError('image должен быть путём к файлу')
+            image = os.path.join(self.images_dir, image)
+        return {'post': post, 'comments': comments, 'image': image}
+
+    def _parse_comments(self, comments):
+        if isinstance(comments, str):
+            # В CSV комментарии приходят JSON-строкой, как их выгружает
+            # export_posts
+            try:
+                comments = json.loads(comments)
+            except ValueError as error:
+                raise RowError(f'битый JSON в comments: {error}')
+        if not isinstance(comments, list):
+            raise RowError('comments должен быть списком')
+        parsed = []
+        for comment in comments:
+            if not isinstance(comment, dict) or not comment.get('text'):
+                raise RowError('у комментария нет текста')
+            parsed_comment = Comment(
+                author_id=self._author_id(comment.get('author')),
+                text=comment['text'],
+            )
+            parsed_comment.imported_date = parse_date(comment.get('created'))
+            parsed.append(parsed_comment)
+        return parsed
+
+    def _write(self, posts, comments):
+        with transaction.atomic():
+            assign_pks(Post, posts)
+            Post.objects.bulk_create(posts)
+            restore_dates(Post, posts, 'pub_date')
+            new_comments = []
+            for post, post_comments in zip(posts, comments):
+                for comment in post_comments:
+                    comment.post_id = post.pk
+                    new_comments.append(comment)
+            assign_pks(Comment, new_comments)
+            Comment.objects.bulk_create(new_comments)
+            restore_dates(Comment, new_comments, 'created')
+
+            # bulk_create не шлёт сигналы: счётчики, ленты подписок
+            # и поисковый индекс обновляем здесь же
+            counters.posts_added(posts)
+            timeline.fan_out_posts(posts)
+            search.index_posts((post.pk, post.text) for post in posts)
+            # Посты уже ссылаются на скопированные картинки: заявки
+            # хранилища закрываются в той же транзакции
+            for post in posts:
+                if post.image:
+                    settle_file(post.image.name)
+        for post in posts:
+            self.touched_authors.add(post.author_id)
+            if post.group_id is not None:
+                self.touched_groups.add(post.group_id)
+
+    def _bump_feeds(self):
+        if not self.touched_authors:
+            return
+        feed_cache.bump_feed(feed_cache.GLOBAL)
+        for author_id in self.touched_authors:
+            feed_cache.bump_feed(feed_cache.AUTHOR, author_id)
+        for group_id in self.touched_groups:
+            feed_cache.bump_feed(feed_cache.GROUP, group_id)
@@ -0,0 +1,156 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts import feed_cache
+from posts.models import Post
+from posts.thumbnails import (render_thumbnails, save_thumbnails,
+                              thumbnails_current)
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_CHECKPOINT = os.path.join(
+    settings.BASE_DIR, '.warm_thumbnails.checkpoint'
+)
+
+
+def _init_worker():
+    django.setup()
+    # Соединения родителя в дочернем процессе использовать нельзя
+    connections.close_all()
+
+
+def read_checkpoint(path):
+    try:
+        with open(path) as checkpoint:
+            return int(checkpoint.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def write_checkpoint(path, last_pk):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as checkpoint:
+        checkpoint.write(str(last_pk))
+    os.replace(tmp_path, path)
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт миниатюры картинок всех постов в пуле процессов. '
+        'Прогресс сохраняется в файл, прерванный прогон продолжается с места '
+        'остановки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help='Сколько постов читать из базы за раз.'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Число процессов; 0 — считать в текущем процессе.'
+        )
+        parser.add_argument(
+            '--checkpoint', default=DEFAULT_CHECKPOINT,
+            help='Файл с id последнего обработанного поста.'
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать с первого поста, игнорируя сохранённый прогресс.'
+        )
+
+    def handle(self, *args, **options):
+        checkpoint = options['checkpoint']
+        last_pk = 0 if options['restart'] else read_checkpoint(checkpoint)
+        if last_pk:
+            self.stdout.write(f'Продолжаем после поста {last_pk}')
+
+        pool = None
+        if options['workers'] > 0:
+            connections.close_all()
+            pool = ProcessPoolExecutor(
+                max_workers=options['workers'], initializer=_init_worker
+            )
+        rendered = skipped = failed = 0
+        started = time.monotonic()
+        try:
+            while True:
+                batch = list(
+                    Post.objects
+                    .filter(pk__gt=last_pk)
+                    .exclude(image='')
+                    .order_by('pk')
+                    .only('pk', 'image', 'thumbnails', 'author_id', 'group_id')
+                    [:options['batch_size']]
+                )
+                if not batch:
+                    break
+                done, missed, errors = self._warm_batch(batch, pool)
+                rendered += done
+                skipped += missed
+                failed += errors
+                last_pk = batch[-1].pk
+                write_checkpoint(checkpoint, last_pk)
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f'до поста {last_pk}: создано {rendered}, '
+                    f'пропущено {skipped}, ошибок {failed}, '
+                    f'{rendered / elapsed if elapsed else 0:.1f} картинок/с'
+                )
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: создано {rendered}, пропущено {skipped}, '
+            f'ошибок {failed} за {time.monotonic() - started:.1f} с'
+        ))
+
+    def _warm_batch(self, batch, pool):
+        pending = []
+        skipped = 0
+        for post in batch:
+            if thumbnails_current(post):
+                skipped += 1
+                continue
+            # Миниатюры, уже лежащие в KV-хранилище sorl, get_thumbnail
+            # отдаёт без пересчёта: такой пост обходится дёшево
+            pending.append(post)
+
+        rendered = failed = 0
+        saved = []
+        for post, thumbnails, error in self._render(pending, pool):
+            if error is not None:
+                failed += 1
+                self.stderr.write(f'Пост {post.pk}: {error}')
+                continue
+            if save_thumbnails(post, thumbnails, bump=False):
+                saved.append(post)
+            rendered += 1
+        feed_cache.bump_many_post_feeds(saved)
+        return rendered, skipped, failed
+
+    def _render(self, posts, pool):
+        if pool is None:
+            for post in posts:
+                try:
+                    yield post, render_thumbnails(post.image.name), None
+                except Exception as error:
+                    yield post, None, error
+            return
+        futures = {
+            pool.submit(render_thumbnails, post.image.name): post
+            for post in posts
+        }
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except Exception as error:
+                yield futures[future], None, error
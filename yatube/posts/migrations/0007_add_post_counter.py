@@ -0,0 +1,65 @@
+# Generated by Django 2.2.16 on 2026-10-18 01:15
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_post_counters(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    PostCounter = apps.get_model('posts', 'PostCounter')
+    counters = [
+        PostCounter(scope='all', object_id=0, count=Post.objects.count())
+    ]
+    for scope, field in (('author', 'author'), ('group', 'group')):
+        rows = (
+            Post.objects
+            .filter(**{f'{field}__isnull': False})
+            .values(field)
+            .annotate(total=Count('pk'))
+            .order_by()
+        )
+        counters.extend(
+            PostCounter(scope=scope, object_id=row[field], count=row['total'])
+            for row in rows
+        )
+    PostCounter.objects.bulk_create(counters)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_add_follow'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostCounter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('all', 'Все посты'), ('author', 'Посты автора'), ('group', 'Посты группы')], max_length=10, verbose_name='Область подсчёта')),
+                ('object_id', models.PositiveIntegerField(default=0, verbose_name='ID автора или группы')),
+                ('count', models.IntegerField(default=0, verbose_name='Количество постов')),
+            ],
+            options={
+                'verbose_name': 'Счётчик постов',
+                'verbose_name_plural': 'Счётчики постов',
+            },
+        ),
+        migrations.AlterModelOptions(
+            name='comment',
+            options={'verbose_name': 'Комментарий', 'verbose_name_plural': 'Комментарии'},
+        ),
+        migrations.AlterModelOptions(
+            name='group',
+            options={'verbose_name': 'Группа', 'verbose_name_plural': 'Группы'},
+        ),
+        migrations.AlterModelOptions(
+            name='post',
+            options={'ordering': ['-pub_date'], 'verbose_name': 'Пост', 'verbose_name_plural': 'Посты'},
+        ),
+        migrations.AddConstraint(
+            model_name='postcounter',
+            constraint=models.UniqueConstraint(fields=('scope', 'object_id'), name='unique_post_counter'),
+        ),
+        migrations.RunPython(fill_post_counters, migrations.RunPython.noop),
+    ]
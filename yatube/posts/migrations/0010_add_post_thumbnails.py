@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 01:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_add_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='thumbnails',
+            field=models.TextField(blank=True, default='', editable=False, help_text='JSON: имя геометрии -> url, width, height', verbose_name='Миниатюры'),
+        ),
+    ]
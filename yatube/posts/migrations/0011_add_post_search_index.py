@@ -0,0 +1,82 @@
+from django.db import migrations
+
+# Схема и заполнение индекса зафиксированы здесь, а не импортируются
+# из posts.search: миграция не должна меняться вместе с кодом приложения.
+# Стеммер — чистая функция без моделей; если он поменяется, индекс
+# всё равно пересобирают manage.py rebuild_search_index
+from posts.stemming import stem_text
+
+SEARCH_TABLE = 'posts_post_search'
+BATCH_SIZE = 1000
+
+SQLITE_SCHEMA = (
+    f'CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} '
+    f"USING fts5(body, tokenize = 'unicode61 remove_diacritics 2')",
+)
+POSTGRES_SCHEMA = (
+    f'CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ('
+    '  post_id integer PRIMARY KEY '
+    '    REFERENCES posts_post (id) ON DELETE CASCADE '
+    '    DEFERRABLE INITIALLY DEFERRED,'
+    '  document tsvector NOT NULL'
+    ')',
+    f'CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document_idx '
+    f'ON {SEARCH_TABLE} USING gin (document)',
+)
+POSTGRES_FILL = (
+    f'INSERT INTO {SEARCH_TABLE} (post_id, document) '
+    "SELECT id, to_tsvector('russian', text) FROM posts_post "
+    'ON CONFLICT (post_id) DO NOTHING'
+)
+SQLITE_INSERT = (
+    f'INSERT OR REPLACE INTO {SEARCH_TABLE} (rowid, body) VALUES (%s, %s)'
+)
+
+
+def _fill_sqlite(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    posts = Post.objects.using(schema_editor.connection.alias)
+    last_pk = 0
+    with schema_editor.connection.cursor() as cursor:
+        while True:
+            batch = list(
+                posts
+                .filter(pk__gt=last_pk)
+                .order_by('pk')
+                .values_list('pk', 'text')[:BATCH_SIZE]
+            )
+            if not batch:
+                return
+            cursor.executemany(
+                SQLITE_INSERT,
+                [(post_id, stem_text(text)) for post_id, text in batch],
+            )
+            last_pk = batch[-1][0]
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for statement in SQLITE_SCHEMA:
+            schema_editor.execute(statement)
+        _fill_sqlite(apps, schema_editor)
+    elif vendor == 'postgresql':
+        for statement in POSTGRES_SCHEMA:
+            schema_editor.execute(statement)
+        schema_editor.execute(POSTGRES_FILL)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_add_post_thumbnails'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
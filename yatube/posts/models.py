@@ -1,5 +1,8 @@
+import json
+
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
+from django.utils.functional import cached_property
 
 User = get_user_model()
 FIRST_POST_CHARS = 15
@@ -27,15 +30,51 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    thumbnails = models.TextField(
+        'Миниатюры',
+        blank=True,
+        default='',
+        editable=False,
+        help_text='JSON: имя геометрии -> url, width, height'
+    )
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx'
+            ),
+            # Картинки общие у постов с одинаковым содержимым: по индексу
+            # проверяется, остались ли ссылки на файл
+            models.Index(fields=['image'], name='post_image_idx'),
+        ]
 
     def __str__(self):
         return self.text[:FIRST_POST_CHARS]
 
+    def save(self, *args, **kwargs):
+        # Заявка хранилища на новую картинку заводится и снимается
+        # в одной транзакции с постом: откат не оставит её открытой
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    @cached_property
+    def thumbnail_data(self):
+        if not self.thumbnails:
+            return {}
+        return json.loads(self.thumbnails)
+
 
 class Group(models.Model):
     title = models.CharField(max_length=200)
@@ -67,6 +106,7 @@ class Comment(models.Model):
     created = models.DateTimeField(auto_now_add=True)
 
     class Meta:
+        ordering = ['created']
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
 
@@ -100,3 +140,73 @@ class Follow(models.Model):
                 name='selffollow'
             )
         ]
+
+
+class PostCounter(models.Model):
+    SCOPE_ALL = 'all'
+    SCOPE_AUTHOR = 'author'
+    SCOPE_GROUP = 'group'
+    SCOPE_CHOICES = (
+        (SCOPE_ALL, 'Все посты'),
+        (SCOPE_AUTHOR, 'Посты автора'),
+        (SCOPE_GROUP, 'Посты группы'),
+    )
+
+    scope = models.CharField(
+        max_length=10,
+        choices=SCOPE_CHOICES,
+        verbose_name='Область подсчёта',
+    )
+    object_id = models.PositiveIntegerField(
+        default=0,
+        verbose_name='ID автора или группы',
+    )
+    count = models.IntegerField(default=0, verbose_name='Количество постов')
+
+    class Meta:
+        verbose_name = 'Счётчик постов'
+        verbose_name_plural = 'Счётчики постов'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['scope', 'object_id'],
+                name='unique_post_counter'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.scope}:{self.object_id} = {self.count}'
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        to=User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик',
+    )
+    post = models.ForeignKey(
+        to=Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации поста')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_idx'
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user_id} <- {self.post_id}'
@@ -0,0 +1,232 @@
+import base64
+import binascii
+import json
+from functools import partial
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+CURSOR_PARAM = 'cursor'
+DEFAULT_ORDERING = ('pub_date', 'pk')
+FORWARD = 'n'
+BACKWARD = 'p'
+
+
+def encode_cursor(post, direction, ordering=DEFAULT_ORDERING):
+    """Упаковывает позицию поста в непрозрачный токен для ?cursor=."""
+    date_field, pk_field = ordering
+    raw = json.dumps(
+        [
+            direction,
+            getattr(post, date_field).isoformat(),
+            getattr(post, pk_field),
+        ],
+        separators=(',', ':'),
+    )
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Возвращает (direction, pub_date, pk) или None для битого токена."""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        direction, pub_date, pk = json.loads(
+            base64.urlsafe_b64decode(padded.encode())
+        )
+        pub_date = parse_datetime(pub_date)
+    except (ValueError, TypeError, binascii.Error):
+        return None
+    if direction not in (FORWARD, BACKWARD) or pub_date is None:
+        return None
+    if not isinstance(pk, int):
+        return None
+    return direction, pub_date, pk
+
+
+class CursorPage:
+    """Страница ленты, полученная по ключу (pub_date, id) без OFFSET."""
+
+    is_cursor = True
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        # Входит в ключ {% cache %} ленты: страница определяется своими
+        # постами, а не курсором, по которому её открыли
+        return '<CursorPage %s>' % ','.join(
+            str(post.pk) for post in self.object_list
+        )
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Keyset-пагинация по убыванию пары (дата, id).
+
+    Каждая страница — один запрос с LIMIT per_page + 1 по индексу,
+    без COUNT(*) и OFFSET, поэтому глубина ленты не влияет на время.
+    ordering задаёт имена поля даты и поля id, например аннотации ленты.
+    """
+
+    def __init__(self, queryset, per_page, ordering=DEFAULT_ORDERING):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.date_field, self.pk_field = ordering
+
+    def _order_by(self, descending):
+        sign = '-' if descending else ''
+        return self.queryset.order_by(
+            sign + self.date_field, sign + self.pk_field
+        )
+
+    def _beyond(self, pub_date, pk, lookup):
+        same_date = Q(**{self.date_field: pub_date})
+        same_date &= Q(**{f'{self.pk_field}__{lookup}': pk})
+        return Q(**{f'{self.date_field}__{lookup}': pub_date}) | same_date
+
+    def get_page(self, token):
+        position = decode_cursor(token)
+        if position is None:
+            return self._first_page()
+        direction, pub_date, pk = position
+        if direction == FORWARD:
+            return self._page_after(pub_date, pk)
+        return self._page_before(pub_date, pk)
+
+    def forward_queryset(self, pub_date=None, pk=None):
+        """Запрос следующей страницы после позиции (pub_date, pk)."""
+        queryset = self._order_by(descending=True)
+        if pub_date is not None:
+            queryset = queryset.filter(self._beyond(pub_date, pk, 'lt'))
+        return queryset[:self.per_page + 1]
+
+    def _first_page(self):
+        rows = list(self.forward_queryset())
+        return self._build(rows, has_more=len(rows) > self.per_page,
+                           has_before=False)
+
+    def _page_after(self, pub_date, pk):
+        rows = list(self.forward_queryset(pub_date, pk))
+        return self._build(rows, has_more=len(rows) > self.per_page,
+                           has_before=True)
+
+    def _page_before(self, pub_date, pk):
+        rows = list(
+            self._order_by(descending=False)
+            .filter(self._beyond(pub_date, pk, 'gt'))[:self.per_page + 1]
+        )
+        has_before = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        rows.reverse()
+        return self._build(rows, has_more=True, has_before=has_before)
+
+    def _build(self, rows, has_more, has_before):
+        rows = rows[:self.per_page]
+        next_cursor = previous_cursor = None
+        ordering = (self.date_field, self.pk_field)
+        if rows and has_more:
+            next_cursor = encode_cursor(rows[-1], FORWARD, ordering)
+        if rows and has_before:
+            previous_cursor = encode_cursor(rows[0], BACKWARD, ordering)
+        return CursorPage(rows, next_cursor, previous_cursor)
+
+
+class CountedPaginator(Paginator):
+    """Paginator, который берёт количество объектов из счётчика.
+
+    Счётчик приблизительный, поэтому срез страницы не обрезается по count:
+    устаревшее значение влияет только на число страниц в навигации.
+
+    Начиная с CURSOR_FROM_PAGE у страницы есть next_cursor: ссылка
+    «Следующая» переводит ленту на курсоры, чтобы дальше не платить
+    за растущий OFFSET. Курсор считается лениво, при обращении из
+    шаблона, поэтому ссылки рендерятся внутри {% cache %} ленты:
+    при попадании в кеш запрос страницы не выполняется. ordering
+    нужен, чтобы закодировать курсор.
+    """
+
+    def __init__(self, object_list, per_page, count=None,
+                 ordering=DEFAULT_ORDERING, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self._known_count = count
+        self.ordering = ordering
+
+    @cached_property
+    def count(self):
+        if self._known_count is None:
+            return super().count
+        return self._known_count
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page
+        page = self._get_page(self.object_list[bottom:top], number, self)
+        page.next_cursor = partial(self._next_cursor, page)
+        return page
+
+    def _next_cursor(self, page):
+        if not page.has_next() or page.number < settings.CURSOR_FROM_PAGE:
+            return None
+        return encode_cursor(page[len(page) - 1], FORWARD, self.ordering)
+
+
+class LoadMorePage:
+    """Порция объектов по возрастанию id для кнопки «показать ещё».
+
+    Запрос выполняется лениво, при первом обращении к странице, поэтому
+    закешированный в шаблоне фрагмент не трогает базу.
+    """
+
+    def __init__(self, queryset, per_page, after=None):
+        if after is not None:
+            queryset = queryset.filter(pk__gt=after)
+        self.queryset = queryset
+        self.per_page = per_page
+        self.after = after
+
+    @cached_property
+    def _rows(self):
+        return list(self.queryset[:self.per_page + 1])
+
+    @property
+    def object_list(self):
+        return self._rows[:self.per_page]
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return len(self._rows) > self.per_page
+
+    def next_after(self):
+        if not self.has_next():
+            return None
+        return self.object_list[-1].pk
@@ -0,0 +1,218 @@
+"""Полнотекстовый поиск по постам через обратный индекс базы.
+
+На SQLite индекс — виртуальная таблица FTS5 с основами слов от
+стеммера Snowball, на PostgreSQL — столбец tsvector с GIN-индексом
+и русской конфигурацией. Индекс обновляют сигналы сохранения и удаления
+поста, после bulk_create его пересобирает rebuild_search_index.
+Схему индекса создаёт миграция 0011_add_post_search_index.
+"""
+import base64
+import binascii
+import json
+
+from django.db import connection
+from django.utils.functional import cached_property
+
+from .models import Post
+from .stemming import WORD, stem, stem_text
+
+SEARCH_TABLE = 'posts_post_search'
+SEARCH_CONFIG = 'russian'
+QUERY_PARAM = 'q'
+AFTER_PARAM = 'after'
+
+
+def supported():
+    return connection.vendor in ('sqlite', 'postgresql')
+
+
+def match_expression(query):
+    """Строка MATCH для FTS5: все основы слов запроса, с префиксом."""
+    stems = [stem(word) for word in WORD.findall(query)]
+    return ' '.join(f'"{word}"*' for word in stems if word)
+
+
+def index_post(post_id, text):
+    index_posts([(post_id, text)])
+
+
+def index_posts(rows):
+    """Индексирует пачку пар (id, текст) одним executemany."""
+    if connection.vendor == 'sqlite':
+        sql = (
+            f'INSERT OR REPLACE INTO {SEARCH_TABLE} (rowid, body) '
+            'VALUES (%s, %s)'
+        )
+        params = [(post_id, stem_text(text)) for post_id, text in rows]
+    elif connection.vendor == 'postgresql':
+        sql = (
+            f'INSERT INTO {SEARCH_TABLE} (post_id, document) '
+            'VALUES (%s, to_tsvector(%s, %s)) '
+            'ON CONFLICT (post_id) DO UPDATE SET document = EXCLUDED.document'
+        )
+        params = [(post_id, SEARCH_CONFIG, text) for post_id, text in rows]
+    else:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def unindex_post(post_id):
+    if connection.vendor == 'sqlite':
+        sql = f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s'
+    elif connection.vendor == 'postgresql':
+        sql = f'DELETE FROM {SEARCH_TABLE} WHERE post_id = %s'
+    else:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [post_id])
+
+
+def rebuild_index(batch_size=1000):
+    """Переиндексирует все посты, возвращает их количество."""
+    if not supported():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+    indexed = 0
+    last_pk = 0
+    while True:
+        batch = list(
+            Post.objects
+            .filter(pk__gt=last_pk)
+            .order_by('pk')
+            .values_list('pk', 'text')[:batch_size]
+        )
+        if not batch:
+            return indexed
+        index_posts(batch)
+        indexed += len(batch)
+        last_pk = batch[-1][0]
+
+
+def matching_ids_sql(query):
+    """Подзапрос (sql, params) с id подходящих постов или None.
+
+    None означает, что в запросе нет ни одного слова.
+    """
+    if connection.vendor == 'sqlite':
+        match = match_expression(query)
+        if not match:
+            return None
+        return (
+            f'SELECT rowid FROM {SEARCH_TABLE} '
+            f'WHERE {SEARCH_TABLE} MATCH %s',
+            [match],
+        )
+    return (
+        f'SELECT post_id FROM {SEARCH_TABLE} '
+        'WHERE document @@ plainto_tsquery(%s, %s)',
+        [SEARCH_CONFIG, query],
+    )
+
+
+def ranked_ids(query, limit, after=None):
+    """Пары (id, релевантность) по убыванию релевантности и id.
+
+    after — позиция (релевантность, id) последнего показанного поста:
+    следующая порция берётся по ключу, без OFFSET.
+    """
+    if not supported():
+        return []
+    if connection.vendor == 'sqlite':
+        match = match_expression(query)
+        if not match:
+            return []
+        id_column, score = 'rowid', '-rank'
+        sql = (
+            f'SELECT rowid, {score} FROM {SEARCH_TABLE} '
+            f'WHERE {SEARCH_TABLE} MATCH %s'
+        )
+        params = [match]
+    else:
+        id_column, score = 'post_id', 'ts_rank(document, query)'
+        sql = (
+            f'SELECT post_id, {score} '
+            f'FROM {SEARCH_TABLE}, plainto_tsquery(%s, %s) AS query '
+            'WHERE document @@ query'
+        )
+        params = [SEARCH_CONFIG, query]
+    if after is not None:
+        after_score, after_pk = after
+        sql += (
+            f' AND ({score} < %s OR ({score} = %s AND {id_column} < %s))'
+        )
+        params += [after_score, after_score, after_pk]
+    sql += ' ORDER BY 2 DESC, 1 DESC LIMIT %s'
+    params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def encode_position(score, pk):
+    raw = json.dumps([score, pk], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_position(token):
+    """Возвращает (релевантность, id) или None для битого токена."""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        score, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError, binascii.Error):
+        return None
+    if not isinstance(score, (int, float)) or not isinstance(pk, int):
+        return None
+    return float(score), pk
+
+
+class SearchPage:
+    """Порция результатов поиска для кнопки «показать ещё».
+
+    Как и LoadMorePage, выполняется лениво: два запроса — id из индекса
+    и сами посты с авторами и группами.
+    """
+
+    def __init__(self, query, per_page, after=None):
+        self.query = query
+        self.per_page = per_page
+        self.after = decode_position(after)
+
+    @cached_property
+    def _ranked(self):
+        if not self.query.strip():
+            return []
+        return ranked_ids(self.query, self.per_page + 1, self.after)
+
+    @cached_property
+    def object_list(self):
+        ranked = self._ranked[:self.per_page]
+        posts = (
+            Post.objects
+            .select_related('author', 'group')
+            .in_bulk([pk for pk, _ in ranked])
+        )
+        found = []
+        for pk, score in ranked:
+            if pk in posts:
+                posts[pk].search_rank = score
+                found.append(posts[pk])
+        return found
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return len(self._ranked) > self.per_page
+
+    def next_after(self):
+        if not self.has_next():
+            return None
+        pk, score = self._ranked[self.per_page - 1]
+        return encode_position(score, pk)
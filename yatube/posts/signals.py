@@ -0,0 +1,178 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.storage import settle_file
+
+from . import counters, feed_cache, graph, search, timeline
+from .images import release_image
+from .models import Comment, Follow, Group, Post, PostCounter, User
+from .thumbnails import schedule_thumbnails
+
+# Поля пользователя, которые видны в лентах
+AUTHOR_NAME_FIELDS = {'username', 'first_name', 'last_name'}
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_group(sender, instance, **kwargs):
+    instance._previous_group_id = None
+    instance._previous_image = ''
+    # Файл ещё не сохранён: хранилище заведёт на него заявку при записи
+    instance._image_uploaded = bool(
+        instance.image and not instance.image._committed
+    )
+    if instance.pk is None:
+        return
+    previous = (
+        Post.objects
+        .filter(pk=instance.pk)
+        .values_list('group_id', 'image')
+        .first()
+    )
+    if previous is None:
+        return
+    instance._previous_group_id, instance._previous_image = previous
+    # Миниатюры старой картинки к новой не подходят
+    if instance.image.name != instance._previous_image:
+        instance.thumbnails = ''
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.post_added(instance.author_id, instance.group_id)
+        timeline.fan_out_post(instance)
+        return
+    previous_group_id = getattr(instance, '_previous_group_id', None)
+    if previous_group_id == instance.group_id:
+        return
+    if previous_group_id is not None:
+        counters.change_post_count(
+            PostCounter.SCOPE_GROUP, previous_group_id, -1
+        )
+    if instance.group_id is not None:
+        counters.change_post_count(
+            PostCounter.SCOPE_GROUP, instance.group_id, 1
+        )
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.post_removed(instance.author_id, instance.group_id)
+
+
+@receiver(post_save, sender=Post)
+def invalidate_saved_post(sender, instance, raw=False, **kwargs):
+    if not raw:
+        feed_cache.bump_post_feeds(
+            instance, getattr(instance, '_previous_group_id', None)
+        )
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_deleted_post(sender, instance, **kwargs):
+    feed_cache.bump_post_feeds(instance)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_names(
+    sender, instance, raw=False, created=False, **kwargs
+):
+    # У новой группы ещё нет постов ни в одной ленте
+    if not raw and not created:
+        feed_cache.bump_names()
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_names(
+    sender, instance, created, raw=False, update_fields=None, **kwargs
+):
+    # Вход сохраняет только last_login: имена от этого не меняются
+    if created or raw or (
+        update_fields is not None
+        and not AUTHOR_NAME_FIELDS & set(update_fields)
+    ):
+        return
+    feed_cache.bump_names()
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_post_comments(sender, instance, raw=False, **kwargs):
+    if not raw:
+        feed_cache.bump_feed(feed_cache.POST, instance.post_id)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_feed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        feed_cache.bump_feed(feed_cache.FOLLOWER, instance.user_id)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_graph(sender, instance, raw=False, **kwargs):
+    if not raw:
+        graph.follow_changed(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Follow)
+def fill_follower_timeline(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.author_followed(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def clean_follower_timeline(sender, instance, **kwargs):
+    timeline.author_unfollowed(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+def index_saved_post(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_post(instance.pk, instance.text)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_deleted_post(sender, instance, **kwargs):
+    search.unindex_post(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def settle_uploaded_image(sender, instance, raw=False, **kwargs):
+    if raw or not getattr(instance, '_image_uploaded', False):
+        return
+    # Пост уже в таблице, а транзакцию Post.save держит строку заявки
+    # до коммита: если её откатят, откатится и заявка
+    settle_file(instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+def thumbnail_saved_image(sender, instance, raw=False, **kwargs):
+    # Миниатюры ставятся в очередь при любом сохранении новой картинки:
+    # из формы, админки или кода. Посты, загруженные без сигналов,
+    # догоняет manage.py warm_thumbnails
+    previous_image = getattr(instance, '_previous_image', '')
+    if raw or not instance.image or instance.thumbnails:
+        return
+    if instance.image.name != previous_image:
+        schedule_thumbnails(instance)
+
+
+@receiver(post_save, sender=Post)
+def release_replaced_image(sender, instance, raw=False, **kwargs):
+    previous_image = getattr(instance, '_previous_image', '')
+    if raw or not previous_image or previous_image == instance.image.name:
+        return
+    transaction.on_commit(lambda: release_image(previous_image))
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_image(sender, instance, **kwargs):
+    name = instance.image.name
+    if name:
+        transaction.on_commit(lambda: release_image(name))
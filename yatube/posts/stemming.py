@@ -0,0 +1,125 @@
+"""Стеммер Snowball для русского языка.
+
+Нужен поисковому индексу на SQLite: в FTS5 нет русской морфологии,
+поэтому в индекс и в запрос попадают уже усечённые основы слов.
+"""
+import re
+
+VOWELS = 'аеиоуыэюя'
+WORD = re.compile(r'\w+')
+
+PERFECTIVE_GERUND = (
+    ('в', 'вши', 'вшись'),
+    ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'),
+)
+REFLEXIVE = ('ся', 'сь')
+ADJECTIVE = (
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+    'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю',
+    'ая', 'яя', 'ою', 'ею',
+)
+PARTICIPLE = (
+    ('ем', 'нн', 'вш', 'ющ', 'щ'),
+    ('ивш', 'ывш', 'ующ'),
+)
+VERB = (
+    (
+        'ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но',
+        'ет', 'ют', 'ны', 'ть', 'ешь', 'нно',
+    ),
+    (
+        'ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей',
+        'уй', 'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят',
+        'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю',
+    ),
+)
+NOUN = (
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии',
+    'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам',
+    'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия',
+    'ья', 'я',
+)
+SUPERLATIVE = ('ейше', 'ейш')
+DERIVATIONAL = ('ость', 'ост')
+
+
+def _longest(word, suffixes):
+    found = [suffix for suffix in suffixes if word.endswith(suffix)]
+    return max(found, key=len) if found else None
+
+
+def _strip(word, suffixes):
+    suffix = _longest(word, suffixes)
+    return (word[:-len(suffix)], True) if suffix else (word, False)
+
+
+def _strip_grouped(word, groups):
+    """Снимает окончание; окончания первой группы — только после а или я."""
+    first, second = groups
+    candidates = [
+        suffix for suffix in first
+        if word.endswith(suffix) and word[:-len(suffix)][-1:] in ('а', 'я')
+    ]
+    candidates += [suffix for suffix in second if word.endswith(suffix)]
+    if not candidates:
+        return word, False
+    return word[:-len(max(candidates, key=len))], True
+
+
+def _region_after_vowel(word):
+    for index in range(1, len(word)):
+        if word[index - 1] in VOWELS and word[index] not in VOWELS:
+            return index + 1
+    return len(word)
+
+
+def _strip_adjectival(word):
+    word, found = _strip(word, ADJECTIVE)
+    if found:
+        word, _ = _strip_grouped(word, PARTICIPLE)
+    return word, found
+
+
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    rv_start = next(
+        (index + 1 for index, char in enumerate(word) if char in VOWELS),
+        len(word),
+    )
+    prefix, rv = word[:rv_start], word[rv_start:]
+    r1 = _region_after_vowel(word)
+    r2 = r1 + _region_after_vowel(word[r1:])
+
+    rv, found = _strip_grouped(rv, PERFECTIVE_GERUND)
+    if not found:
+        rv, _ = _strip(rv, REFLEXIVE)
+        for step in (
+            _strip_adjectival,
+            lambda part: _strip_grouped(part, VERB),
+            lambda part: _strip(part, NOUN),
+        ):
+            rv, found = step(rv)
+            if found:
+                break
+
+    if rv.endswith('и'):
+        rv = rv[:-1]
+
+    suffix = _longest(rv, DERIVATIONAL)
+    if suffix and rv_start + len(rv) - len(suffix) >= r2:
+        rv = rv[:-len(suffix)]
+
+    if rv.endswith('нн'):
+        rv = rv[:-1]
+    else:
+        rv, found = _strip(rv, SUPERLATIVE)
+        if found and rv.endswith('нн'):
+            rv = rv[:-1]
+        elif rv.endswith('ь'):
+            rv = rv[:-1]
+    return prefix + rv
+
+
+def stem_text(text):
+    """Текст как строка основ слов через пробел."""
+    return ' '.join(stem(word) for word in WORD.findall(text or ''))
@@ -0,0 +1,86 @@
+import asyncio
+
+from django.test import SimpleTestCase, TransactionTestCase
+from django.urls import reverse
+
+from posts.models import User
+from yatube.asgi import application
+
+
+def call(application, path, body=b'', method='GET', headers=()):
+    messages = []
+    incoming = [{'type': 'http.request', 'body': body}]
+
+    async def receive():
+        return incoming.pop(0)
+
+    async def send(message):
+        messages.append(message)
+
+    if body:
+        headers = [*headers, (b'content-length', str(len(body)).encode())]
+    scope = {
+        'type': 'http',
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'query_string': b'',
+        'headers': list(headers),
+        'server': ('testserver', 80),
+        'client': ('127.0.0.1', 12345),
+    }
+    asyncio.run(application(scope, receive, send))
+    return messages
+
+
+# Секрет CSRF без соли: Django принимает его и в cookie, и в форме
+CSRF_TOKEN = 'a' * 32
+
+
+class AsgiTest(SimpleTestCase):
+    def test_django_page(self):
+        '''Django отвечает через ASGI-точку входа'''
+        messages = call(
+            application,
+            reverse('about:author'),
+            headers=[(b'host', b'testserver')],
+        )
+        self.assertEqual(messages[0]['status'], 200)
+        self.assertIn(
+            (b'content-type', b'text/html; charset=utf-8'),
+            messages[0]['headers'],
+        )
+
+
+class AsgiLoginTest(TransactionTestCase):
+    # Представление работает в потоке пула asgiref, а транзакция
+    # TestCase другим соединениям не видна
+
+    def test_request_body_and_status(self):
+        '''Тело POST доходит до представления, статус и тело — до клиента'''
+        User.objects.create_user(username='reader', password='secret-pass')
+        login = reverse('users:login')
+        form = (
+            f'csrfmiddlewaretoken={CSRF_TOKEN}'
+            '&username=reader&password=secret-pass'
+        )
+        headers = [
+            (b'host', b'testserver'),
+            (b'content-type', b'application/x-www-form-urlencoded'),
+            (b'cookie', f'csrftoken={CSRF_TOKEN}'.encode()),
+        ]
+        messages = call(application, login, form.encode(), 'POST', headers)
+        self.assertEqual(messages[0]['status'], 302)
+        self.assertIn(
+            (b'location', reverse('posts:index').encode()),
+            messages[0]['headers'],
+        )
+
+        wrong = form.replace('secret-pass', 'wrong-pass')
+        messages = call(application, login, wrong.encode(), 'POST', headers)
+        self.assertEqual(messages[0]['status'], 200)
+        body = b''.join(m.get('body', b'') for m in messages[1:])
+        self.assertIn(b'name="username"', body)
+        self.assertIn(b'value="reader"', body)
+        self.assertFalse(messages[-1].get('more_body', False))
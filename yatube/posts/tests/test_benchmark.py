@@ -0,0 +1,72 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from posts.benchmark import (compare_with_baseline, percentile,
+                             run_benchmark, seed_dataset, summarize)
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class BenchmarkTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_seed_dataset(self):
+        '''Синтетические данные заводятся в заданном объёме'''
+        seed_dataset(
+            users=5, groups=2, posts=20, comments_per_post=2,
+            follows_per_user=2, image_share=0,
+        )
+        self.assertEqual(User.objects.count(), 5)
+        self.assertEqual(Group.objects.count(), 2)
+        self.assertEqual(Post.objects.count(), 20)
+        self.assertEqual(Comment.objects.count(), 40)
+        self.assertEqual(Follow.objects.count(), 10)
+
+    def test_run_benchmark_covers_every_scenario(self):
+        '''Прогон обходит все адреса и без ошибок получает ответы'''
+        seed_dataset(
+            users=4, groups=1, posts=12, comments_per_post=1,
+            follows_per_user=2, image_share=0,
+        )
+        samples, elapsed = run_benchmark(requests=18, concurrency=1)
+        self.assertEqual(len(samples), 18)
+        self.assertGreater(elapsed, 0)
+        self.assertEqual({status for *_, status in samples}, {200})
+        report = summarize(samples, elapsed)
+        self.assertIn('posts:follow_index', report['scenarios'])
+        self.assertIn('posts:post_detail', report['scenarios'])
+        self.assertEqual(report['total']['requests'], 18)
+        self.assertGreater(report['total']['max_queries'], 0)
+
+    def test_run_benchmark_requires_data(self):
+        '''Без данных прогон не запускается'''
+        with self.assertRaises(ValueError):
+            run_benchmark(requests=1, concurrency=1)
+
+    def test_percentile(self):
+        '''Перцентиль считается методом ближайшего ранга'''
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 95), 7)
+        self.assertEqual(percentile([], 50), 0.0)
+
+    def test_compare_with_baseline(self):
+        '''Регрессией считается рост p95 сверх допуска и рост запросов'''
+        samples = [('posts:index', 0.010, 2, 200)] * 10
+        baseline = summarize(samples, 1)
+        self.assertEqual(compare_with_baseline(baseline, baseline), [])
+
+        slower = summarize([('posts:index', 0.013, 2, 200)] * 10, 1)
+        self.assertEqual(len(compare_with_baseline(slower, baseline)), 1)
+        self.assertEqual(
+            compare_with_baseline(slower, baseline, tolerance=0.5), []
+        )
+
+        more_queries = summarize([('posts:index', 0.010, 3, 200)] * 10, 1)
+        self.assertEqual(
+            len(compare_with_baseline(more_queries, baseline)), 1
+        )
+
+        new_scenario = summarize([('posts:search', 1.0, 9, 200)], 1)
+        self.assertEqual(compare_with_baseline(new_scenario, baseline), [])
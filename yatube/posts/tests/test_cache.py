@@ -1,10 +1,14 @@
 from django.core.cache import cache
+from django.db import connection
 from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from posts.models import Post, User
+from posts.models import Comment, Group, Post, User
 
 INDEX_PAGE = 'posts:index'
+GROUP_LIST = 'posts:group_list'
+POST_DETAIL = 'posts:post_detail'
 
 
 class CacheTest(TestCase):
@@ -12,21 +16,62 @@ class CacheTest(TestCase):
     def setUpClass(cls):
         super().setUpClass()
         cls.user = User.objects.create_user(username='user1')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_group',
+            description='Тестовое описание',
+        )
 
     def setUp(self):
+        cache.clear()
         self.client = Client()
 
+    def _post_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        post_queries = [
+            query for query in queries.captured_queries
+            if 'FROM "posts_post"' in query['sql']
+        ]
+        return response, post_queries
+
     def test_index_cache(self):
-        '''Проверяем кеширование главной страницы'''
+        '''Главная страница берётся из кеша, пока посты не менялись'''
+        Post.objects.create(text='Тестовый пост', author=self.user)
+        self._post_queries(reverse(INDEX_PAGE))
+        response, post_queries = self._post_queries(reverse(INDEX_PAGE))
+        self.assertEqual(post_queries, [])
+        self.assertContains(response, 'Тестовый пост')
+
+    def test_index_cache_invalidated_by_writes(self):
+        '''Создание и удаление поста сразу видны на главной странице'''
         response0 = self.client.get(reverse(INDEX_PAGE))
         post = Post.objects.create(
             text='Тестовый пост',
             author=self.user,
         )
         response1 = self.client.get(reverse(INDEX_PAGE))
+        self.assertContains(response1, 'Тестовый пост')
         Post.objects.filter(pk=post.pk).delete()
         response2 = self.client.get(reverse(INDEX_PAGE))
-        self.assertEqual(response1.content, response2.content)
-        cache.clear()
-        response3 = self.client.get(reverse(INDEX_PAGE))
-        self.assertEqual(response0.content, response3.content)
+        self.assertNotContains(response2, 'Тестовый пост')
+        self.assertEqual(response0.content, response2.content)
+
+    def test_group_cache_invalidated_by_group_change(self):
+        '''Пост, перенесённый в группу, сразу появляется в её ленте'''
+        url = reverse(GROUP_LIST, kwargs={'slug': self.group.slug})
+        post = Post.objects.create(text='Тестовый пост', author=self.user)
+        self.assertNotContains(self.client.get(url), 'Тестовый пост')
+        post.group = self.group
+        post.save()
+        self.assertContains(self.client.get(url), 'Тестовый пост')
+
+    def test_comments_cache_invalidated_by_new_comment(self):
+        '''Новый комментарий сразу виден на странице поста'''
+        post = Post.objects.create(text='Тестовый пост', author=self.user)
+        url = reverse(POST_DETAIL, kwargs={'post_id': post.pk})
+        self.client.get(url)
+        Comment.objects.create(
+            post=post, author=self.user, text='Тестовый комментарий'
+        )
+        self.assertContains(self.client.get(url), 'Тестовый комментарий')
@@ -0,0 +1,132 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.cache import cache_stats, reset_cache_stats
+from posts.counters import COUNTER_CACHE_KEY
+from posts.feed_cache import FEED_VERSION_KEY
+from posts.graph import GRAPH_KEY
+from posts.timeline import HEAVY_AUTHORS_CACHE_KEY
+
+User = get_user_model()
+
+TIERED_CACHES = {
+    'default': {
+        'BACKEND': 'core.cache.TieredCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'ALIAS': 'tiered',
+            'LOCAL_MAX_ENTRIES': 3,
+            'LOCAL_TIMEOUT': 60,
+            'LOCAL_BYPASS_PREFIXES': ['feed_version:'],
+        },
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'test-shared',
+    },
+}
+
+
+@override_settings(CACHES=TIERED_CACHES)
+class TieredCacheTest(TestCase):
+    def setUp(self):
+        self.cache = caches['default']
+        self.shared = caches['shared']
+        self.cache.clear()
+        reset_cache_stats()
+
+    def test_hits_and_misses_are_counted(self):
+        '''Попадания и промахи копятся по алиасу кеша'''
+        self.assertIsNone(self.cache.get('key'))
+        self.cache.set('key', 'value')
+        self.assertEqual(self.cache.get('key'), 'value')
+        self.assertEqual(
+            cache_stats()['tiered'], {'misses': 1, 'hits': 1, 'local_hits': 1}
+        )
+
+    def test_cached_none_is_a_hit(self):
+        '''Сохранённый None не считается промахом'''
+        self.cache.set('key', None)
+        self.shared.delete('key')
+        self.shared.set('key', None)
+        self.cache.local.clear()
+        self.assertIsNone(self.cache.get('key', 'default'))
+        self.assertEqual(cache_stats()['tiered'], {'hits': 1})
+
+    def test_read_through_fills_local_tier(self):
+        '''Значение из общего кеша оседает в локальном уровне'''
+        self.shared.set('key', 'value')
+        self.cache.get('key')
+        self.shared.delete('key')
+        self.assertEqual(self.cache.get('key'), 'value')
+
+    def test_writes_invalidate_local_tier(self):
+        '''Удаление и incr сбрасывают локальную копию'''
+        self.cache.set('counter', 1)
+        self.cache.incr('counter')
+        self.assertEqual(self.cache.get('counter'), 2)
+        self.cache.delete('counter')
+        self.assertIsNone(self.cache.get('counter'))
+
+    def test_bypass_prefixes_always_read_shared(self):
+        '''Версии лент не кешируются в памяти процесса'''
+        self.cache.set('feed_version:global', 1)
+        self.shared.set('feed_version:global', 2)
+        self.assertEqual(self.cache.get('feed_version:global'), 2)
+
+    def test_local_tier_is_bounded(self):
+        '''Локальный уровень вытесняет записи сверх LOCAL_MAX_ENTRIES'''
+        for i in range(10):
+            self.cache.set(f'key{i}', i)
+        self.assertLessEqual(len(self.cache.local._cache), 3)
+        self.assertEqual(self.cache.get('key0'), 0)
+
+    def test_get_many_combines_tiers(self):
+        '''get_many читает из обоих уровней и считает промахи'''
+        self.cache.set('a', 1)
+        self.shared.set('b', 2)
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2}
+        )
+        self.assertEqual(
+            cache_stats()['tiered'], {'local_hits': 1, 'hits': 2, 'misses': 1}
+        )
+
+
+class ProjectCacheSettingsTest(TestCase):
+    def test_shared_state_bypasses_local_tier(self):
+        '''Ключи, которые сбрасывают другие процессы, идут мимо памяти'''
+        prefixes = tuple(
+            settings.CACHES['default']['OPTIONS']['LOCAL_BYPASS_PREFIXES']
+        )
+        keys = (
+            FEED_VERSION_KEY.format(feed='global'),
+            GRAPH_KEY.format(direction='following', user_id=1),
+            COUNTER_CACHE_KEY.format(scope='author', object_id=1),
+            HEAVY_AUTHORS_CACHE_KEY,
+        )
+        for key in keys:
+            with self.subTest(key=key):
+                self.assertTrue(key.startswith(prefixes))
+
+
+class CacheStatsViewTest(TestCase):
+    def test_stats_are_staff_only(self):
+        '''Статистика кешей доступна только персоналу'''
+        client = Client()
+        client.force_login(User.objects.create_user(username='user'))
+        response = client.get(reverse('cache_stats'))
+        self.assertEqual(response.status_code, 302)
+
+        client.force_login(
+            User.objects.create_user(username='staff', is_staff=True)
+        )
+        reset_cache_stats()
+        caches['default'].get('missing-key')
+        response = client.get(reverse('cache_stats'))
+        stats = response.json()['default']
+        self.assertGreaterEqual(stats['misses'], 1)
+        self.assertIn('hit_rate', stats)
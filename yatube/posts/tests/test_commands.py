@@ -0,0 +1,354 @@
+import csv
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.models import FileClaim
+from posts import feed_cache
+from posts.counters import get_post_count
+from posts.management.commands.explain_feeds import bad_plan_lines
+from posts.management.commands.warm_thumbnails import write_checkpoint
+from posts.models import (Comment, Follow, Group, Post, PostCounter,
+                          TimelineEntry, User)
+from posts.search import ranked_ids
+from posts.tests.test_storage import HASHED_IMAGE_NAME
+from posts.tests.test_thumbnails import make_image
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+class ExplainFeedsTest(TestCase):
+    def test_feed_queries_use_indexes(self):
+        '''Все запросы лент читаются по индексу без временной сортировки'''
+        out = StringIO()
+        call_command('explain_feeds', stdout=out)
+        self.assertNotIn('FAIL', out.getvalue())
+
+    def test_bad_plans_are_detected(self):
+        '''Полный просмотр таблицы и сортировка считаются плохим планом'''
+        self.assertTrue(bad_plan_lines('2 0 0 SCAN posts_post', 'sqlite'))
+        self.assertTrue(
+            bad_plan_lines('40 0 0 USE TEMP B-TREE FOR ORDER BY', 'sqlite')
+        )
+        self.assertFalse(bad_plan_lines(
+            '5 0 0 SCAN posts_post USING INDEX post_pub_date_idx', 'sqlite'
+        ))
+        self.assertTrue(bad_plan_lines(
+            'Limit\n  ->  Sort\n        ->  Seq Scan on posts_post',
+            'postgresql'
+        ))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class WarmThumbnailsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user1')
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {i}', author=cls.user,
+                image=make_image(f'{i}.png', color=(i, 0, 0)),
+            )
+            for i in range(3)
+        ]
+        Post.objects.create(text='Без картинки', author=cls.user)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        # KV-хранилище sorl держит записи и в кеше, а он не откатывается
+        cache.clear()
+        self.checkpoint = os.path.join(TEMP_MEDIA_ROOT, 'checkpoint')
+
+    def _warm(self, *args):
+        out = StringIO()
+        call_command(
+            'warm_thumbnails', '--workers=0', '--batch-size=2',
+            f'--checkpoint={self.checkpoint}', *args, stdout=out
+        )
+        return out.getvalue()
+
+    def test_thumbnails_are_created_and_then_skipped(self):
+        '''Команда создаёт миниатюры, а повторный прогон их пропускает'''
+        output = self._warm('--restart')
+        self.assertIn('создано 3, пропущено 0, ошибок 0', output)
+        for post in self.posts:
+            post.refresh_from_db()
+            self.assertIn('card', post.thumbnail_data)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+        output = self._warm()
+        self.assertIn('создано 0, пропущено 3, ошибок 0', output)
+
+    def test_feeds_are_bumped_once_per_batch(self):
+        '''Главная сбрасывается раз на пачку, а не на каждый пост'''
+        with mock.patch(
+            'posts.feed_cache.bump_feed', wraps=feed_cache.bump_feed
+        ) as bump:
+            self._warm('--restart')
+        global_bumps = [
+            call for call in bump.call_args_list
+            if call.args[0] == feed_cache.GLOBAL
+        ]
+        # Три поста с картинками пачками по два
+        self.assertEqual(len(global_bumps), 2)
+
+    def test_process_pool(self):
+        '''Миниатюры считаются в пуле процессов и пишутся в базу'''
+        output = self._warm('--restart', '--workers=2')
+        self.assertIn('создано 3, пропущено 0, ошибок 0', output)
+        for post in self.posts:
+            post.refresh_from_db()
+            card = post.thumbnail_data['card']
+            self.assertEqual((card['width'], card['height']), (960, 339))
+            self.assertTrue(
+                os.path.exists(os.path.join(
+                    TEMP_MEDIA_ROOT, card['url'][len(settings.MEDIA_URL):]
+                ))
+            )
+
+    def test_changed_geometry_is_rendered_again(self):
+        '''Смена настроек миниатюр заново считает записанные миниатюры'''
+        self._warm('--restart')
+        with self.settings(IMAGE_VARIANT_WIDTHS=(480,)):
+            output = self._warm('--restart')
+        self.assertIn('создано 3, пропущено 0, ошибок 0', output)
+
+    def test_run_resumes_from_checkpoint(self):
+        '''Прерванный прогон продолжается после сохранённого поста'''
+        write_checkpoint(self.checkpoint, self.posts[0].pk)
+        output = self._warm()
+        self.assertIn(f'Продолжаем после поста {self.posts[0].pk}', output)
+        self.posts[0].refresh_from_db()
+        self.assertEqual(self.posts[0].thumbnails, '')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImportPostsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.source_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.source_dir, True)
+
+    def _write(self, name, content):
+        path = os.path.join(self.source_dir, name)
+        with open(path, 'w', encoding='utf-8') as source:
+            source.write(content)
+        return path
+
+    def _import(self, path, *args):
+        out, err = StringIO(), StringIO()
+        call_command(
+            'import_posts', path, '--batch-size=2', *args,
+            stdout=out, stderr=err
+        )
+        return out.getvalue(), err.getvalue()
+
+    def test_failed_batch_leaves_no_claims(self):
+        '''Откат пачки откатывает и заявки на её картинки'''
+        with open(os.path.join(self.source_dir, 'cat.png'), 'wb') as image:
+            image.write(make_image('cat.png').read())
+        path = self._write('posts.jsonl', json.dumps(
+            {'author': 'author', 'text': 'Пост', 'image': 'cat.png'}
+        ))
+        with mock.patch(
+            'posts.counters.posts_added', side_effect=RuntimeError
+        ):
+            with self.assertRaises(RuntimeError):
+                self._import(path)
+        self.assertFalse(Post.objects.exists())
+        self.assertFalse(FileClaim.objects.exists())
+
+    def test_jsonl_import(self):
+        '''Импорт JSON Lines с датами, группой, комментариями и картинкой'''
+        with open(os.path.join(self.source_dir, 'cat.png'), 'wb') as image:
+            image.write(make_image('cat.png').read())
+        rows = [
+            {
+                'author': 'author', 'text': 'Старый пост про кошку',
+                'group': 'group', 'pub_date': '2015-03-01T10:00:00',
+                'image': 'cat.png',
+                'comments': [{
+                    'author': 'reader', 'text': 'Мяу',
+                    'created': '2015-03-02T10:00:00',
+                }],
+            },
+            {'author': 'author', 'text': 'Второй пост'},
+            {'author': 'nobody', 'text': 'Пост без автора'},
+            {'author': 'author', 'text': 'Третий пост'},
+        ]
+        path = self._write(
+            'posts.jsonl',
+            '\n'.join(json.dumps(row, ensure_ascii=False) for row in rows)
+            + '\nне json\n'
+        )
+        out, err = self._import(path)
+
+        self.assertIn('постов 3, комментариев 1, ошибок 2', out)
+        self.assertIn("Строка 3: нет пользователя 'nobody'", err)
+        self.assertIn('Строка 5: битый JSON', err)
+        post = Post.objects.get(text='Старый пост про кошку')
+        self.assertEqual(post.pub_date.year, 2015)
+        self.assertEqual(post.group, self.group)
+        self.assertRegex(post.image.name, HASHED_IMAGE_NAME)
+        self.assertEqual(post.comments.get().created.day, 2)
+
+        # Сигналы не сработали, но счётчики, ленты и индекс обновлены
+        self.assertEqual(
+            get_post_count(PostCounter.SCOPE_AUTHOR, self.author.pk), 3
+        )
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 3
+        )
+        self.assertEqual(
+            [pk for pk, _ in ranked_ids('кошки', 10)], [post.pk]
+        )
+
+    def test_bad_images_do_not_abort_batch(self):
+        '''Битая картинка пропускается, а пост и остальная пачка остаются'''
+        with open(os.path.join(self.source_dir, 'cat.png'), 'wb') as image:
+            image.write(make_image('cat.png').read())
+        rows = [
+            {'author': 'author', 'text': 'Нет файла', 'image': 'no.png'},
+            {'author': 'author', 'text': 'Нулевой байт', 'image': 'a\x00.png'},
+            {'author': 'author', 'text': 'Отказ', 'image': 'cat.png'},
+        ]
+        path = self._write(
+            'posts.jsonl', '\n'.join(json.dumps(row) for row in rows)
+        )
+        with mock.patch.object(
+            default_storage, 'write',
+            side_effect=SuspiciousFileOperation('bad name'),
+        ):
+            out, err = self._import(path)
+
+        self.assertIn('постов 3, комментариев 0, ошибок 3', out)
+        for line_number in (1, 2, 3):
+            self.assertIn(
+                f'Строка {line_number}: картинка не скопирована', err
+            )
+        self.assertFalse(Post.objects.exclude(image='').exists())
+
+    def test_csv_import_creates_missing(self):
+        '''CSV-импорт заводит неизвестных авторов и группы по флагу'''
+        path = self._write(
+            'posts.csv',
+            'author,text,group\n'
+            'newbie,Пост новичка,new-group\n'
+            'author,Пост автора,\n'
+        )
+        out, err = self._import(path, '--create-missing')
+        self.assertEqual(err, '')
+        self.assertIn('постов 2, комментариев 0, ошибок 0', out)
+        post = Post.objects.get(text='Пост новичка')
+        self.assertEqual(post.author.username, 'newbie')
+        self.assertFalse(post.author.has_usable_password())
+        self.assertEqual(post.group.slug, 'new-group')
+
+
+class ExportPostsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {i}, с запятой\nи переносом',
+                author=cls.author,
+                group=cls.group if i % 2 else None,
+            )
+            for i in range(5)
+        ]
+        Comment.objects.create(
+            post=cls.posts[1], author=cls.author, text='Комментарий'
+        )
+
+    def _export(self, *args):
+        out = StringIO()
+        call_command(
+            'export_posts', '--batch-size=2', *args,
+            stdout=out, stderr=StringIO()
+        )
+        return out.getvalue()
+
+    def test_jsonl_export(self):
+        '''Выгрузка JSON Lines по пачкам содержит все посты по порядку'''
+        rows = [json.loads(line) for line in self._export().splitlines()]
+        self.assertEqual(
+            [row['id'] for row in rows], [post.pk for post in self.posts]
+        )
+        self.assertEqual(rows[1]['group'], 'group')
+        self.assertIsNone(rows[0]['group'])
+        self.assertEqual(
+            rows[1]['comments'][0]['text'], 'Комментарий'
+        )
+
+    def test_csv_export_round_trips_through_import(self):
+        '''CSV-выгрузку можно загрузить обратно через import_posts'''
+        output = self._export('--format=csv', '--author=author')
+        rows = list(csv.DictReader(StringIO(output)))
+        self.assertEqual(len(rows), len(self.posts))
+        self.assertEqual(rows[0]['text'], self.posts[0].text)
+
+        source_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, source_dir, True)
+        path = os.path.join(source_dir, 'posts.csv')
+        with open(path, 'w', newline='', encoding='utf-8') as dump:
+            dump.write(output)
+        call_command('import_posts', path, stdout=StringIO())
+        self.assertEqual(Post.objects.count(), len(self.posts) * 2)
+        self.assertEqual(
+            Comment.objects.filter(text='Комментарий').count(), 2
+        )
+
+    def test_streaming_endpoint(self):
+        '''Выгрузка по HTTP отдаётся потоком и только персоналу'''
+        url = reverse('posts:export_posts')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(self.author)
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(
+            User.objects.create_user(username='staff', is_staff=True)
+        )
+        response = self.client.get(url, {'group': 'group'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(
+            response['Content-Type'], 'application/x-ndjson; charset=utf-8'
+        )
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        response = self.client.get(url, {'format': 'xml'})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,131 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_group',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый пост', author=cls.author, group=cls.group
+        )
+        cls.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': cls.group.slug}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:post_detail', kwargs={'post_id': cls.post.pk}),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def _revalidate(self, url, etag):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_matching_etag_gets_not_modified(self):
+        '''Повторный запрос с тем же ETag получает 304 без тела'''
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                etag = response['ETag']
+                self.assertTrue(etag.startswith('W/"'))
+                response = self._revalidate(url, etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+                self.assertEqual(response['ETag'], etag)
+
+    def test_not_modified_skips_rendering(self):
+        '''На 304 шаблон не рендерится'''
+        url = reverse('posts:index')
+        etag = self.client.get(url)['ETag']
+        response = self._revalidate(url, etag)
+        self.assertEqual(response.templates, [])
+
+    def test_new_post_changes_feeds(self):
+        '''Новый пост меняет ETag главной, группы и профиля'''
+        etags = {url: self.client.get(url)['ETag'] for url in self.urls[:3]}
+        Post.objects.create(
+            text='Ещё пост', author=self.author, group=self.group
+        )
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self._revalidate(url, etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, 'Ещё пост')
+
+    def test_edit_and_comment_change_post_page(self):
+        '''Правка поста и новый комментарий меняют ETag страницы поста'''
+        url = self.urls[3]
+        etag = self.client.get(url)['ETag']
+        self.post.text = 'Исправленный пост'
+        self.post.save()
+        response = self._revalidate(url, etag)
+        self.assertContains(response, 'Исправленный пост')
+
+        etag = response['ETag']
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+        response = self._revalidate(url, etag)
+        self.assertContains(response, 'Комментарий')
+
+    def test_viewer_and_page_are_part_of_etag(self):
+        '''У другого зрителя и другой страницы свой ETag'''
+        url = reverse('posts:index')
+        anonymous = self.client.get(url)['ETag']
+        second_page = self.client.get(url + '?page=2')['ETag']
+        self.assertNotEqual(second_page, anonymous)
+        self.client.force_login(self.reader)
+        response = self._revalidate(url, anonymous)
+        self.assertEqual(response.status_code, 200)
+
+    def test_follow_changes_profile(self):
+        '''Подписка меняет ETag профиля: кнопка и число подписчиков'''
+        self.client.force_login(self.reader)
+        url = self.urls[2]
+        etag = self.client.get(url)['ETag']
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self._revalidate(url, etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_renames_change_feeds_and_post_page(self):
+        '''Новое имя автора и название группы меняют ETag всех страниц'''
+        etags = {url: self.client.get(url)['ETag'] for url in self.urls}
+        self.group.title = 'Переименованная группа'
+        self.group.save()
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self._revalidate(url, etag)
+                self.assertEqual(response.status_code, 200)
+                etags[url] = response['ETag']
+        self.assertContains(
+            self.client.get(self.urls[3]), 'Переименованная группа'
+        )
+
+        self.author.first_name = 'Лев'
+        self.author.save()
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self._revalidate(url, etag)
+                self.assertEqual(response.status_code, 200)
+        self.assertContains(self.client.get(self.urls[0]), 'Лев')
+
+    def test_login_keeps_etags(self):
+        '''Сохранение last_login при входе не сбрасывает ленты'''
+        url = self.urls[0]
+        etag = self.client.get(url)['ETag']
+        self.reader.last_login = None
+        self.reader.save(update_fields=['last_login'])
+        self.assertEqual(self._revalidate(url, etag).status_code, 304)
@@ -0,0 +1,117 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import counters
+from posts.counters import get_post_count, recount_posts
+from posts.models import Group, Post, PostCounter, User
+
+INDEX_PAGE = 'posts:index'
+PROFILE = 'posts:profile'
+
+
+class PostCounterTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user1')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_group',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other_group',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def _counts(self):
+        return (
+            get_post_count(PostCounter.SCOPE_ALL),
+            get_post_count(PostCounter.SCOPE_AUTHOR, self.user.pk),
+            get_post_count(PostCounter.SCOPE_GROUP, self.group.pk),
+        )
+
+    def test_counters_follow_create_and_delete(self):
+        '''Счётчики обновляются при создании и удалении поста'''
+        post = Post.objects.create(
+            text='Тестовый пост', author=self.user, group=self.group
+        )
+        Post.objects.create(text='Без группы', author=self.user)
+        self.assertEqual(self._counts(), (2, 2, 1))
+        post.delete()
+        self.assertEqual(self._counts(), (1, 1, 0))
+
+    def test_counters_follow_group_change(self):
+        '''Смена группы поста переносит его между счётчиками групп'''
+        post = Post.objects.create(
+            text='Тестовый пост', author=self.user, group=self.group
+        )
+        post.group = self.other_group
+        post.save()
+        self.assertEqual(
+            get_post_count(PostCounter.SCOPE_GROUP, self.group.pk), 0
+        )
+        self.assertEqual(
+            get_post_count(PostCounter.SCOPE_GROUP, self.other_group.pk), 1
+        )
+
+    def test_concurrent_first_post(self):
+        '''Строку счётчика успел завести другой запрос: без IntegrityError'''
+        PostCounter.objects.create(
+            scope=PostCounter.SCOPE_AUTHOR, object_id=self.user.pk, count=5
+        )
+        real_add = counters._add
+        calls = []
+
+        def add(*args):
+            # Первое обновление не нашло строку: её вставили сразу после
+            calls.append(args)
+            return 0 if len(calls) == 1 else real_add(*args)
+
+        with mock.patch.object(counters, '_add', side_effect=add):
+            counters.change_post_count(
+                PostCounter.SCOPE_AUTHOR, self.user.pk, 1
+            )
+        self.assertEqual(
+            get_post_count(PostCounter.SCOPE_AUTHOR, self.user.pk), 6
+        )
+
+    def test_recount_after_bulk_create(self):
+        '''recount_posts учитывает посты, созданные в обход сигналов'''
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=self.user, group=self.group)
+            for i in range(3)
+        )
+        self.assertIsNone(
+            get_post_count(PostCounter.SCOPE_AUTHOR, self.user.pk)
+        )
+        recount_posts()
+        self.assertEqual(self._counts(), (3, 3, 3))
+
+    def test_paginator_uses_counter(self):
+        '''Пагинатор берёт количество постов из счётчика'''
+        Post.objects.create(text='Тестовый пост', author=self.user)
+        get_post_count(PostCounter.SCOPE_ALL)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(INDEX_PAGE))
+        for query in queries.captured_queries:
+            self.assertNotIn('COUNT(', query['sql'])
+        self.assertEqual(response.context['page_obj'].paginator.count, 1)
+
+    def test_profile_shows_counter(self):
+        '''Профиль показывает количество постов из счётчика'''
+        Post.objects.create(text='Тестовый пост', author=self.user)
+        response = self.client.get(
+            reverse(PROFILE, kwargs={'username': self.user.username})
+        )
+        self.assertEqual(response.context['posts_count'], 1)
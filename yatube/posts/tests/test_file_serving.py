@@ -0,0 +1,247 @@
+import gzip
+import os
+import shutil
+import tempfile
+
+from django.core.management import call_command
+from django.http import Http404
+from django.test import RequestFactory, TestCase, override_settings
+
+from core.files import accepted_encodings, parse_range
+from core.staticfiles import compress_file
+from core.views import serve_media, serve_static
+
+CONTENT = bytes(range(256)) * 8
+HASHED_MEDIA = 'posts/ab/cd/' + 'ab' * 32 + '.jpg'
+STYLE = b'body { color: black; }\n' * 40
+
+
+class ParseRangeTest(TestCase):
+    def test_ranges(self):
+        '''Обычный, открытый и суффиксный диапазоны'''
+        self.assertEqual(parse_range('bytes=0-9', 100), (0, 9))
+        self.assertEqual(parse_range('bytes=90-', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=-10', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=50-1000', 100), (50, 99))
+        self.assertEqual(parse_range('bytes=-1000', 100), (0, 99))
+
+    def test_unsupported_ranges_mean_whole_file(self):
+        '''Несколько диапазонов и чужие единицы — весь файл'''
+        self.assertIsNone(parse_range('bytes=0-1,5-6', 100))
+        self.assertIsNone(parse_range('items=0-1', 100))
+
+    def test_unsatisfiable(self):
+        '''Диапазон за концом файла невыполним'''
+        for header in ('bytes=100-', 'bytes=5-1', 'bytes=-0'):
+            with self.subTest(header=header):
+                with self.assertRaises(ValueError):
+                    parse_range(header, 100)
+
+    def test_empty_file_has_no_ranges(self):
+        '''У пустого файла невыполним любой диапазон, в том числе суффиксный'''
+        for header in ('bytes=0-', 'bytes=0-9', 'bytes=-5'):
+            with self.subTest(header=header):
+                with self.assertRaises(ValueError):
+                    parse_range(header, 0)
+
+
+class FileServingTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.static_root = tempfile.mkdtemp()
+        for root in (self.media_root, self.static_root):
+            self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        self.write(self.media_root, HASHED_MEDIA, CONTENT)
+        self.write(self.media_root, 'posts/plain.jpg', CONTENT)
+        self.write(self.static_root, 'css/site.0123456789ab.css', STYLE)
+        compress_file(
+            os.path.join(self.static_root, 'css/site.0123456789ab.css')
+        )
+        settings = override_settings(
+            MEDIA_ROOT=self.media_root,
+            STATIC_ROOT=self.static_root,
+            FILE_OFFLOAD='',
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.factory = RequestFactory()
+
+    def write(self, root, name, data):
+        path = os.path.join(root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as output:
+            output.write(data)
+
+    def media(self, name, **headers):
+        return serve_media(self.factory.get('/media/' + name, **headers), name)
+
+    def test_full_response(self):
+        '''Файл целиком со строгим ETag и годовым кешем для имени с хешем'''
+        response = self.media(HASHED_MEDIA)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Content-Length'], str(len(CONTENT)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        # ETag имени с хешем — сам хеш, файл ради него не читается
+        self.assertEqual(response['ETag'], '"' + 'ab' * 32 + '"')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+
+    def test_plain_name_etag_follows_mtime_and_size(self):
+        '''ETag имени без хеша меняется вместе с файлом'''
+        etag = self.media('posts/plain.jpg')['ETag']
+        self.write(self.media_root, 'posts/plain.jpg', CONTENT + b'!')
+        self.assertNotEqual(self.media('posts/plain.jpg')['ETag'], etag)
+
+    def test_plain_name_gets_short_cache(self):
+        '''Имя без хеша кешируется на MEDIA_MAX_AGE'''
+        with self.settings(MEDIA_MAX_AGE=600):
+            response = self.media('posts/plain.jpg')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=600')
+
+    def test_if_none_match(self):
+        '''Совпавший ETag — 304 без тела'''
+        etag = self.media(HASHED_MEDIA)['ETag']
+        response = self.media(HASHED_MEDIA, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+    def test_range(self):
+        '''Один диапазон — 206 с Content-Range'''
+        response = self.media(HASHED_MEDIA, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(
+            b''.join(response.streaming_content), CONTENT[10:20]
+        )
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(
+            response['Content-Range'], f'bytes 10-19/{len(CONTENT)}'
+        )
+
+    def test_suffix_range(self):
+        '''bytes=-N — последние N байт'''
+        response = self.media(HASHED_MEDIA, HTTP_RANGE='bytes=-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT[-5:])
+
+    def test_unsatisfiable_range(self):
+        '''Диапазон за концом файла — 416 с размером файла'''
+        response = self.media(HASHED_MEDIA, HTTP_RANGE='bytes=99999-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(
+            response['Content-Range'], f'bytes */{len(CONTENT)}'
+        )
+
+    def test_range_of_empty_file(self):
+        '''Суффиксный диапазон пустого файла — 416, а не кусок'''
+        self.write(self.media_root, 'posts/empty.jpg', b'')
+        response = self.media('posts/empty.jpg', HTTP_RANGE='bytes=-5')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */0')
+
+    def test_stale_if_range_gets_whole_file(self):
+        '''If-Range со старым ETag — весь файл, а не кусок'''
+        response = self.media(
+            HASHED_MEDIA, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT)
+
+    def test_outside_root_is_not_found(self):
+        '''Путь за пределы каталога и каталоги не отдаются'''
+        for name in ('../../etc/passwd', 'posts', '/etc/passwd', 'missing'):
+            with self.subTest(name=name):
+                with self.assertRaises(Http404):
+                    self.media(name)
+
+    def test_precompressed_static(self):
+        '''Клиенту с gzip отдаётся готовая .gz копия'''
+        name = 'css/site.0123456789ab.css'
+        request = self.factory.get(
+            '/static/' + name, HTTP_ACCEPT_ENCODING='gzip, deflate'
+        )
+        response = serve_static(request, name)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        body = b''.join(response.streaming_content)
+        self.assertEqual(gzip.decompress(body), STYLE)
+
+        plain = serve_static(self.factory.get('/static/' + name), name)
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertEqual(b''.join(plain.streaming_content), STYLE)
+        self.assertNotEqual(plain['ETag'], response['ETag'])
+
+    def test_refused_encoding_is_not_served(self):
+        '''gzip;q=0 запрещает gzip, а не разрешает его'''
+        name = 'css/site.0123456789ab.css'
+        for header in ('gzip;q=0', 'gzip; q=0.0, identity', '*;q=0'):
+            with self.subTest(header=header):
+                response = serve_static(self.factory.get(
+                    '/static/' + name, HTTP_ACCEPT_ENCODING=header
+                ), name)
+                self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(
+            accepted_encodings('br;q=0, *;q=0.5'), {'gzip'}
+        )
+
+    def test_nginx_offload(self):
+        '''С FILE_OFFLOAD=nginx тело отдаёт веб-сервер'''
+        with self.settings(
+            FILE_OFFLOAD='nginx', FILE_OFFLOAD_MEDIA_PREFIX='/protected/'
+        ):
+            response = self.media(HASHED_MEDIA)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(
+            response['X-Accel-Redirect'], '/protected/' + HASHED_MEDIA
+        )
+        self.assertIn('ETag', response)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+
+
+class CollectStaticTest(TestCase):
+    def setUp(self):
+        self.source = tempfile.mkdtemp()
+        self.static_root = tempfile.mkdtemp()
+        for root in (self.source, self.static_root):
+            self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        with open(os.path.join(self.source, 'site.css'), 'wb') as output:
+            output.write(STYLE)
+        with open(os.path.join(self.source, 'tiny.js'), 'wb') as output:
+            output.write(b'1;')
+
+    def test_compress_file_skips_small_files(self):
+        '''Маленькие и несжимаемые файлы остаются без копий'''
+        self.assertEqual(
+            compress_file(os.path.join(self.source, 'tiny.js')), []
+        )
+        self.assertEqual(
+            compress_file(os.path.join(self.source, 'site.css'))[0], '.gz'
+        )
+
+    def test_collectstatic_writes_manifest_and_gzip(self):
+        '''collectstatic пишет манифест и .gz для файлов с хешем'''
+        with self.settings(
+            STATIC_ROOT=self.static_root,
+            STATICFILES_DIRS=[self.source],
+            STATICFILES_FINDERS=[
+                'django.contrib.staticfiles.finders.FileSystemFinder'
+            ],
+            STATICFILES_STORAGE=(
+                'core.staticfiles.CompressedManifestStaticFilesStorage'
+            ),
+        ):
+            call_command('collectstatic', interactive=False, verbosity=0)
+        files = set(os.listdir(self.static_root))
+        self.assertIn('staticfiles.json', files)
+        hashed = [
+            name for name in files
+            if name.startswith('site.') and name.endswith('.css')
+            and name != 'site.css'
+        ]
+        self.assertEqual(len(hashed), 1)
+        self.assertIn(hashed[0] + '.gz', files)
+        self.assertNotIn('tiny.js.gz', files)
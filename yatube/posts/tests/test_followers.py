@@ -1,9 +1,16 @@
+import json
+
+from django.core.cache import cache
+from django.db.models.signals import post_delete
 from django.test import Client, TestCase
 from django.urls import reverse
 
-from posts.models import Post, User
+from posts.follows import follow_authors, unfollow_authors
+from posts.models import Follow, Post, User
 
+FOLLOW_BATCH = 'posts:follow_batch'
 FOLLOW_INDEX = 'posts:follow_index'
+PROFILE = 'posts:profile'
 PROFILE_FOLLOW = 'posts:profile_follow'
 PROFILE_UNFOLLOW = 'posts:profile_unfollow'
 
@@ -91,3 +98,123 @@ class FollowersTest(TestCase):
 
         #  проверим, что у user3 никаких постов нет
         self._check_followers_band_is_empty(self.client3)
+
+    def test_profile_counts_and_follow_status(self):
+        '''Профиль показывает счётчики подписок и статус подписки'''
+        self.client1.get(
+            reverse(PROFILE_FOLLOW, kwargs={'username': self.user2})
+        )
+        self.client3.get(
+            reverse(PROFILE_FOLLOW, kwargs={'username': self.user2})
+        )
+        self.client2.get(
+            reverse(PROFILE_FOLLOW, kwargs={'username': self.user1})
+        )
+        Post.objects.create(text='Пост', author=self.user2)
+        profile_url = reverse(PROFILE, kwargs={'username': self.user2})
+
+        response = self.client1.get(profile_url)
+        context = response.context
+        self.assertEqual(context['posts_count'], 1)
+        self.assertEqual(context['followers_count'], 2)
+        self.assertEqual(context['following_count'], 1)
+        self.assertTrue(context['following'])
+
+        response = Client().get(profile_url)
+        self.assertFalse(response.context['following'])
+        # Сессия и пользователь, затем автор со счётчиками и страница постов
+        cache.clear()
+        with self.assertNumQueries(4):
+            self.client1.get(profile_url)
+        # Граф подписок и страница постов уже в кеше
+        with self.assertNumQueries(3):
+            self.client1.get(profile_url)
+
+    def test_follow_is_idempotent(self):
+        '''Повторная подписка и подписка на себя не ломаются'''
+        url = reverse(PROFILE_FOLLOW, kwargs={'username': self.user2})
+        self.client1.get(url)
+        self.client1.get(url)
+        self.client1.get(
+            reverse(PROFILE_FOLLOW, kwargs={'username': self.user1})
+        )
+        self.assertEqual(
+            list(Follow.objects.values_list('user', 'author')),
+            [(self.user1.pk, self.user2.pk)],
+        )
+        unfollow_url = reverse(
+            PROFILE_UNFOLLOW, kwargs={'username': self.user2}
+        )
+        self.client1.get(unfollow_url)
+        response = self.client1.get(unfollow_url)
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Follow.objects.exists())
+
+    def test_follow_with_stale_check_does_not_raise(self):
+        '''Подписка, уже сделанная параллельным запросом, не даёт ошибки'''
+        Follow.objects.bulk_create(
+            [Follow(user=self.user1, author=self.user2)]
+        )
+        self.assertEqual(
+            follow_authors(self.user1, [self.user2.pk, self.user3.pk]),
+            ['user3'],
+        )
+        self.assertEqual(Follow.objects.filter(user=self.user1).count(), 2)
+
+    def test_unfollow_sends_post_delete(self):
+        '''Пакетная отписка проходит через сигналы post_delete'''
+        follow_authors(self.user1, [self.user2.pk, self.user3.pk])
+        deleted = []
+
+        def receiver(sender, instance, **kwargs):
+            deleted.append(instance.author_id)
+
+        post_delete.connect(receiver, sender=Follow)
+        self.addCleanup(post_delete.disconnect, receiver, sender=Follow)
+        self.assertEqual(
+            unfollow_authors(self.user1, [self.user2.pk, self.user3.pk]),
+            ['user2', 'user3'],
+        )
+        self.assertEqual(sorted(deleted), [self.user2.pk, self.user3.pk])
+        self.assertEqual(unfollow_authors(self.user1, [self.user2.pk]), [])
+
+    def test_follow_batch_api(self):
+        '''JSON API подписывает и отписывает сразу от нескольких авторов'''
+        Post.objects.create(text='Пост', author=self.user3)
+        url = reverse(FOLLOW_BATCH)
+        response = self.client1.post(
+            url,
+            data=json.dumps({'follow': ['user2', 'user3', 'nobody']}),
+            content_type='application/json',
+        )
+        self.assertEqual(
+            sorted(response.json()['followed']), ['user2', 'user3']
+        )
+        self.assertEqual(
+            len(self.client1.get(reverse(FOLLOW_INDEX)).context['page_obj']),
+            1,
+        )
+        response = self.client1.post(
+            url,
+            data=json.dumps({'follow': ['user2'], 'unfollow': ['user3']}),
+            content_type='application/json',
+        )
+        self.assertEqual(
+            response.json(), {'followed': [], 'unfollowed': ['user3']}
+        )
+        self.assertTrue(self._check_followers_band_is_empty(self.client1))
+
+    def test_follow_batch_api_rejects_bad_requests(self):
+        '''JSON API проверяет вход и тело запроса'''
+        url = reverse(FOLLOW_BATCH)
+        response = Client().post(
+            url, data='{}', content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 401)
+        for body in ('[]', '{"follow": "user2"}', 'не json'):
+            with self.subTest(body=body):
+                response = self.client1.post(
+                    url, data=body, content_type='application/json'
+                )
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client1.get(url).status_code, 405)
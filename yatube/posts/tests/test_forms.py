@@ -1,13 +1,18 @@
 import shutil
 import tempfile
 from http import HTTPStatus
+from io import BytesIO
+from unittest import mock
 
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.test import Client, RequestFactory, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
+from posts.forms import PostForm
 from posts.models import Group, Post, User
+from posts.tests.test_storage import HASHED_IMAGE_NAME
 
 POST_CREATE = 'posts:post_create'
 POST_DETAIL = 'posts:post_detail'
@@ -17,6 +22,7 @@ PROFILE = 'posts:profile'
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class TaskCreateFormTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -81,7 +87,7 @@ class TaskCreateFormTest(TestCase):
         self.assertEqual(test_post.text, 'Текст из формы')
         self.assertEqual(test_post.group.id, self.group.id)
         self.assertEqual(test_post.author, self.user)
-        self.assertTrue(str(test_post.image).startswith('posts/small'))
+        self.assertRegex(test_post.image.name, HASHED_IMAGE_NAME)
         self.assertRedirects(
             response,
             reverse(PROFILE, kwargs={'username': self.user.username}),
@@ -117,3 +123,120 @@ class TaskCreateFormTest(TestCase):
             reverse(POST_DETAIL, kwargs={'post_id': self.first_post.id}),
             HTTPStatus.FOUND
         )
+
+
+EXIF_ORIENTATION = 0x0112
+EXIF_MAKE = 0x010F
+
+
+def camera_photo(name='photo.jpg', size=(3000, 1000)):
+    """JPEG, который камера сняла повёрнутым: поворот только в EXIF."""
+    exif = Image.Exif()
+    exif[EXIF_ORIENTATION] = 6
+    exif[EXIF_MAKE] = 'Camera'
+    content = BytesIO()
+    Image.new('RGB', size, color=(0, 128, 255)).save(
+        content, 'JPEG', exif=exif.tobytes()
+    )
+    return SimpleUploadedFile(
+        name=name, content=content.getvalue(), content_type='image/jpeg'
+    )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageUploadTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='photographer')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def create_post(self, image, text='Пост с фото'):
+        return self.client.post(
+            reverse(POST_CREATE), data={'text': text, 'image': image}
+        )
+
+    def test_photo_is_oriented_downsampled_and_stripped(self):
+        '''Снимок поворачивается, уменьшается и теряет EXIF'''
+        self.create_post(camera_photo())
+        post = Post.objects.get(text='Пост с фото')
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(
+                max(stored.size), settings.POST_IMAGE_MAX_SIDE
+            )
+            # Поворот из EXIF применён: картинка стала вертикальной
+            self.assertGreater(stored.height, stored.width)
+            self.assertEqual(dict(stored.getexif()), {})
+            self.assertEqual(stored.format, 'JPEG')
+
+    def test_identical_uploads_share_a_file(self):
+        '''Одинаковые картинки под разными именами хранятся одним файлом'''
+        self.create_post(camera_photo('a.jpg'), text='Первый')
+        self.create_post(camera_photo('b.jpg'), text='Второй')
+        first = Post.objects.get(text='Первый').image.name
+        second = Post.objects.get(text='Второй').image.name
+        self.assertRegex(first, HASHED_IMAGE_NAME)
+        self.assertEqual(first, second)
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=1000)
+    def test_too_many_pixels(self):
+        '''Картинка больше лимита по пикселям отклоняется'''
+        response = self.create_post(camera_photo())
+        self.assertFalse(Post.objects.filter(text='Пост с фото').exists())
+        self.assertIn('image', response.context['form'].errors)
+
+    def test_truncated_image(self):
+        '''Обрезанный JPEG даёт ошибку формы, а не 500'''
+        photo = camera_photo().read()
+        truncated = SimpleUploadedFile(
+            'cut.jpg', photo[:len(photo) // 2], content_type='image/jpeg'
+        )
+        form = PostForm(
+            data={'text': 'Пост с фото'}, files={'image': truncated}
+        )
+        self.assertFalse(form.is_valid())
+        self.assertIn('повреждена', form.errors['image'][0])
+
+        truncated.seek(0)
+        response = self.create_post(truncated)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertFalse(Post.objects.filter(text='Пост с фото').exists())
+
+    @override_settings(UPLOAD_MAX_BYTES=1024)
+    def test_too_many_bytes(self):
+        '''Файл больше лимита по байтам отклоняется с понятной ошибкой'''
+        response = self.create_post(camera_photo())
+        self.assertFalse(Post.objects.filter(text='Пост с фото').exists())
+        self.assertIn(
+            'Файл больше', response.context['form'].errors['image'][0]
+        )
+
+    @override_settings(UPLOAD_MAX_BYTES=1024)
+    def test_oversized_upload_is_not_read_to_the_end(self):
+        '''Разбор запроса обрывается на файле сверх лимита'''
+        content = b'x' * 1024 * 1024
+        request = RequestFactory().post('/', {
+            'text': 'Пост',
+            'image': SimpleUploadedFile('big.gif', content, 'image/gif'),
+        })
+        payload = request.META['wsgi.input']
+        read = payload.read
+        received = []
+
+        def counting_read(*args):
+            chunk = read(*args)
+            received.append(len(chunk))
+            return chunk
+
+        with mock.patch.object(payload, 'read', side_effect=counting_read):
+            self.assertNotIn('image', request.FILES)
+        self.assertTrue(request.upload_too_large)
+        self.assertLess(sum(received), len(content) // 4)
@@ -0,0 +1,64 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from posts import graph
+from posts.follows import follow_authors, unfollow_authors
+from posts.models import Follow, User
+
+
+class FollowGraphTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.users = [
+            User.objects.create_user(username=f'user{i}') for i in range(4)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        first, second, third, _ = self.users
+        Follow.objects.create(user=first, author=second)
+        Follow.objects.create(user=first, author=third)
+        Follow.objects.create(user=second, author=first)
+
+    def test_adjacency_lists(self):
+        '''Списки подписок отсортированы и читаются из кеша'''
+        first, second, third, _ = self.users
+        self.assertEqual(
+            list(graph.following(first.pk)), sorted([second.pk, third.pk])
+        )
+        self.assertEqual(list(graph.followers(first.pk)), [second.pk])
+        self.assertFalse(graph.is_following(third.pk, first.pk))
+        with self.assertNumQueries(0):
+            self.assertEqual(graph.following_count(first.pk), 2)
+            self.assertEqual(graph.followers_count(first.pk), 1)
+            self.assertTrue(graph.is_following(first.pk, third.pk))
+
+    def test_mutual(self):
+        '''Взаимные подписки'''
+        first, second, _, _ = self.users
+        self.assertEqual(list(graph.mutual(first.pk)), [second.pk])
+
+    def test_follow_changes_invalidate_lists(self):
+        '''Подписка и отписка любым способом сбрасывают списки'''
+        first, second, third, fourth = self.users
+        self.assertEqual(graph.followers_count(fourth.pk), 0)
+        follow_authors(first, [fourth.pk])
+        self.assertEqual(graph.followers_count(fourth.pk), 1)
+        unfollow_authors(first, [fourth.pk, second.pk])
+        self.assertEqual(list(graph.following(first.pk)), [third.pk])
+        Follow.objects.get(user=first, author=third).delete()
+        self.assertEqual(graph.following_count(first.pk), 0)
+
+    @override_settings(FOLLOW_GRAPH_CACHE_MAX_IDS=1)
+    def test_long_lists_are_cached_in_chunks(self):
+        '''Длинные списки кладутся в кеш кусками и тоже сбрасываются'''
+        first, second, third, fourth = self.users
+        graph.following(first.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                list(graph.following(first.pk)),
+                sorted([second.pk, third.pk]),
+            )
+        follow_authors(first, [fourth.pk])
+        self.assertEqual(graph.following_count(first.pk), 3)
@@ -0,0 +1,129 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.counters import recount_posts
+from posts.models import Post, User
+from posts.paginators import (FORWARD, CursorPage, decode_cursor,
+                              encode_cursor)
+from posts.views import POSTS_ON_PAGE
+
+INDEX_PAGE = 'posts:index'
+PROFILE = 'posts:profile'
+POSTS_COUNT = POSTS_ON_PAGE * 2 + 3
+
+
+class CursorPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user1')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.user)
+            for i in range(POSTS_COUNT)
+        )
+        cls.expected = list(
+            Post.objects.order_by('-pub_date', '-pk')
+            .values_list('pk', flat=True)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def _get(self, cursor=''):
+        return self.client.get(reverse(INDEX_PAGE), {'cursor': cursor})
+
+    def test_page_param_keeps_classic_paginator(self):
+        '''Без ?cursor= используется обычная постраничная навигация'''
+        response = self.client.get(reverse(INDEX_PAGE))
+        self.assertNotIsInstance(response.context['page_obj'], CursorPage)
+
+    def test_walk_forward_and_back(self):
+        '''Проходим ленту курсорами вперёд и назад без пропусков'''
+        seen = []
+        pages = []
+        response = self._get()
+        while True:
+            page_obj = response.context['page_obj']
+            self.assertIsInstance(page_obj, CursorPage)
+            pages.append([post.pk for post in page_obj])
+            seen.extend(pages[-1])
+            if not page_obj.has_next():
+                break
+            response = self._get(page_obj.next_cursor)
+        self.assertEqual(seen, self.expected)
+        self.assertEqual(len(pages[-1]), POSTS_COUNT % POSTS_ON_PAGE)
+
+        for expected_page in reversed(pages[:-1]):
+            response = self._get(page_obj.previous_cursor)
+            page_obj = response.context['page_obj']
+            self.assertEqual([post.pk for post in page_obj], expected_page)
+        self.assertFalse(page_obj.has_previous())
+
+    def test_broken_cursor_returns_first_page(self):
+        '''Битый курсор приводит на первую страницу'''
+        self.assertIsNone(decode_cursor('не-курсор'))
+        response = self._get('bm90LWpzb24')
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            self.expected[:POSTS_ON_PAGE],
+        )
+
+    def test_empty_cursor_page_does_not_poison_cache(self):
+        '''Пустая страница по поддельному курсору не попадает в кеш'''
+        oldest = Post.objects.get(pk=self.expected[-1])
+        oldest.pub_date = oldest.pub_date.replace(year=1970)
+        response = self._get(encode_cursor(oldest, FORWARD))
+        self.assertEqual(len(response.context['page_obj']), 0)
+        response = self._get()
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            self.expected[:POSTS_ON_PAGE],
+        )
+        self.assertContains(response, 'Пост ', count=POSTS_ON_PAGE)
+
+    def test_profile_supports_cursor(self):
+        '''Профиль автора тоже умеет курсорную навигацию'''
+        response = self.client.get(
+            reverse(PROFILE, kwargs={'username': self.user.username}),
+            {'cursor': ''},
+        )
+        page_obj = response.context['page_obj']
+        self.assertIsInstance(page_obj, CursorPage)
+        self.assertContains(response, f'?cursor={page_obj.next_cursor}')
+
+    @override_settings(CURSOR_FROM_PAGE=2)
+    def test_deep_numbered_page_links_to_cursor(self):
+        '''С CURSOR_FROM_PAGE «Следующая» переводит ленту на курсоры'''
+        # bulk_create не трогает счётчики постов
+        recount_posts()
+        response = self.client.get(reverse(INDEX_PAGE))
+        self.assertIsNone(response.context['page_obj'].next_cursor())
+        self.assertContains(response, '?page=2')
+
+        response = self.client.get(reverse(INDEX_PAGE), {'page': 2})
+        cursor = response.context['page_obj'].next_cursor()
+        self.assertIsNotNone(cursor)
+        self.assertContains(response, f'?cursor={cursor}')
+        response = self._get(cursor)
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            self.expected[POSTS_ON_PAGE * 2:],
+        )
+
+    @override_settings(CURSOR_FROM_PAGE=2)
+    def test_cached_deep_page_skips_page_query(self):
+        '''Из кеша глубокая страница отдаётся вместе со ссылкой, без OFFSET'''
+        recount_posts()
+        url = reverse(INDEX_PAGE)
+        first = self.client.get(url, {'page': 2})
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(url, {'page': 2})
+        self.assertFalse(
+            [query for query in queries if 'OFFSET' in query['sql']]
+        )
+        cursor = first.context['page_obj'].next_cursor()
+        self.assertContains(second, f'?cursor={cursor}')
@@ -0,0 +1,117 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.profiling import read_folded, self_samples
+from posts.models import User
+
+
+class ProfilingMiddlewareTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        cls.user = User.objects.create_user(username='user')
+
+    def setUp(self):
+        cache.clear()
+        self.profiles = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.profiles, ignore_errors=True)
+        settings = override_settings(
+            PROFILING_DIR=self.profiles, PROFILING_INTERVAL=0.0005
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def profile_files(self, view='posts.index'):
+        directory = os.path.join(self.profiles, view)
+        if not os.path.isdir(directory):
+            return []
+        return [
+            os.path.join(directory, name) for name in os.listdir(directory)
+        ]
+
+    def test_staff_header_profiles_request(self):
+        '''Сотрудник с заголовком X-Profile получает профиль запроса'''
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('posts:index'), HTTP_X_PROFILE='1')
+        files = self.profile_files()
+        self.assertEqual(len(files), 1)
+        self.assertTrue(files[0].endswith('.folded'))
+        self.assertEqual(response['X-Profile-Path'], files[0])
+
+    @override_settings(PROFILING_MAX_FILES=2)
+    def test_old_profiles_are_pruned(self):
+        '''В каталоге представления остаются только последние профили'''
+        self.client.force_login(self.staff)
+        paths = [
+            self.client.get(
+                reverse('posts:index'), HTTP_X_PROFILE='1'
+            )['X-Profile-Path']
+            for _ in range(2)
+        ]
+        # Время изменения первого профиля — заведомо самое раннее
+        os.utime(paths[0], (0, 0))
+        latest = self.client.get(
+            reverse('posts:index'), HTTP_X_PROFILE='1'
+        )['X-Profile-Path']
+        self.assertEqual(
+            sorted(self.profile_files()), sorted([paths[1], latest])
+        )
+
+    def test_cprofile_mode(self):
+        '''Заголовок X-Profile: cprofile сохраняет дамп pstats'''
+        self.client.force_login(self.staff)
+        self.client.get(reverse('posts:index'), HTTP_X_PROFILE='cprofile')
+        files = self.profile_files()
+        self.assertEqual(len(files), 1)
+        self.assertTrue(files[0].endswith('.prof'))
+
+    def test_header_ignored_for_regular_users(self):
+        '''Заголовок X-Profile от обычного пользователя не действует'''
+        self.client.force_login(self.user)
+        response = self.client.get(
+            reverse('posts:index'), HTTP_X_PROFILE='1'
+        )
+        self.assertFalse(response.has_header('X-Profile-Path'))
+        self.assertEqual(self.profile_files(), [])
+
+    def test_sample_rate(self):
+        '''Случайная доля запросов профилируется без заголовка'''
+        with override_settings(PROFILING_SAMPLE_RATE=1):
+            response = self.client.get(reverse('posts:index'))
+        self.assertEqual(len(self.profile_files()), 1)
+        # Путь к файлу показывается только сотрудникам
+        self.assertFalse(response.has_header('X-Profile-Path'))
+
+    def test_aggregate_profiles(self):
+        '''Команда складывает профили представления в один флеймграф'''
+        self.client.force_login(self.staff)
+        for _ in range(2):
+            self.client.get(reverse('posts:index'), HTTP_X_PROFILE='1')
+        self.client.get(reverse('posts:index'), HTTP_X_PROFILE='cprofile')
+        output = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output, ignore_errors=True)
+        out = StringIO()
+        call_command(
+            'aggregate_profiles', view=['posts:index'], output=output,
+            stdout=out,
+        )
+        self.assertIn('posts.index: профилей 2', out.getvalue())
+        self.assertIn('профилей cProfile 1', out.getvalue())
+        merged = read_folded(os.path.join(output, 'posts.index.folded'))
+        expected = sum(
+            sum(read_folded(path).values())
+            for path in self.profile_files() if path.endswith('.folded')
+        )
+        self.assertEqual(sum(merged.values()), expected)
+
+    def test_self_samples(self):
+        '''Собственное время считается по вершине стека'''
+        stacks = {'a;b;c': 3, 'a;b': 2, 'x;c': 1}
+        self.assertEqual(self_samples(stacks), {'c': 4, 'b': 2})
@@ -0,0 +1,93 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.testing import QueryBudgetMixin
+from posts.models import Comment, Follow, Group, Post, User
+from posts.views import POSTS_ON_PAGE
+
+POSTS_COUNT = POSTS_ON_PAGE + 5
+
+
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    # Бюджеты для промаха кеша: сессия, пользователь, счётчики, страница
+    query_budgets = {
+        'posts:index': 4,
+        'posts:group_list': 5,
+        'posts:profile': 4,
+        'posts:post_detail': 5,
+        'posts:follow_index': 6,
+    }
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.groups = [
+            Group.objects.create(
+                title=f'Группа {i}', slug=f'group_{i}', description='Описание'
+            )
+            for i in range(2)
+        ]
+        cls.authors = [
+            User.objects.create_user(username=f'author{i}') for i in range(3)
+        ]
+        for author in cls.authors:
+            Follow.objects.create(user=cls.reader, author=author)
+        for i in range(POSTS_COUNT):
+            post = Post.objects.create(
+                text=f'Пост {i}',
+                author=cls.authors[i % len(cls.authors)],
+                group=cls.groups[i % len(cls.groups)],
+            )
+            Comment.objects.create(
+                post=post, author=cls.authors[0], text='Комментарий'
+            )
+        cls.post = post
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def _get(self, url):
+        cache.clear()
+        return self.client.get(url)
+
+    def test_views_fit_query_budgets(self):
+        '''Представления укладываются в бюджет запросов при пустом кеше'''
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'group_0'}),
+            reverse('posts:profile', kwargs={'username': 'author0'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self._get(url)
+                self.assertQueryBudget(response)
+                self.assertFalse(response.query_stats.duplicates)
+
+    def test_server_timing_header(self):
+        '''Ответ содержит заголовок Server-Timing с временем базы'''
+        response = self._get(reverse('posts:index'))
+        self.assertTrue(response['Server-Timing'].startswith('db;dur='))
+        self.assertEqual(response.query_stats.view_name, 'posts:index')
+
+    def test_stats_are_opt_in(self):
+        '''Без QUERY_STATS запросы не считаются'''
+        with self.settings(QUERY_STATS=False):
+            response = self._get(reverse('posts:index'))
+        self.assertFalse(hasattr(response, 'query_stats'))
+        self.assertNotIn('db;dur=', response.get('Server-Timing', ''))
+
+    def test_duplicates_are_reported(self):
+        '''Повторяющиеся запросы попадают в отчёт и в сообщение теста'''
+        response = self._get(reverse('posts:index'))
+        stats = response.query_stats
+        execute = lambda *args: None  # noqa: E731
+        stats(execute, 'SELECT 1 WHERE id = %s', (1,), False, {})
+        stats(execute, 'SELECT 1 WHERE id = %s', (2,), False, {})
+        self.assertEqual(list(stats.duplicates.values()), [2])
+        with self.assertRaises(AssertionError):
+            self.assertQueryBudget(response, budget=0)
@@ -0,0 +1,136 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Post, User
+from posts.search import SearchPage, ranked_ids
+from posts.stemming import stem, stem_text
+from posts.views import POSTS_ON_PAGE
+
+SEARCH_PAGE = 'posts:search'
+
+
+class StemmerTest(TestCase):
+    def test_word_forms_share_stem(self):
+        '''Формы одного слова сводятся к одной основе'''
+        cases = {
+            'кошка': 'кошк',
+            'кошками': 'кошк',
+            'красивая': 'красив',
+            'программирование': 'программирован',
+            'ёлки': 'елк',
+            'важнейший': 'важн',
+        }
+        for word, expected in cases.items():
+            with self.subTest(word=word):
+                self.assertEqual(stem(word), expected)
+
+    def test_stem_text_drops_punctuation(self):
+        '''Знаки препинания не попадают в индекс'''
+        self.assertEqual(stem_text('Кошки, собаки!'), 'кошк собак')
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user1')
+
+    def setUp(self):
+        self.client = Client()
+
+    def _found(self, query):
+        return [pk for pk, _ in ranked_ids(query, 100)]
+
+    def test_finds_other_word_forms(self):
+        '''Поиск находит пост по другой форме слова'''
+        post = Post.objects.create(text='Моя кошка спит', author=self.user)
+        Post.objects.create(text='Про собак', author=self.user)
+        self.assertEqual(self._found('кошками'), [post.pk])
+
+    def test_all_words_must_match(self):
+        '''Пост должен содержать все слова запроса'''
+        post = Post.objects.create(text='Рыжая кошка', author=self.user)
+        Post.objects.create(text='Рыжая собака', author=self.user)
+        self.assertEqual(self._found('рыжие кошки'), [post.pk])
+
+    def test_results_are_ranked(self):
+        '''Более релевантные посты идут первыми'''
+        weak = Post.objects.create(
+            text='Кошка и ещё много разных слов про погоду и город',
+            author=self.user,
+        )
+        strong = Post.objects.create(text='Кошка кошки', author=self.user)
+        self.assertEqual(self._found('кошка'), [strong.pk, weak.pk])
+
+    def test_index_follows_edit_and_delete(self):
+        '''Правка и удаление поста обновляют индекс'''
+        post = Post.objects.create(text='Кошка', author=self.user)
+        post.text = 'Собака'
+        post.save()
+        self.assertEqual(self._found('кошка'), [])
+        self.assertEqual(self._found('собака'), [post.pk])
+        post.delete()
+        self.assertEqual(self._found('собака'), [])
+
+    def test_keyset_pages_cover_all_results(self):
+        '''Порции «показать ещё» не теряют и не повторяют посты'''
+        posts = [
+            Post.objects.create(text=f'Кошка {i}', author=self.user)
+            for i in range(POSTS_ON_PAGE * 2 + 3)
+        ]
+        seen = []
+        after = None
+        while True:
+            page = SearchPage('кошка', POSTS_ON_PAGE, after=after)
+            seen.extend(post.pk for post in page)
+            after = page.next_after()
+            if after is None:
+                break
+        self.assertEqual(sorted(seen), sorted(post.pk for post in posts))
+
+    def test_search_view(self):
+        '''Страница поиска показывает найденные посты'''
+        Post.objects.create(text='Кошка спит', author=self.user)
+        Post.objects.create(text='Собака лает', author=self.user)
+        response = self.client.get(reverse(SEARCH_PAGE), {'q': 'кошки'})
+        self.assertEqual(
+            [post.text for post in response.context['page_obj']],
+            ['Кошка спит'],
+        )
+        response = self.client.get(reverse(SEARCH_PAGE), {'q': '!!!'})
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    def test_broken_after_token_starts_over(self):
+        '''Битый токен позиции показывает первую порцию'''
+        Post.objects.create(text='Кошка', author=self.user)
+        response = self.client.get(
+            reverse(SEARCH_PAGE), {'q': 'кошка', 'after': 'мусор'}
+        )
+        self.assertEqual(len(response.context['page_obj']), 1)
+
+    def test_admin_search_uses_index(self):
+        '''Поиск в админке идёт по индексу'''
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        post = Post.objects.create(text='Кошка спит', author=self.user)
+        Post.objects.create(text='Собака лает', author=self.user)
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'кошки'}
+        )
+        self.assertEqual(
+            list(response.context['cl'].result_list), [post]
+        )
+
+    def test_rebuild_indexes_bulk_created_posts(self):
+        '''Команда переиндексации подхватывает посты из bulk_create'''
+        Post.objects.bulk_create(
+            [Post(text='Кошка', author=self.user)]
+        )
+        self.assertEqual(self._found('кошка'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(len(self._found('кошка')), 1)
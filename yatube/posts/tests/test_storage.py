@@ -0,0 +1,162 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from core.models import FileClaim
+from core.storage import ContentAddressedStorage, hashed_name
+from posts.images import release_image
+from posts.models import Post, User
+from posts.tests.test_thumbnails import make_image
+from posts.thumbnails import generate_thumbnails
+
+HASHED_IMAGE_NAME = r'^posts/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.\w+$'
+
+
+class ContentAddressedStorageTest(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.storage = ContentAddressedStorage(location=self.root)
+
+    def test_name_is_sharded_content_hash(self):
+        '''Файл называется хешем содержимого и лежит в подкаталогах'''
+        name = self.storage.save('posts/photo.JPG', ContentFile(b'data'))
+        self.assertRegex(name, HASHED_IMAGE_NAME)
+        digest = os.path.splitext(os.path.basename(name))[0]
+        self.assertEqual(
+            name, f'posts/{digest[:2]}/{digest[2:4]}/{digest}.jpg'
+        )
+        with self.storage.open(name) as stored:
+            self.assertEqual(stored.read(), b'data')
+
+    def test_identical_content_is_stored_once(self):
+        '''Одинаковое содержимое под разными именами — один файл'''
+        first = self.storage.save('posts/a.png', ContentFile(b'same'))
+        second = self.storage.save('posts/b.png', ContentFile(b'same'))
+        other = self.storage.save('posts/c.png', ContentFile(b'other'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        files = [
+            name for _, _, names in os.walk(self.root) for name in names
+        ]
+        self.assertEqual(len(files), 2)
+
+    def test_precomputed_hash_is_used(self):
+        '''Готовый content_hash загрузки не пересчитывается'''
+        content = ContentFile(b'data')
+        content.content_hash = 'ab' * 32
+        name = self.storage.save('posts/x.gif', content)
+        self.assertEqual(name, hashed_name('posts/x.gif', 'ab' * 32))
+
+
+class ReleaseImageTest(TransactionTestCase):
+    '''Файл удаляется после коммита, когда на него не ссылается ни один пост'''
+
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(
+            MEDIA_ROOT=self.media_root, THUMBNAIL_ASYNC=False
+        )
+        media.enable()
+        self.addCleanup(media.disable)
+        self.user = User.objects.create_user(username='author')
+
+    def create_post(self, text, color=(255, 0, 0)):
+        return Post.objects.create(
+            text=text, author=self.user,
+            image=make_image(f'{text}.png', color=color),
+        )
+
+    def test_shared_file_survives_until_last_post(self):
+        '''Общий файл живёт, пока на него ссылается хотя бы один пост'''
+        first = self.create_post('first')
+        second = self.create_post('second')
+        self.assertEqual(first.image.name, second.image.name)
+        path = first.image.path
+
+        first.delete()
+        self.assertTrue(os.path.exists(path))
+        second.delete()
+        self.assertFalse(os.path.exists(path))
+
+    def test_replaced_image_is_released_with_thumbnails(self):
+        '''Заменённая картинка удаляется вместе с миниатюрами'''
+        post = self.create_post('post')
+        generate_thumbnails(post.pk)
+        post.refresh_from_db()
+        old_path = post.image.path
+        thumbnail = os.path.join(
+            self.media_root, post.thumbnail_data['card']['url'].split(
+                '/media/', 1
+            )[1]
+        )
+        self.assertTrue(os.path.exists(thumbnail))
+
+        post.image = make_image('new.png', color=(0, 255, 0))
+        post.save()
+        self.assertFalse(os.path.exists(old_path))
+        self.assertFalse(os.path.exists(thumbnail))
+        self.assertTrue(os.path.exists(post.image.path))
+
+    def test_missing_file_is_not_an_error(self):
+        '''Файл вне MEDIA_ROOT или уже удалённый не мешает удалить пост'''
+        self.assertFalse(release_image('/elsewhere/photo.jpg'))
+        # Миниатюры отсутствующего файла здесь не нужны
+        with mock.patch('posts.signals.schedule_thumbnails'):
+            post = Post.objects.create(
+                text='post', author=self.user, image='posts/missing.jpg'
+            )
+        post.delete()
+        self.assertFalse(Post.objects.exists())
+
+    def test_claims_are_settled_after_commit(self):
+        '''Заявка хранилища закрывается, когда пост закоммичен'''
+        self.create_post('post')
+        self.assertFalse(FileClaim.objects.exists())
+
+    def test_rolled_back_post_leaves_no_claim(self):
+        '''Откат транзакции поста откатывает и заявку на его картинку'''
+        # Пост падает уже после записи файла и заведения заявки
+        with mock.patch(
+            'posts.search.index_post', side_effect=RuntimeError
+        ):
+            with self.assertRaises(RuntimeError):
+                self.create_post('post')
+        self.assertFalse(Post.objects.exists())
+        self.assertFalse(FileClaim.objects.exists())
+
+    def test_pending_upload_keeps_shared_file(self):
+        '''Файл не удаляется, пока загрузка с тем же содержимым не сохранена'''
+        first = self.create_post('first')
+        path = first.image.path
+        # Вторая загрузка уже нашла файл, но её пост ещё не записан
+        name = default_storage.save('posts/second.png', make_image('b.png'))
+        self.assertEqual(name, first.image.name)
+
+        first.delete()
+        self.assertTrue(os.path.exists(path))
+        second = Post.objects.create(text='second', author=self.user)
+        second.image = name
+        second.save()
+        second.delete()
+        # Заявку незаписанной загрузки никто не закрыл: файл остаётся
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(FileClaim.objects.get(name=name).count, 1)
+
+    def test_upload_after_release_writes_file_again(self):
+        '''Загрузка после удаления общего файла записывает его заново'''
+        post = self.create_post('post')
+        path = post.image.path
+        post.delete()
+        self.assertFalse(os.path.exists(path))
+        again = self.create_post('again')
+        self.assertEqual(again.image.path, path)
+        self.assertTrue(os.path.exists(path))
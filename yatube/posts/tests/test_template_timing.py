@@ -0,0 +1,109 @@
+import threading
+
+from django.core.cache import cache
+from django.template import engines
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.template_timing import (TimedTemplate, reset_template_stats,
+                                  template_stats)
+from posts.models import Post, User
+
+
+class TemplateTimingTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Пост {number}')
+            for number in range(3)
+        )
+
+    def setUp(self):
+        cache.clear()
+        reset_template_stats()
+
+    def test_loader_returns_timed_templates(self):
+        '''Шаблоны из загрузчика замеряют свой рендер'''
+        template = engines['django'].engine.get_template(
+            'posts/includes/post.html'
+        )
+        self.assertIsInstance(template, TimedTemplate)
+
+    def test_renders_are_counted_per_template_and_include(self):
+        '''Каждый шаблон и каждое вложение считаются отдельно'''
+        self.client.get(reverse('posts:index'))
+        stats = template_stats()
+        self.assertEqual(
+            stats['templates']['posts/includes/post.html']['calls'], 3
+        )
+        self.assertEqual(stats['templates']['posts/index.html']['calls'], 1)
+        self.assertEqual(
+            stats['includes'][
+                'posts/index.html > base.html > posts/includes/post.html'
+            ]['calls'],
+            3,
+        )
+        self.assertIn(
+            'posts/index.html > base.html > includes/header.html',
+            stats['includes'],
+        )
+        page = stats['templates']['posts/index.html']
+        self.assertLessEqual(page['self_ms'], page['total_ms'])
+
+    @override_settings(SERVER_TIMING_PUBLIC=False)
+    def test_server_timing_header(self):
+        '''Время рендера попадает в Server-Timing рядом с запросами к базе'''
+        self.client.force_login(
+            User.objects.create_user(username='staff', is_staff=True)
+        )
+        response = self.client.get(reverse('posts:index'))
+        server_timing = response['Server-Timing']
+        self.assertIn('db;dur=', server_timing)
+        self.assertIn('tpl;dur=', server_timing)
+        self.assertIn('template renders', server_timing)
+
+    @override_settings(SERVER_TIMING_PUBLIC=False)
+    def test_server_timing_is_hidden_from_visitors(self):
+        '''Посетителям имена шаблонов и число запросов не показываются'''
+        for login in (False, True):
+            with self.subTest(login=login):
+                if login:
+                    self.client.force_login(self.user)
+                response = self.client.get(reverse('posts:index'))
+                self.assertFalse(response.has_header('Server-Timing'))
+
+    def test_threads_are_summed(self):
+        '''Итоги потоков копятся отдельно и складываются в сводке'''
+        template = engines['django'].from_string('{{ value }}')
+        template.template.__class__ = TimedTemplate
+        threads = [
+            threading.Thread(target=template.render, args=({'value': 1},))
+            for _ in range(3)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        template.render({'value': 2})
+        self.assertEqual(template_stats()['templates']['<string>']['calls'], 4)
+
+    @override_settings(TEMPLATE_TIMING=False)
+    def test_timing_can_be_disabled(self):
+        '''Без TEMPLATE_TIMING рендер не замеряется'''
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(template_stats()['templates'], {})
+        self.assertNotIn('tpl;dur=', response.get('Server-Timing', ''))
+
+    def test_stats_view_is_staff_only(self):
+        '''Сводка по шаблонам доступна только персоналу'''
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('template_stats'))
+        self.assertEqual(response.status_code, 302)
+
+        self.client.force_login(
+            User.objects.create_user(username='staff', is_staff=True)
+        )
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(reverse('template_stats'))
+        self.assertIn('posts/index.html', response.json()['templates'])
@@ -0,0 +1,214 @@
+import json
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image, JpegImagePlugin
+
+from posts import feed_cache
+from posts.image_variants import supported_formats
+from posts.models import Post, User
+from posts.thumbnails import generate_thumbnails
+
+INDEX_PAGE = 'posts:index'
+POST_CREATE = 'posts:post_create'
+POST_EDIT = 'posts:post_edit'
+PROFILE = 'posts:profile'
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def make_image(name, size=(100, 50), color=(255, 0, 0)):
+    content = BytesIO()
+    Image.new('RGB', size, color=color).save(content, 'PNG')
+    return SimpleUploadedFile(
+        name=name, content=content.getvalue(), content_type='image/png'
+    )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_ASYNC=False)
+class ThumbnailTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user1')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_upload_schedules_thumbnails(self):
+        '''Создание поста с картинкой ставит миниатюры в очередь'''
+        with mock.patch('posts.signals.schedule_thumbnails') as schedule:
+            self.client.post(
+                reverse(POST_CREATE),
+                data={'text': 'Пост с картинкой', 'image': make_image('a.png')}
+            )
+        post = Post.objects.get(text='Пост с картинкой')
+        schedule.assert_called_once_with(post)
+
+    def test_edit_without_new_image_keeps_thumbnails(self):
+        '''Правка текста не пересчитывает миниатюры'''
+        post = Post.objects.create(
+            text='Пост', author=self.user, image=make_image('b.png')
+        )
+        with mock.patch('posts.signals.schedule_thumbnails') as schedule:
+            self.client.post(
+                reverse(POST_EDIT, kwargs={'post_id': post.pk}),
+                data={'text': 'Новый текст'}
+            )
+        schedule.assert_not_called()
+
+    def test_saving_new_image_anywhere_schedules_thumbnails(self):
+        '''Картинка, сохранённая не через форму, тоже получает миниатюры'''
+        with mock.patch('posts.signals.schedule_thumbnails') as schedule:
+            post = Post.objects.create(
+                text='Пост', author=self.user, image=make_image('i.png')
+            )
+            schedule.assert_called_once_with(post)
+            post.thumbnails = json.dumps({'card': {'url': '/media/old.jpg'}})
+            post.save()
+            schedule.assert_called_once()
+
+            post.image = make_image('j.png', color=(0, 0, 255))
+            post.save()
+        self.assertEqual(schedule.call_count, 2)
+        post.refresh_from_db()
+        self.assertEqual(post.thumbnails, '')
+
+    def test_generated_thumbnails_are_rendered(self):
+        '''Лента автора показывает готовую миниатюру с размерами'''
+        post = Post.objects.create(
+            text='Пост', author=self.user, image=make_image('c.png')
+        )
+        profile = reverse(PROFILE, kwargs={'username': self.user.username})
+        self.client.get(profile)
+        global_version = feed_cache.feed_version(feed_cache.GLOBAL)
+        generate_thumbnails(post.pk)
+
+        # Главная не сбрасывается ради миниатюр одного поста
+        self.assertEqual(
+            feed_cache.feed_version(feed_cache.GLOBAL), global_version
+        )
+        post.refresh_from_db()
+        card = post.thumbnail_data['card']
+        self.assertEqual((card['width'], card['height']), (960, 339))
+        response = self.client.get(profile)
+        self.assertContains(response, card['url'])
+        self.assertContains(response, 'width="960"')
+
+    def test_image_without_thumbnails_falls_back_to_original(self):
+        '''Пока миниатюры не готовы, показывается исходная картинка'''
+        post = Post.objects.create(
+            text='Пост', author=self.user, image=make_image('d.png')
+        )
+        response = self.client.get(reverse(INDEX_PAGE))
+        self.assertContains(response, post.image.url)
+
+    def test_variants_cover_widths_and_record_sizes(self):
+        '''Варианты всех ширин попадают в srcset и знают свой вес'''
+        post = Post.objects.create(
+            text='Пост', author=self.user,
+            image=make_image('e.png', size=(2000, 1000)),
+        )
+        generate_thumbnails(post.pk)
+
+        post.refresh_from_db()
+        card = post.thumbnail_data['card']
+        for width in settings.IMAGE_VARIANT_WIDTHS:
+            self.assertIn(f' {width}w', card['srcset'])
+        # Ширина 960 в основном формате — сама миниатюра card
+        self.assertEqual(
+            len(card['variants']),
+            len(settings.IMAGE_VARIANT_WIDTHS) * (1 + len(supported_formats()))
+            - 1
+        )
+        self.assertEqual(card['srcset'].count(' 960w'), 1)
+        for variant in card['variants']:
+            self.assertGreater(variant['bytes'], 0)
+            self.assertIn('saving', variant)
+        self.assertEqual(
+            [source['type'] for source in card['sources']],
+            [f'image/{name.lower()}' for name in supported_formats()],
+        )
+
+    def test_variants_are_not_upscaled(self):
+        '''Маленькая картинка не растягивается до широких вариантов'''
+        post = Post.objects.create(
+            text='Пост', author=self.user, image=make_image('f.png')
+        )
+        generate_thumbnails(post.pk)
+
+        post.refresh_from_db()
+        card = post.thumbnail_data['card']
+        widths = {variant['width'] for variant in card['variants']}
+        self.assertLessEqual(max(widths), 100)
+        self.assertNotIn('1440w', card['srcset'])
+
+    @override_settings(IMAGE_VARIANT_FORMATS=('WEBP',))
+    def test_modern_format_sources(self):
+        '''WebP попадает в <source> отдельным srcset с расширением .webp'''
+        # Сборка Pillow может не уметь WebP: кодировщик подменяется
+        # JPEG-кодировщиком, важны только имена файлов и разметка
+        with mock.patch.dict(Image.SAVE, {'WEBP': JpegImagePlugin._save}):
+            post = Post.objects.create(
+                text='Пост', author=self.user,
+                image=make_image('h.png', size=(2000, 1000)),
+            )
+            generate_thumbnails(post.pk)
+
+        post.refresh_from_db()
+        card = post.thumbnail_data['card']
+        webp = [
+            variant for variant in card['variants']
+            if variant['type'] == 'image/webp'
+        ]
+        self.assertEqual(
+            [variant['width'] for variant in webp],
+            list(settings.IMAGE_VARIANT_WIDTHS),
+        )
+        for variant in webp:
+            self.assertTrue(variant['url'].endswith('.webp'))
+        self.assertEqual(card['sources'][0]['type'], 'image/webp')
+        self.assertIn('.webp 960w', card['sources'][0]['srcset'])
+        self.assertNotIn('.webp', card['srcset'])
+
+    @override_settings(IMAGE_VARIANT_FORMATS=('NOPE',))
+    def test_unsupported_formats_are_skipped(self):
+        '''Форматы, которые Pillow не сохраняет, пропускаются'''
+        self.assertEqual(supported_formats(), ())
+
+    def test_picture_markup(self):
+        '''Лента отдаёт <picture> с источниками и srcset'''
+        Post.objects.create(
+            text='Пост', author=self.user, image='posts/g.png',
+            thumbnails=json.dumps({'card': {
+                'url': '/media/card.jpg', 'width': 960, 'height': 339,
+                'srcset': '/media/480.jpg 480w, /media/card.jpg 960w',
+                'sources': [{
+                    'type': 'image/webp',
+                    'srcset': '/media/480.webp 480w, /media/960.webp 960w',
+                }],
+            }}),
+        )
+        response = self.client.get(reverse(INDEX_PAGE))
+        self.assertContains(response, '<picture>')
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(
+            response, 'srcset="/media/480.webp 480w, /media/960.webp 960w"'
+        )
+        self.assertContains(
+            response, 'srcset="/media/480.jpg 480w, /media/card.jpg 960w"'
+        )
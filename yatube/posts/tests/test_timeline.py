@@ -0,0 +1,69 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from posts.models import Follow, Post, TimelineEntry, User
+from posts.timeline import timeline_posts
+
+
+@override_settings(TIMELINE_FANOUT_LIMIT=2)
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader1 = User.objects.create_user(username='reader1')
+        cls.reader2 = User.objects.create_user(username='reader2')
+
+    def setUp(self):
+        cache.clear()
+
+    def _feed(self, user):
+        return set(timeline_posts(user).values_list('pk', flat=True))
+
+    def test_post_is_fanned_out_to_followers(self):
+        '''Новый пост попадает в материализованную ленту подписчика'''
+        Follow.objects.create(user=self.reader1, author=self.author)
+        post = Post.objects.create(text='Тестовый пост', author=self.author)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.reader1, post=post).exists()
+        )
+        self.assertEqual(self._feed(self.reader1), {post.pk})
+        self.assertEqual(self._feed(self.reader2), set())
+
+    def test_follow_and_unfollow_rebuild_timeline(self):
+        '''Подписка дозаполняет ленту старыми постами, отписка чистит её'''
+        post = Post.objects.create(text='Тестовый пост', author=self.author)
+        follow = Follow.objects.create(user=self.reader1, author=self.author)
+        self.assertEqual(self._feed(self.reader1), {post.pk})
+        follow.delete()
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader1))
+        self.assertEqual(self._feed(self.reader1), set())
+
+    def test_heavy_author_is_pulled_on_read(self):
+        '''Посты автора с множеством подписчиков докладываются при чтении'''
+        Follow.objects.create(user=self.reader1, author=self.author)
+        Follow.objects.create(user=self.reader2, author=self.author)
+        post = Post.objects.create(text='Тестовый пост', author=self.author)
+        self.assertFalse(TimelineEntry.objects.filter(post=post))
+        self.assertEqual(self._feed(self.reader1), {post.pk})
+        self.assertEqual(
+            set(TimelineEntry.objects.values_list('user', flat=True)),
+            {self.reader1.pk},
+        )
+        later = Post.objects.create(text='Второй пост', author=self.author)
+        self.assertEqual(self._feed(self.reader1), {post.pk, later.pk})
+        self.assertEqual(self._feed(self.reader2), {post.pk, later.pk})
+
+        Follow.objects.filter(user=self.reader2).delete()
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader2))
+        self.assertEqual(self._feed(self.reader1), {post.pk, later.pk})
+
+    def test_new_follower_of_heavy_author_gets_old_posts(self):
+        '''Подписка на тяжёлого автора дозаполняет ленту его постами'''
+        reader3 = User.objects.create_user(username='reader3')
+        Follow.objects.create(user=self.reader1, author=self.author)
+        Follow.objects.create(user=self.reader2, author=self.author)
+        post = Post.objects.create(text='Тестовый пост', author=self.author)
+        self._feed(reader3)
+        Follow.objects.create(user=reader3, author=self.author)
+        self.assertEqual(self._feed(reader3), {post.pk})
@@ -4,11 +4,15 @@ from itertools import zip_longest
 
 from django import forms
 from django.conf import settings
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from posts.models import Group, Post, User
+from posts.counters import recount_posts
+from posts.models import Comment, Group, Post, User
 from posts.views import POSTS_ON_PAGE
 
 POST_CREATE = 'posts:post_create'
@@ -18,6 +22,7 @@ PROFILE = 'posts:profile'
 INDEX_PAGE = 'posts:index'
 GROUP_LIST = 'posts:group_list'
 ADD_COMMENT = 'posts:add_comment'
+COMMENTS_ON_PAGE = 5
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -71,7 +76,7 @@ class PostTests(TestCase):
         self.assertEqual(post_text, 'Тестовый пост')
         self.assertEqual(post_pubdate, self.post.pub_date)
         self.assertEqual(post_author.username, 'user1')
-        self.assertEqual(post_image, 'posts/small.gif')
+        self.assertEqual(post_image, self.post.image.name)
 
     def _test_post_form(self, response):
         form_fields = {
@@ -192,6 +197,8 @@ class PaginatorViewsTest(TestCase):
             )
             cls.posts.append(post)
         Post.objects.bulk_create(cls.posts)
+        # bulk_create не вызывает сигналы, счётчики постов пересчитываем
+        recount_posts()
 
     def setUp(self):
         self.client = Client()
@@ -355,3 +362,64 @@ class CommentTest(TestCase):
             count_comments_before_commenting + 1,
             self.post.comments.count()
         )
+
+
+@override_settings(COMMENTS_ON_PAGE=COMMENTS_ON_PAGE)
+class PostDetailCommentsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user5')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def _add_comments(self, count):
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.user, text=f'Комментарий {i}')
+            for i in range(count)
+        )
+
+    def _count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        return response, len(queries)
+
+    def test_comments_render_in_constant_queries(self):
+        '''Число запросов не зависит от количества комментариев'''
+        url = reverse(POST_DETAIL, kwargs={'post_id': self.post.pk})
+        self._add_comments(2)
+        _, few_queries = self._count_queries(url)
+        self._add_comments(COMMENTS_ON_PAGE * 2)
+        _, many_queries = self._count_queries(url)
+        self.assertEqual(few_queries, many_queries)
+
+    def test_load_more_comments(self):
+        '''Комментарии подгружаются порциями по ссылке «показать ещё»'''
+        self._add_comments(COMMENTS_ON_PAGE + 3)
+        url = reverse(POST_DETAIL, kwargs={'post_id': self.post.pk})
+        response = self.client.get(url)
+        comments_page = response.context['comments_page']
+        self.assertEqual(len(comments_page), COMMENTS_ON_PAGE)
+        self.assertTrue(comments_page.has_next())
+
+        response = self.client.get(
+            url, {'comments_after': comments_page.next_after()}
+        )
+        comments_page = response.context['comments_page']
+        self.assertEqual(len(comments_page), 3)
+        self.assertFalse(comments_page.has_next())
+        self.assertContains(response, f'Комментарий {COMMENTS_ON_PAGE + 2}')
+
+    def test_bad_comments_after_is_ignored(self):
+        '''Непонятный comments_after показывает комментарии с начала'''
+        self._add_comments(3)
+        url = reverse(POST_DETAIL, kwargs={'post_id': self.post.pk})
+        for value in ('²', '-', 'abc', str(2 ** 70)):
+            with self.subTest(value=value):
+                response = self.client.get(url, {'comments_after': value})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.context['comments_page']), 3)
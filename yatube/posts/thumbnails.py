@@ -0,0 +1,137 @@
+import hashlib
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from sorl.thumbnail import get_thumbnail
+from sorl.thumbnail.images import ImageFile
+
+from . import feed_cache
+from .image_variants import render_variants, variant_specs
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails',
+        )
+    return _executor
+
+
+def source_file(image):
+    """Картинка поста для sorl — в хранилище поля Post.image.
+
+    Ключ исходника в KV-хранилище sorl зависит от класса хранилища,
+    а у sorl своё хранилище для миниатюр. Без явного хранилища имя
+    картинки и FieldFile дали бы разные ключи.
+    """
+    return ImageFile(
+        getattr(image, 'name', image), Post._meta.get_field('image').storage
+    )
+
+
+def thumbnail_spec(geometry, options):
+    """Отпечаток геометрии вместе с её вариантами ширин и форматов.
+
+    Записывается рядом с миниатюрами: по нему видно, что миниатюры
+    поста посчитаны по нынешним настройкам.
+    """
+    specs = [(geometry, options), *variant_specs(geometry, options)]
+    return hashlib.md5(
+        json.dumps(specs, sort_keys=True).encode()
+    ).hexdigest()[:12]
+
+
+def render_thumbnails(image):
+    """Создаёт миниатюры всех геометрий из THUMBNAIL_GEOMETRIES.
+
+    Кроме основной миниатюры, у каждой геометрии есть варианты других
+    ширин и форматов для srcset и <picture>.
+    """
+    image = source_file(image)
+    thumbnails = {}
+    for name, (geometry, options) in settings.THUMBNAIL_GEOMETRIES.items():
+        thumbnail = get_thumbnail(image, geometry, **options)
+        thumbnails[name] = {
+            'url': thumbnail.url,
+            'width': thumbnail.width,
+            'height': thumbnail.height,
+            'spec': thumbnail_spec(geometry, options),
+            **render_variants(image, geometry, options, thumbnail),
+        }
+    return thumbnails
+
+
+def thumbnails_current(post):
+    """Записаны ли у поста миниатюры всех нынешних геометрий."""
+    thumbnails = post.thumbnail_data
+    return all(
+        thumbnails.get(name, {}).get('spec')
+        == thumbnail_spec(geometry, options)
+        for name, (geometry, options) in settings.THUMBNAIL_GEOMETRIES.items()
+    )
+
+
+def save_thumbnails(post, thumbnails, bump=True):
+    """Сохраняет миниатюры, если картинка поста с тех пор не менялась.
+
+    Ленты поста, автора и группы сбрасываются сразу, а без bump это
+    остаётся вызывающему: warm_thumbnails сбрасывает ленты раз на пачку.
+    """
+    updated = Post.objects.filter(pk=post.pk, image=post.image.name).update(
+        thumbnails=json.dumps(thumbnails) if thumbnails else ''
+    )
+    if updated and bump:
+        feed_cache.bump_post_page_feeds(post)
+    return bool(updated)
+
+
+def generate_thumbnails(post_id):
+    post = (
+        Post.objects
+        .filter(pk=post_id)
+        .only('pk', 'image', 'author_id', 'group_id')
+        .first()
+    )
+    if post is None:
+        return
+    thumbnails = render_thumbnails(post.image) if post.image else {}
+    # Картинку могли заменить, пока считались миниатюры: тогда результат
+    # устарел, а новые миниатюры посчитает следующая задача
+    save_thumbnails(post, thumbnails)
+
+
+def _run(post_id):
+    try:
+        generate_thumbnails(post_id)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры поста %s', post_id)
+
+
+def _run_in_worker(post_id):
+    try:
+        _run(post_id)
+    finally:
+        connections.close_all()
+
+
+def schedule_thumbnails(post):
+    """Ставит создание миниатюр поста в очередь после коммита."""
+    post_id = post.pk
+
+    def submit():
+        if settings.THUMBNAIL_ASYNC:
+            _get_executor().submit(_run_in_worker, post_id)
+        else:
+            _run(post_id)
+
+    transaction.on_commit(submit)
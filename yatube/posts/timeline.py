@@ -0,0 +1,187 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F
+from django.utils import timezone
+
+from . import graph
+from .models import Follow, Post, TimelineEntry
+
+HEAVY_AUTHORS_CACHE_KEY = 'timeline:heavy_authors'
+HEAVY_AUTHORS_CACHE_TIMEOUT = 60 * 60
+PULLED_CACHE_KEY = 'timeline:pulled:{user_id}'
+PULLED_CACHE_TIMEOUT = 60 * 60 * 24
+# Пост получает pub_date до коммита: окно перекрытия подбирает посты,
+# закоммиченные уже после прошлого чтения ленты
+PULL_OVERLAP = timedelta(minutes=5)
+BATCH_SIZE = 500
+TIMELINE_ORDERING = ('feed_date', 'feed_post')
+
+
+def _fanout_limit():
+    return settings.TIMELINE_FANOUT_LIMIT
+
+
+def _followers_count(author_id):
+    return Follow.objects.filter(author_id=author_id).count()
+
+
+def heavy_author_ids():
+    """Авторы, чьи посты не раскладываются по лентам при публикации."""
+    author_ids = cache.get(HEAVY_AUTHORS_CACHE_KEY)
+    if author_ids is None:
+        author_ids = list(
+            Follow.objects
+            .values('author')
+            .annotate(followers=Count('pk'))
+            .filter(followers__gte=_fanout_limit())
+            .values_list('author', flat=True)
+        )
+        cache.set(
+            HEAVY_AUTHORS_CACHE_KEY, author_ids, HEAVY_AUTHORS_CACHE_TIMEOUT
+        )
+    return author_ids
+
+
+def _write_entries(rows):
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for user_id, post_id, pub_date in rows
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def fan_out_post(post):
+    """Кладёт новый пост в ленты подписчиков автора."""
+    follower_ids = list(
+        Follow.objects
+        .filter(author_id=post.author_id)
+        .values_list('user_id', flat=True)[:_fanout_limit()]
+    )
+    if len(follower_ids) >= _fanout_limit():
+        return
+    _write_entries(
+        (user_id, post.pk, post.pub_date) for user_id in follower_ids
+    )
+
+
+def fan_out_posts(posts):
+    """Кладёт в ленты подписчиков пачку постов, вставленных bulk_create."""
+    posts_by_author = defaultdict(list)
+    for post in posts:
+        posts_by_author[post.author_id].append(post)
+    author_ids = set(posts_by_author) - set(heavy_author_ids())
+    followers = defaultdict(list)
+    for author_id, user_id in (
+        Follow.objects
+        .filter(author_id__in=author_ids)
+        .values_list('author_id', 'user_id')
+    ):
+        followers[author_id].append(user_id)
+    _write_entries(
+        (user_id, post.pk, post.pub_date)
+        for author_id, user_ids in followers.items()
+        for user_id in user_ids
+        for post in posts_by_author[author_id]
+    )
+
+
+def _fill_timeline(user_ids, author_id):
+    posts = list(
+        Post.objects
+        .filter(author_id=author_id)
+        .values_list('pk', 'pub_date')
+    )
+    _write_entries(
+        (user_id, post_id, pub_date)
+        for user_id in user_ids
+        for post_id, pub_date in posts
+    )
+
+
+def author_followed(user_id, author_id):
+    # Старые посты докладываются и от тяжёлого автора: это один
+    # подписчик, а новые посты подтянет чтение ленты
+    _fill_timeline([user_id], author_id)
+    if _followers_count(author_id) == _fanout_limit():
+        cache.delete(HEAVY_AUTHORS_CACHE_KEY)
+
+
+def author_unfollowed(user_id, author_id):
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+    if _followers_count(author_id) == _fanout_limit() - 1:
+        # Автор перестал быть «тяжёлым»: его посты, опубликованные без
+        # раскладки, нужно донести до лент всех оставшихся подписчиков
+        cache.delete(HEAVY_AUTHORS_CACHE_KEY)
+        _fill_timeline(
+            Follow.objects
+            .filter(author_id=author_id)
+            .values_list('user_id', flat=True),
+            author_id,
+        )
+
+
+def heavy_posts_since(author_ids, since=None):
+    """Пары (pk, pub_date) постов author_ids начиная с since.
+
+    Выборка идёт по индексу (author, -pub_date); без since берутся
+    все посты авторов.
+    """
+    posts = Post.objects.filter(author_id__in=author_ids)
+    if since is not None:
+        posts = posts.filter(pub_date__gte=since)
+    # Порядок не нужен: записи ленты сортирует свой индекс
+    return posts.order_by().values_list('pk', 'pub_date')
+
+
+def _pull_heavy_posts(user_id, author_ids):
+    """Докладывает в ленту посты тяжёлых авторов, вышедшие с прошлого раза.
+
+    Записи появляются только у тех, кто ленту читает.
+    """
+    key = PULLED_CACHE_KEY.format(user_id=user_id)
+    since = cache.get(key)
+    pulled_at = timezone.now()
+    if since is not None:
+        since -= PULL_OVERLAP
+    _write_entries(
+        (user_id, post_id, pub_date)
+        for post_id, pub_date in heavy_posts_since(author_ids, since)
+    )
+    cache.set(key, pulled_at, PULLED_CACHE_TIMEOUT)
+
+
+def timeline_posts(user):
+    """Лента подписок, упорядоченная по TIMELINE_ORDERING.
+
+    Посты тяжёлых авторов сначала докладываются в TimelineEntry, так что
+    лента всегда читается диапазоном индекса (user, -pub_date).
+    """
+    heavy_ids = heavy_author_ids()
+    if heavy_ids:
+        followed_heavy_ids = sorted(
+            set(heavy_ids).intersection(graph.following(user.pk))
+        )
+        if followed_heavy_ids:
+            _pull_heavy_posts(user.pk, followed_heavy_ids)
+    return timeline_queryset(user)
+
+
+def timeline_queryset(user):
+    """Запрос материализованной ленты user без подтягивания постов."""
+    posts = (
+        Post.objects
+        .filter(timeline_entries__user=user)
+        .annotate(
+            feed_date=F('timeline_entries__pub_date'),
+            feed_post=F('timeline_entries__post_id'),
+        )
+    )
+    return posts.order_by(*('-' + field for field in TIMELINE_ORDERING))
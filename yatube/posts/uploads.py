@@ -0,0 +1,174 @@
+"""Приём картинок постов: лимиты, очистка и уменьшение при загрузке.
+
+LimitedUploadHandler пишет загрузку во временный файл кусками и
+бросает чтение запроса, как только файл перерос UPLOAD_MAX_BYTES;
+upload_too_large сообщает об этом форме. normalize_image
+проверяет размер в пикселях, поворачивает картинку по EXIF, уменьшает
+слишком большие оригиналы и пересохраняет их без метаданных, так что
+миниатюрам не приходится раз за разом декодировать снимки с камеры.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import (
+    StopUpload, TemporaryFileUploadHandler,
+)
+from PIL import Image, ImageOps
+
+# Форматы, в которых картинка остаётся после пересохранения;
+# остальные переводятся в JPEG или, при прозрачности, в PNG
+KEPT_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+CONTENT_TYPES = {
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+    'GIF': 'image/gif',
+    'WEBP': 'image/webp',
+}
+# Из info переживает пересохранение только прозрачность палитры
+KEPT_INFO = ('transparency',)
+HASH_CHUNK_SIZE = 64 * 1024
+# verify() проверяет только заголовок: обрезанный файл падает уже
+# при декодировании
+IMAGE_ERRORS = (OSError, SyntaxError, Image.DecompressionBombError)
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """Временный файл на диске вместо памяти и потолок по байтам.
+
+    На файле сверх лимита разбор запроса останавливается: остаток тела
+    не читается, а соединение после ответа закрывается. Поля после
+    файла теряются, но форма всё равно отклонит загрузку.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.UPLOAD_MAX_BYTES:
+            self.request.upload_too_large = True
+            raise StopUpload(connection_reset=True)
+        return super().receive_data_chunk(raw_data, start)
+
+
+def upload_too_large(request):
+    """Бросил ли LimitedUploadHandler загрузку этого запроса."""
+    return getattr(request, 'upload_too_large', False)
+
+
+def _output_format(image):
+    Image.init()
+    if image.format in KEPT_FORMATS and image.format in Image.SAVE:
+        return image.format
+    if image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info:
+        return 'PNG'
+    return 'JPEG'
+
+
+def _save_options(image_format, source):
+    options = {}
+    if source.info.get('icc_profile'):
+        # Цветовой профиль не метаданные: без него поедут цвета
+        options['icc_profile'] = source.info['icc_profile']
+    if image_format == 'JPEG':
+        options.update(
+            quality=settings.POST_IMAGE_JPEG_QUALITY,
+            optimize=True,
+            progressive=True,
+        )
+    elif image_format == 'PNG':
+        options['optimize'] = True
+    return options
+
+
+def _content_hash(upload):
+    digest = hashlib.sha256()
+    upload.seek(0)
+    for chunk in iter(lambda: upload.read(HASH_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    upload.seek(0)
+    return digest.hexdigest()
+
+
+def _spooled(name, content_type):
+    """Загрузка в памяти, которая уходит во временный файл, когда растёт.
+
+    Хранилище копирует её кусками, а временный файл удаляется сам.
+    """
+    spool = tempfile.SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+    )
+    return UploadedFile(spool, name, content_type, 0)
+
+
+def _copy(upload, name, content_type):
+    # Анимацию пересохранение испортит, поэтому её копируем как есть
+    output = _spooled(name, content_type)
+    upload.seek(0)
+    for chunk in upload.chunks():
+        output.write(chunk)
+    return output
+
+
+def normalize_image(upload):
+    """Новая загрузка вместо upload: очищенная и не больше лимитов.
+
+    У результата есть атрибут content_hash — SHA-256 итоговых байтов:
+    по нему файл называет хранилище, не читая его ещё раз. От имени
+    загрузки остаётся только расширение итогового формата. Битая
+    картинка, которую verify() пропустил, даёт ValidationError.
+    """
+    try:
+        output = _normalize(upload)
+    except IMAGE_ERRORS:
+        raise ValidationError(
+            'Картинка повреждена или обрезана', code='invalid_image'
+        )
+    output.size = output.tell()
+    output.content_hash = _content_hash(output)
+    return output
+
+
+def _normalize(upload):
+    upload.seek(0)
+    with Image.open(upload) as source:
+        width, height = source.size
+        if width * height > settings.POST_IMAGE_MAX_PIXELS:
+            raise ValidationError(
+                f'Картинка {width}×{height} слишком большая: '
+                f'не больше {settings.POST_IMAGE_MAX_PIXELS:,} пикселей',
+                code='too_many_pixels',
+            )
+        animated = (
+            getattr(source, 'is_animated', False)
+            and source.format in KEPT_FORMATS
+        )
+        image_format = source.format if animated else _output_format(source)
+        extension = EXTENSIONS[image_format]
+        stem = os.path.splitext(os.path.basename(upload.name))[0]
+        content_type = CONTENT_TYPES[image_format]
+        if animated:
+            output = _copy(upload, f'{stem}.{extension}', content_type)
+        else:
+            image = ImageOps.exif_transpose(source)
+            max_side = settings.POST_IMAGE_MAX_SIDE
+            if max(image.size) > max_side:
+                image.thumbnail((max_side, max_side), Image.LANCZOS)
+            if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            # PNG и GIF берут EXIF и комментарии из info при сохранении
+            image.info = {
+                key: value for key, value in image.info.items()
+                if key in KEPT_INFO
+            }
+            output = _spooled(f'{stem}.{extension}', content_type)
+            image.save(
+                output, image_format, **_save_options(image_format, source)
+            )
+    return output
@@ -1,97 +1,252 @@
+import json
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db.models import (BooleanField, Count, Exists, IntegerField,
+                              OuterRef, Subquery, Value)
+from django.db.models.functions import Coalesce
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.views.decorators.http import require_POST
 
+from . import feed_cache
+from .conditional import not_modified, page_etag, with_etag
+from .counters import get_post_count
+from .exporting import CONTENT_TYPES, LINE_WRITERS, export_rows
+from .follows import follow_authors, unfollow_authors
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post
+from .models import Follow, Group, Post, PostCounter
+from .paginators import (CURSOR_PARAM, DEFAULT_ORDERING, CountedPaginator,
+                         CursorPaginator, LoadMorePage)
+from .search import AFTER_PARAM, QUERY_PARAM, SearchPage
+from .timeline import TIMELINE_ORDERING, timeline_posts
+from .uploads import upload_too_large
 
 POSTS_ON_PAGE = 10
+COMMENTS_AFTER_PARAM = 'comments_after'
+# Больше не влезет в целочисленный столбец id
+MAX_ID = 2 ** 63 - 1
+FOLLOW_BATCH_LIMIT = 100
 User = get_user_model()
 
 
-def _get_page_obj(request, queryset):
-    paginator = Paginator(queryset, POSTS_ON_PAGE)
+def _get_page_obj(request, queryset, count=None, ordering=DEFAULT_ORDERING):
+    if CURSOR_PARAM in request.GET:
+        paginator = CursorPaginator(queryset, POSTS_ON_PAGE, ordering)
+        return paginator.get_page(request.GET.get(CURSOR_PARAM))
+    paginator = CountedPaginator(
+        queryset, POSTS_ON_PAGE, count=count, ordering=ordering
+    )
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     return page_obj
 
 
+def _parse_after(value):
+    """id из ?comments_after= или None, если это не id."""
+    try:
+        after = int(value)
+    except (TypeError, ValueError):
+        return None
+    if not 0 <= after <= MAX_ID:
+        return None
+    return after
+
+
+def post_comments(post):
+    """Комментарии поста в порядке id: порции берутся по ?comments_after=."""
+    return post.comments.select_related('author').order_by('pk')
+
+
+def _get_comments_page(request, post):
+    return LoadMorePage(
+        post_comments(post),
+        settings.COMMENTS_ON_PAGE,
+        after=_parse_after(request.GET.get(COMMENTS_AFTER_PARAM))
+    )
+
+
 def index(request):
+    feed_key = feed_cache.feed_key(feed_cache.GLOBAL)
+    etag = page_etag(request, feed_key)
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
+
     posts = (
         Post
         .objects
-        .select_related('author')
+        .select_related('author', 'group')
     )
 
-    page_obj = _get_page_obj(request, posts)
+    page_obj = _get_page_obj(
+        request, posts, count=get_post_count(PostCounter.SCOPE_ALL)
+    )
 
     template = 'posts/index.html'
     context = {
         'page_obj': page_obj,
+        'feed_key': feed_key,
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
     }
 
-    return render(request, template, context)
+    return with_etag(render(request, template, context), etag)
 
 
 def group_posts(request, slug):
-    group = get_object_or_404(
-        Group.objects.prefetch_related('posts'),
-        slug=slug
+    group = get_object_or_404(Group, slug=slug)
+    feed_key = feed_cache.feed_key(feed_cache.GROUP, group.pk)
+    etag = page_etag(request, feed_key, group.title, group.description)
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
+
+    posts = group.posts.select_related('author', 'group')
+
+    page_obj = _get_page_obj(
+        request,
+        posts,
+        count=get_post_count(PostCounter.SCOPE_GROUP, group.pk)
     )
-    posts = group.posts.all()
-
-    page_obj = _get_page_obj(request, posts)
 
     template = 'posts/group_list.html'
     context = {
         'group': group,
         'page_obj': page_obj,
+        'feed_key': feed_key,
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
     }
 
-    return render(request, template, context)
+    return with_etag(render(request, template, context), etag)
 
 
-def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    author_posts = author.posts.all()
-    if request.user.is_authenticated:
-        following = Follow.objects.filter(
-            user=request.user,
-            author=author
-        ).exists()
+def _count_subquery(queryset, field):
+    return Subquery(
+        queryset
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total'),
+        output_field=IntegerField(),
+    )
+
+
+def profile_authors(viewer):
+    """Авторы со счётчиками постов и подписок и статусом подписки.
+
+    Всё считается подзапросами в одном SELECT: по индексам Follow это
+    COUNT и EXISTS, а не списки id. Число постов берётся из
+    денормализованного счётчика, а если его нет — из таблицы постов.
+    """
+    posts_count = Coalesce(
+        Subquery(
+            PostCounter.objects
+            .filter(scope=PostCounter.SCOPE_AUTHOR, object_id=OuterRef('pk'))
+            .values('count')[:1]
+        ),
+        _count_subquery(
+            Post.objects.filter(author=OuterRef('pk')), 'author'
+        ),
+        0,
+    )
+    if viewer.is_authenticated:
+        following = Exists(
+            Follow.objects.filter(user=viewer, author=OuterRef('pk'))
+        )
     else:
-        following = False
+        following = Value(False, output_field=BooleanField())
+    return User.objects.annotate(
+        posts_count=posts_count,
+        followers_count=Coalesce(_count_subquery(
+            Follow.objects.filter(author=OuterRef('pk')), 'author'
+        ), 0),
+        following_count=Coalesce(_count_subquery(
+            Follow.objects.filter(user=OuterRef('pk')), 'user'
+        ), 0),
+        is_following=following,
+    )
+
+
+def profile(request, username):
+    author = get_object_or_404(
+        profile_authors(request.user), username=username
+    )
+    feed_key = feed_cache.feed_key(feed_cache.AUTHOR, author.pk)
+    etag = page_etag(
+        request,
+        feed_key,
+        author.get_full_name(),
+        author.posts_count,
+        author.followers_count,
+        author.following_count,
+        author.is_following,
+    )
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
 
-    page_obj = _get_page_obj(request, author_posts)
+    author_posts = author.posts.select_related('author', 'group')
+    page_obj = _get_page_obj(request, author_posts, count=author.posts_count)
 
     context = {
         'profile_user': author,
         'page_obj': page_obj,
-        'following': following,
+        'posts_count': author.posts_count,
+        'followers_count': author.followers_count,
+        'following_count': author.following_count,
+        'following': author.is_following,
+        'feed_key': feed_key,
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
     }
     template = 'posts/profile.html'
-    return render(request, template, context)
+    return with_etag(render(request, template, context), etag)
 
 
 def post_detail(request, post_id):
     post = get_object_or_404(
-        Post.objects.prefetch_related('comments'),
+        Post.objects.select_related('author', 'group'),
         pk=post_id
     )
+    feed_key = feed_cache.feed_key(feed_cache.POST, post.pk)
+    # Версия автора меняется вместе с его счётчиком постов на странице
+    etag = page_etag(
+        request,
+        feed_key,
+        feed_cache.feed_key(feed_cache.AUTHOR, post.author_id),
+        post.author.get_full_name(),
+    )
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
+
+    comments_page = _get_comments_page(request, post)
     comment_form = CommentForm(request.POST or None)
     context = {
         'post': post,
-        'comment_form': comment_form
+        'author_posts_count': get_post_count(
+            PostCounter.SCOPE_AUTHOR,
+            post.author_id,
+            queryset=post.author.posts.all()
+        ),
+        'comment_form': comment_form,
+        'comments_page': comments_page,
+        'feed_key': feed_key,
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
     }
     template = 'posts/post_detail.html'
-    return render(request, template, context)
+    return with_etag(render(request, template, context), etag)
 
 
 @login_required
 def post_create(request):
 
-    form = PostForm(request.POST or None, files=request.FILES or None)
+    form = PostForm(
+        request.POST or None,
+        files=request.FILES or None,
+        upload_too_large=upload_too_large(request),
+    )
 
     context = {
         'form': form,
@@ -120,7 +275,8 @@ def post_edit(request, post_id):
     form = PostForm(
         request.POST or None,
         files=request.FILES or None,
-        instance=post
+        instance=post,
+        upload_too_large=upload_too_large(request),
     )
 
     context = {
@@ -153,28 +309,105 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
+    posts = timeline_posts(request.user).select_related('author', 'group')
 
-    page_obj = _get_page_obj(request, posts)
+    page_obj = _get_page_obj(request, posts, ordering=TIMELINE_ORDERING)
 
-    context = {'page_obj': page_obj}
+    context = {
+        'page_obj': page_obj,
+        'feed_key': feed_cache.follow_feed_key(request.user),
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
+    }
 
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
 def profile_follow(request, username):
-    author = User.objects.get(username=username)
-    follow_link = Follow.objects.filter(user=request.user, author=author)
-    if not follow_link.exists() and request.user != author:
-        Follow.objects.create(user=request.user, author=author)
+    follow_authors(
+        request.user, User.objects.filter(username=username).values('pk')
+    )
     return redirect('posts:profile', username=username)
 
 
 @login_required
 def profile_unfollow(request, username):
-    author = User.objects.get(username=username)
-    follow_link = Follow.objects.filter(user=request.user, author=author)
-    if follow_link.exists():
-        Follow.objects.get(user=request.user, author=author).delete()
+    unfollow_authors(
+        request.user, User.objects.filter(username=username).values('pk')
+    )
     return redirect('posts:profile', username=username)
+
+
+def _usernames(payload, key):
+    usernames = payload.get(key, [])
+    if not isinstance(usernames, list) or not all(
+        isinstance(username, str) for username in usernames
+    ):
+        raise ValueError(f'{key}: ожидается список имён пользователей')
+    return usernames
+
+
+@require_POST
+def follow_batch(request):
+    """JSON API: {"follow": [имена], "unfollow": [имена]} одним запросом."""
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Нужно войти'}, status=401)
+    try:
+        payload = json.loads(request.body or b'{}')
+        if not isinstance(payload, dict):
+            raise ValueError('Ожидается JSON-объект')
+        to_follow = _usernames(payload, 'follow')
+        to_unfollow = _usernames(payload, 'unfollow')
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    if len(to_follow) + len(to_unfollow) > FOLLOW_BATCH_LIMIT:
+        return JsonResponse(
+            {'error': f'Не больше {FOLLOW_BATCH_LIMIT} авторов за раз'},
+            status=400,
+        )
+    followed = unfollowed = []
+    if to_follow:
+        followed = follow_authors(
+            request.user,
+            User.objects.filter(username__in=to_follow).values('pk'),
+        )
+    if to_unfollow:
+        unfollowed = unfollow_authors(
+            request.user,
+            User.objects.filter(username__in=to_unfollow).values('pk'),
+        )
+    return JsonResponse({'followed': followed, 'unfollowed': unfollowed})
+
+
+def search(request):
+    query = request.GET.get(QUERY_PARAM, '').strip()
+    page_obj = SearchPage(
+        query, POSTS_ON_PAGE, after=request.GET.get(AFTER_PARAM)
+    )
+    template = 'posts/search.html'
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, template, context)
+
+
+@staff_member_required
+def export_posts(request):
+    """Потоковая выгрузка постов в JSON Lines или CSV, только персоналу."""
+    file_format = request.GET.get('format', 'jsonl')
+    if file_format not in LINE_WRITERS:
+        return JsonResponse({'error': 'Неизвестный формат'}, status=400)
+    posts = Post.objects.all()
+    if request.GET.get('author'):
+        posts = posts.filter(author__username=request.GET['author'])
+    if request.GET.get('group'):
+        posts = posts.filter(group__slug=request.GET['group'])
+    response = StreamingHttpResponse(
+        LINE_WRITERS[file_format](export_rows(posts)),
+        content_type=CONTENT_TYPES[file_format],
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="posts.{file_format}"'
+    )
+    return response
@@ -0,0 +1,19 @@
+"""
+ASGI config for yatube project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Django 2.2 has no native ASGI support, so the WSGI handler is wrapped with
+asgiref's WsgiToAsgi and runs in the event loop's thread pool. The pool
+size is taken from the ASGI_THREADS environment variable. Views,
+including the feeds, stay synchronous, so this gives no concurrency
+gain over a threaded WSGI server; async views need Django 3.1+.
+"""
+
+import os
+
+from asgiref.wsgi import WsgiToAsgi
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+application = WsgiToAsgi(get_wsgi_application())
@@ -49,11 +49,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.TemplateTimingMiddleware',
+    'core.middleware.QueryStatsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -66,8 +69,15 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Кеширующий загрузчик, который замеряет рендер каждого
+            # шаблона; сводка — на /admin/template-stats/
+            'loaders': [
+                ('core.template_timing.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -131,6 +141,29 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+
+# Отдача файлов самим приложением, без CDN и без DEBUG: SERVE_FILES=1
+# включает маршруты core.views.serve_static и serve_media, а collectstatic
+# пишет статику с хешем в имени и сжатыми .gz/.br копиями рядом.
+# Имена с хешем кешируются на год, остальные — на *_MAX_AGE секунд.
+# FILE_OFFLOAD=nginx или apache отдаёт передачу байтов веб-серверу
+# заголовком X-Accel-Redirect или X-Sendfile
+SERVE_FILES = os.getenv('SERVE_FILES', '0') == '1'
+if SERVE_FILES:
+    STATICFILES_STORAGE = (
+        'core.staticfiles.CompressedManifestStaticFilesStorage'
+    )
+STATIC_MAX_AGE = int(os.getenv('STATIC_MAX_AGE', 60 * 60))
+MEDIA_MAX_AGE = int(os.getenv('MEDIA_MAX_AGE', 60 * 60 * 24))
+FILE_OFFLOAD = os.getenv('FILE_OFFLOAD', '')
+# Внутренние location nginx, которые смотрят в STATIC_ROOT и MEDIA_ROOT
+FILE_OFFLOAD_STATIC_PREFIX = os.getenv(
+    'FILE_OFFLOAD_STATIC_PREFIX', '/protected/static/'
+)
+FILE_OFFLOAD_MEDIA_PREFIX = os.getenv(
+    'FILE_OFFLOAD_MEDIA_PREFIX', '/protected/media/'
+)
 
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -142,3 +175,128 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Загрузки называются хешем содержимого и раскладываются по подкаталогам,
+# одинаковые картинки хранятся одним файлом. У sorl свои имена миниатюр,
+# поэтому им хватает обычного хранилища
+DEFAULT_FILE_STORAGE = 'core.storage.ContentAddressedStorage'
+THUMBNAIL_STORAGE = 'django.core.files.storage.FileSystemStorage'
+
+# Загрузки пишутся во временный файл кусками, а не копятся в памяти;
+# на файле сверх UPLOAD_MAX_BYTES чтение запроса обрывается, и форма
+# его отклоняет.
+# Картинка поста больше POST_IMAGE_MAX_PIXELS не принимается, длинная
+# сторона уменьшается до POST_IMAGE_MAX_SIDE, метаданные удаляются
+FILE_UPLOAD_HANDLERS = ['posts.uploads.LimitedUploadHandler']
+# Временные файлы создаются с правами 0600, а перемещаются в MEDIA_ROOT
+# как есть
+FILE_UPLOAD_PERMISSIONS = 0o644
+UPLOAD_MAX_BYTES = 10 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 40 * 1000 * 1000
+POST_IMAGE_MAX_SIDE = 2560
+POST_IMAGE_JPEG_QUALITY = 85
+
+# Авторы с таким числом подписчиков и больше не раскладывают посты
+# по лентам подписчиков, их посты докладываются в ленту при её чтении
+TIMELINE_FANOUT_LIMIT = 1000
+
+# Столько id подписок в одной записи кеша, длинные списки режутся
+# на куски: 4 байта на id, чтобы запись влезала в лимит memcached в 1 МБ
+FOLLOW_GRAPH_CACHE_MAX_IDS = 200000
+
+# Страницы лент кешируются надолго: версии лент сбрасываются сигналами
+# при любой записи постов, комментариев и подписок
+FEED_CACHE_TIMEOUT = 60 * 60 * 6
+
+# С этой страницы ленты «Следующая» ведёт по курсору (?cursor=),
+# а не по номеру: глубокие страницы не читают OFFSET
+CURSOR_FROM_PAGE = int(os.getenv('CURSOR_FROM_PAGE', 5))
+
+# Комментарии на странице поста подгружаются порциями такого размера
+COMMENTS_ON_PAGE = int(os.getenv('COMMENTS_ON_PAGE', 20))
+
+# Входит в ETag лент и страниц постов: поменять при выкладке новых
+# шаблонов, чтобы клиенты не получили 304 на старую разметку
+PAGE_ETAG_VERSION = os.getenv('PAGE_ETAG_VERSION', '1')
+
+# Миниатюры картинок постов готовятся при загрузке, а не при показе ленты
+THUMBNAIL_GEOMETRIES = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+# Для srcset у каждой геометрии есть варианты этих ширин — в формате
+# миниатюры и в современных форматах для <picture>. Форматы, которые
+# не умеет сохранять Pillow, пропускаются; AVIF требует pillow-avif-plugin
+IMAGE_VARIANT_WIDTHS = (480, 960, 1440)
+IMAGE_VARIANT_FORMATS = ('AVIF', 'WEBP')
+# В разработке миниатюры считаются сразу после коммита, в продакшене —
+# в фоновом пуле потоков
+THUMBNAIL_ASYNC = not DEBUG
+THUMBNAIL_WORKERS = int(os.getenv('THUMBNAIL_WORKERS', 2))
+
+# Кеш: YATUBE_CACHE выбирает общий бэкенд (locmem, file, memcached или
+# полный путь к классу бэкенда), YATUBE_CACHE_LOCATION — его адрес.
+# Алиас default — небольшой LRU в памяти процесса перед общим кешем;
+# статистику попаданий по алиасам отдаёт /admin/cache-stats/
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'memcached': 'django.core.cache.backends.memcached.MemcachedCache',
+}
+CACHE_LOCATIONS = {
+    'locmem': 'yatube',
+    'file': os.path.join(BASE_DIR, '.cache'),
+    'memcached': '127.0.0.1:11211',
+}
+YATUBE_CACHE = os.getenv('YATUBE_CACHE', 'locmem')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'core.cache.TieredCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'ALIAS': 'default',
+            'LOCAL_MAX_ENTRIES': 1000,
+            'LOCAL_TIMEOUT': 5,
+            # Версии лент, граф подписок, счётчики постов и список
+            # тяжёлых авторов должны сразу видеть все процессы
+            'LOCAL_BYPASS_PREFIXES': [
+                'feed_version:', 'graph:', 'post_count:', 'timeline:',
+            ],
+        },
+    },
+    'shared': {
+        'BACKEND': CACHE_BACKENDS.get(YATUBE_CACHE, YATUBE_CACHE),
+        'LOCATION': os.getenv(
+            'YATUBE_CACHE_LOCATION', CACHE_LOCATIONS.get(YATUBE_CACHE, '')
+        ),
+        'KEY_PREFIX': 'yatube',
+    },
+}
+if YATUBE_CACHE == 'locmem':
+    # Второй уровень в памяти того же процесса ничего не даёт
+    CACHES['default']['BACKEND'] = 'core.cache.InstrumentedCache'
+
+# Подсчёт SQL-запросов каждого представления для Server-Timing, лога
+# yatube.queries и бюджетов запросов в тестах
+QUERY_STATS = os.getenv('QUERY_STATS', '1' if DEBUG else '0') == '1'
+# Замеры рендера шаблонов для Server-Timing и /admin/template-stats/
+TEMPLATE_TIMING = os.getenv('TEMPLATE_TIMING', '1' if DEBUG else '0') == '1'
+# Сколько самых медленных шаблонов попадает в заголовок Server-Timing
+TEMPLATE_TIMING_TOP = 5
+# Server-Timing всем зрителям, а не только сотрудникам
+SERVER_TIMING_PUBLIC = os.getenv(
+    'SERVER_TIMING_PUBLIC', '1' if DEBUG else '0'
+) == '1'
+
+# Профилирование запросов: сотрудник включает его заголовком
+# «X-Profile: 1» (или «X-Profile: cprofile»), а PROFILING_SAMPLE_RATE
+# задаёт долю случайных запросов. Профили сводит manage.py
+# aggregate_profiles
+PROFILING_DIR = os.getenv(
+    'PROFILING_DIR', os.path.join(BASE_DIR, 'profiles')
+)
+# Сколько последних профилей хранится для каждого представления
+PROFILING_MAX_FILES = int(os.getenv('PROFILING_MAX_FILES', 100))
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 0))
+PROFILING_MODE = os.getenv('PROFILING_MODE', 'sample')
+# Интервал между снимками стека в режиме sample, секунды
+PROFILING_INTERVAL = float(os.getenv('PROFILING_INTERVAL', 0.002))
@@ -1,7 +1,13 @@
+import re
+
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
+
+from core.views import (
+    cache_stats, serve_media, serve_static, template_stats,
+)
 
 handler404 = 'core.views.page_not_found'
 handler403 = 'core.views.csrf_failure'
@@ -11,6 +17,8 @@ urlpatterns = [
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls')),
+    path('admin/cache-stats/', cache_stats, name='cache_stats'),
+    path('admin/template-stats/', template_stats, name='template_stats'),
     path('admin/', admin.site.urls),
     path('', include('posts.urls', namespace='posts')),
 ]
@@ -19,3 +27,14 @@ if settings.DEBUG:
     urlpatterns += static(
         settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
     )
+elif settings.SERVE_FILES:
+    urlpatterns += [
+        re_path(
+            r'^%s(?P<path>.+)$' % re.escape(settings.STATIC_URL.lstrip('/')),
+            serve_static,
+        ),
+        re_path(
+            r'^%s(?P<path>.+)$' % re.escape(settings.MEDIA_URL.lstrip('/')),
+            serve_media,
+        ),
+    ]